@@ -5,8 +5,13 @@
 # Modified by: Sarina Canelake <sarina>
 #
 
+import os
 import random
 import string
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from word_cache import loadWordList
+from word_dictionary import WordDictionary
 
 VOWELS = 'aeiou'
 CONSONANTS = 'bcdfghjklmnpqrstvwxyz'
@@ -20,22 +25,23 @@ SCRABBLE_LETTER_VALUES = {
 # Helper code
 # (you don't need to understand this helper code)
 
-WORDLIST_FILENAME = "/Users/monergeim/Documents/Python/6001x/ProblemSet4words.txt"
+WORDLIST_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "words.txt")
 
-def loadWords():
+def loadWords(filename=None):
     """
     Returns a list of valid words. Words are strings of lowercase letters.
-    
-    Depending on the size of the word list, this function may
-    take a while to finish.
+
+    The first load compiles the word list into a cache file next to it,
+    later loads only map that file (see word_cache.loadWordList), so this
+    takes a few milliseconds unless the word list changed.
+
+    filename: path of the word list, WORDLIST_FILENAME if None
+    returns: WordDictionary, a read-only list of strings with fast
+             membership tests
     """
     print "Loading word list from file..."
-    # inFile: file
-    inFile = open(WORDLIST_FILENAME, 'r', 0)
     # wordList: list of strings
-    wordList = []
-    for line in inFile:
-        wordList.append(line.strip().lower())
+    wordList = WordDictionary(loadWordList(filename or WORDLIST_FILENAME))
     print "  ", len(wordList), "words loaded."
     return wordList
 
@@ -76,8 +82,13 @@ def getWordScore(word, n):
     n: integer (HAND_SIZE; i.e., hand size required for additional points)
     returns: int >= 0
     """
-    # TO DO ... <-- Remove this comment when you code this function
-
+    score = 0
+    for letter in word:
+        score += SCRABBLE_LETTER_VALUES[letter]
+    score *= len(word)
+    if len(word) == n:
+        score += 50
+    return score
 
 
 #
@@ -163,9 +174,16 @@ def isValidWord(word, hand, wordList):
    
     word: string
     hand: dictionary (string -> int)
-    wordList: list of lowercase strings
+    wordList: list of lowercase strings, or a WordDictionary
     """
-    # TO DO ... <-- Remove this comment when you code this function
+    # a hash lookup for a WordDictionary (see loadWords)
+    if word not in wordList:
+        return False
+    freq = getFrequencyDict(word)
+    for letter in freq:
+        if hand.get(letter, 0) < freq[letter]:
+            return False
+    return True
 
 
 #
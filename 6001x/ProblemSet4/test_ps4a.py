@@ -186,6 +186,32 @@ def test_isValidWord(wordList):
         print "SUCCESS: test_isValidWord()"
 
 
+def test_isValidWordPlainLists():
+    """
+    Unit test for isValidWord with plain lists, which may change
+    between calls
+    """
+    failure=False
+    hand = getFrequencyDict("hello")
+    words = ["hello", "world"]
+    if not isValidWord("hello", hand, words):
+        print "FAILURE: test_isValidWordPlainLists()"
+        print "\tExpected True for 'hello' in", words
+        failure=True
+    words[0] = "jello"
+    if isValidWord("hello", hand, words):
+        print "FAILURE: test_isValidWordPlainLists()"
+        print "\tExpected False for 'hello' once the list is", words
+        failure=True
+    words.append("hello")
+    if not isValidWord("hello", hand, words):
+        print "FAILURE: test_isValidWordPlainLists()"
+        print "\tExpected True for 'hello' once the list is", words
+        failure=True
+    if not failure:
+        print "SUCCESS: test_isValidWordPlainLists()"
+
+
 wordList = loadWords()
 print "----------------------------------------------------------------------"
 print "Testing getWordScore..."
@@ -196,5 +222,6 @@ test_updateHand()
 print "----------------------------------------------------------------------"
 print "Testing isValidWord..."
 test_isValidWord(wordList)
+test_isValidWordPlainLists()
 print "----------------------------------------------------------------------"
 print "All done!"
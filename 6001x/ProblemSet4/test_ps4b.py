@@ -0,0 +1,75 @@
+import random
+from ps4b import *
+
+#
+# Test code
+# You don't need to understand how this test code works (but feel free to look it over!)
+
+# To run these tests, simply run this file (open up in IDLE, then run the file as normal)
+
+def scanChooseWord(hand, wordList, n):
+    """
+    compChooseWord as specified: scans the whole wordList and keeps the
+    first word with the best score.
+    """
+    bestScore = 0
+    bestWord = None
+    for word in wordList:
+        counts = {}
+        for letter in word:
+            counts[letter] = counts.get(letter, 0) + 1
+        if all(hand.get(letter, 0) >= counts[letter] for letter in counts):
+            score = getWordScore(word, n)
+            if score > bestScore:
+                bestScore, bestWord = score, word
+    return bestWord
+
+def test_compChooseWord(wordList):
+    """
+    Unit test for compChooseWord
+    """
+    failure=False
+    # hand, word list, n and the expected word
+    cases = [({'a':1, 't':1, 'e':1}, ['tea', 'eat', 'ate'], 7, 'tea'),
+             ({'a':1, 't':1, 'e':1}, ['ate', 'tea'], 7, 'ate'),
+             ({'a':1, 'i':1, 'n':1}, ['in', 'an'], 7, 'in'),
+             ({'a':1, 'i':1, 'n':1}, ['an', 'in'], 7, 'an'),
+             ({'a':0, 't':1, 'e':1, 'x':0}, ['tea', 'eat', 'te', 'ex'], 7, 'te'),
+             ({'a':0, 'b':0}, ['a', 'b'], 7, None),
+             ({'z':1}, ['a', 'b'], 7, None),
+             ({'a':1, 'b':1}, ['ab', 'bad'], 2, 'ab')]
+    for hand, words, n, expected in cases:
+        word = compChooseWord(hand, words, n)
+        if word != expected:
+            print "FAILURE: test_compChooseWord()"
+            print "\tExpected", repr(expected), "but got", repr(word), "for hand", hand, "and words", words
+            failure=True
+
+    # random hands, some with letters used up, against a scan of the words
+    rand = random.Random(6)
+    words = wordList[::20]
+    for i in range(200):
+        n = rand.randint(1, 10)
+        random.seed(i)
+        hand = dealHand(n)
+        for letter in rand.sample(sorted(hand), rand.randint(0, 2) if len(hand) > 2 else 0):
+            hand[letter] = 0
+        expected = scanChooseWord(hand, words, n)
+        word = compChooseWord(hand, words, n)
+        if word != expected:
+            print "FAILURE: test_compChooseWord()"
+            print "\tExpected", repr(expected), "but got", repr(word), "for hand", hand
+            failure=True
+            break
+    if not failure:
+        print "SUCCESS: test_compChooseWord()"
+
+# end of test_compChooseWord
+
+
+wordList = loadWords()
+print "----------------------------------------------------------------------"
+print "Testing compChooseWord..."
+test_compChooseWord(wordList)
+print "----------------------------------------------------------------------"
+print "All done!"
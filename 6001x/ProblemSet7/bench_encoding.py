@@ -0,0 +1,87 @@
+# Benchmark: character encoding detection in feedparser.parse
+#
+# Compares the old path (every candidate encoding converted with _toUTF8
+# over the whole document, chardet over the whole document) with
+# _decodeDocument, over a corpus of feeds in mixed encodings, some of
+# them declaring the wrong one.  Each feed is decoded for three polls,
+# so the second and third see the encodings remembered by the first.
+#
+# Run with: python bench_encoding.py
+
+import random
+import time
+import feedparser
+
+random.seed(6001)
+
+WORDS = [u'march\xe9', u'caf\xe9', u'\u2019quoted\u2019', u'na\xefve', u'news',
+         u'city', u'report', u'storm', u'game', u'council']
+
+def makeBody(nitems, lateNonAscii=False):
+    items = []
+    for i in range(nitems):
+        words = [random.choice(WORDS) for j in range(60)]
+        if lateNonAscii and i < nitems - 1:
+            # the only non-ascii characters are in the very last item
+            words = [w.encode('ascii', 'ignore') for w in words]
+        items.append(u'<item><guid>%d</guid><title>Story %d</title>'
+                     u'<description>%s</description></item>' % (i, i, u' '.join(words)))
+    return u'<rss version="2.0"><channel><title>Feed</title>%s</channel></rss>' % u''.join(items)
+
+def makeFeed(declared, actual, nitems=200, lateNonAscii=False):
+    decl = u'<?xml version="1.0" encoding="%s"?>\n' % declared
+    return (decl + makeBody(nitems, lateNonAscii)).encode(actual)
+
+FEEDS = [
+    ('utf-8, declared', makeFeed('utf-8', 'utf-8')),
+    ('iso-8859-1, declared', makeFeed('iso-8859-1', 'windows-1252')),
+    ('utf-16, declared', makeFeed('utf-16', 'utf-16')),
+    ('windows-1252 as utf-8', makeFeed('utf-8', 'windows-1252')),
+    ('windows-1252 as utf-8, late', makeFeed('utf-8', 'windows-1252', lateNonAscii=True)),
+    ('windows-1252 as us-ascii', makeFeed('us-ascii', 'windows-1252')),
+]
+
+def proposedEncodings(data):
+    encoding, http_encoding, xml_encoding, sniffed_xml_encoding, acceptable = \
+        feedparser._getCharacterEncoding({}, data)
+    return [encoding, xml_encoding, sniffed_xml_encoding]
+
+def oldDecode(data, url, proposed):
+    tried = []
+    candidates = list(proposed)
+    if feedparser.chardet:
+        candidates.append(feedparser.chardet.detect(data)['encoding'])
+    for encoding in candidates + ['utf-8', 'windows-1252']:
+        if not encoding or encoding in tried: continue
+        tried.append(encoding)
+        try:
+            return feedparser._toUTF8(data, encoding), encoding
+        except:
+            pass
+    return data, None
+
+def newDecode(data, url, proposed):
+    return feedparser._decodeDocument(data, url, list(proposed))
+
+def timeit(decode, data, url, proposed, polls=3, repeat=20):
+    start = time.time()
+    for i in range(polls * repeat):
+        result = decode(data, url, proposed)
+    return time.time() - start, result
+
+if __name__ == '__main__':
+    print "chardet installed:", feedparser.chardet is not None
+    print "%-30s %8s %10s %10s %8s" % ("feed", "KB", "old (s)", "new (s)", "speedup")
+    totalOld = totalNew = 0.0
+    for n, (name, data) in enumerate(FEEDS):
+        url = 'http://example.com/feed%d' % n
+        proposed = proposedEncodings(data)
+        oldTime, expected = timeit(oldDecode, data, url, proposed)
+        newTime, result = timeit(newDecode, data, url, proposed)
+        assert result == expected, name
+        totalOld += oldTime
+        totalNew += newTime
+        print "%-30s %8d %10.4f %10.4f %7.2fx" % (name, len(data) / 1024, oldTime,
+                                                   newTime, oldTime / newTime)
+    print "%-30s %8s %10.4f %10.4f %7.2fx" % ("total", "", totalOld, totalNew,
+                                               totalOld / totalNew)
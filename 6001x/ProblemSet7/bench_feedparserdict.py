@@ -0,0 +1,114 @@
+# Benchmark: FeedParserDict with aliases resolved on insert
+#
+# Compares the old FeedParserDict (alias translation on every access, a
+# scan of keymap on every insert) with the current one, for attribute
+# and item access on entries and for building a large feed with parse().
+#
+# Run with: python bench_feedparserdict.py
+
+import time
+import types
+import feedparser
+
+class OldFeedParserDict(dict):
+    keymap = feedparser.FeedParserDict.keymap
+    def __getitem__(self, key):
+        if key == 'category':
+            return dict.__getitem__(self, 'tags')[0]['term']
+        if key == 'categories':
+            return [(tag['scheme'], tag['term']) for tag in dict.__getitem__(self, 'tags')]
+        realkey = self.keymap.get(key, key)
+        if type(realkey) == types.ListType:
+            for k in realkey:
+                if dict.has_key(self, k):
+                    return dict.__getitem__(self, k)
+        if dict.has_key(self, key):
+            return dict.__getitem__(self, key)
+        return dict.__getitem__(self, realkey)
+
+    def __setitem__(self, key, value):
+        for k in self.keymap.keys():
+            if key == k:
+                key = self.keymap[k]
+                if type(key) == types.ListType:
+                    key = key[0]
+        return dict.__setitem__(self, key, value)
+
+    def get(self, key, default=None):
+        if self.has_key(key):
+            return self[key]
+        else:
+            return default
+
+    def setdefault(self, key, value):
+        if not self.has_key(key):
+            self[key] = value
+        return self[key]
+
+    def has_key(self, key):
+        try:
+            return hasattr(self, key) or dict.has_key(self, key)
+        except AttributeError:
+            return False
+
+    def __getattr__(self, key):
+        try:
+            return self.__dict__[key]
+        except KeyError:
+            pass
+        try:
+            assert not key.startswith('_')
+            return self.__getitem__(key)
+        except:
+            raise AttributeError, "object has no attribute '%s'" % key
+
+    def __setattr__(self, key, value):
+        if key.startswith('_') or key == 'data':
+            self.__dict__[key] = value
+        else:
+            return self.__setitem__(key, value)
+
+    def __contains__(self, key):
+        return self.has_key(key)
+
+def makeFeed(nitems):
+    items = ''.join(['<item><guid>%d</guid><title>Story %d</title>'
+                     '<link>http://example.com/%d</link><category>world</category>'
+                     '<pubDate>Mon, 01 Oct 2012 10:00:00 GMT</pubDate>'
+                     '<description>Summary of story %d</description></item>'
+                     % (i, i, i, i) for i in range(nitems)])
+    return ('<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+            '<title>Feed</title><link>http://example.com/</link>%s</channel></rss>' % items)
+
+def access(entries, rounds=20):
+    # the fields ps7 reads, as attributes, items and aliases
+    start = time.time()
+    for i in range(rounds):
+        for entry in entries:
+            entry.guid, entry.title, entry.link, entry.summary, entry.tags[0]['term']
+            entry['title'], entry.get('summary'), entry.description, 'updated' in entry
+    return time.time() - start
+
+def build(feed, polls=3):
+    start = time.time()
+    for i in range(polls):
+        result = feedparser.parse(feed)
+    return time.time() - start, result
+
+if __name__ == '__main__':
+    feed = makeFeed(2000)
+    newClass = feedparser.FeedParserDict
+
+    feedparser.FeedParserDict = OldFeedParserDict
+    oldBuild, oldResult = build(feed)
+    oldAccess = access(oldResult.entries)
+
+    feedparser.FeedParserDict = newClass
+    newBuild, newResult = build(feed)
+    newAccess = access(newResult.entries)
+    assert [dict(e) for e in newResult.entries] == [dict(e) for e in oldResult.entries]
+
+    print "%-34s %10s %10s %8s" % ("2000 entries", "old (s)", "new (s)", "speedup")
+    print "%-34s %10.3f %10.3f %7.2fx" % ("parse, 3 polls", oldBuild, newBuild, oldBuild / newBuild)
+    print "%-34s %10.3f %10.3f %7.2fx" % ("field access, 20 rounds", oldAccess, newAccess,
+                                         oldAccess / newAccess)
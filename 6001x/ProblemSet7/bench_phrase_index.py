@@ -0,0 +1,57 @@
+# Benchmark: PhraseTrigger one by one vs. a single PhraseIndex
+#
+# Run with: python bench_phrase_index.py
+
+import random
+import time
+from ps7 import NewsStory, PhraseTrigger, buildPhraseIndex, firedPhraseTriggers
+
+random.seed(6001)
+
+def randomWord():
+    return ''.join([random.choice('abcdefghijklmnopqrstuvwxyz')
+                    for i in range(random.randint(3, 9))]).capitalize()
+
+def randomText(nwords, phrases):
+    words = [randomWord() for i in range(nwords)]
+    # plant a few of the phrases so that some triggers fire
+    for i in range(3):
+        words.insert(random.randrange(len(words) + 1), random.choice(phrases))
+    return ' '.join(words)
+
+def makeStories(n, phrases):
+    return [NewsStory(str(i), randomText(12, phrases), randomText(2, phrases),
+                      randomText(60, phrases), '') for i in range(n)]
+
+def naive(triggers, stories):
+    return [set([t for t in triggers if t.evaluate(story)]) for story in stories]
+
+def indexed(index, stories):
+    return [firedPhraseTriggers(index, story) for story in stories]
+
+def buildIndex(triggers):
+    index = buildPhraseIndex(triggers)
+    index.build()
+    return index
+
+def timeit(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+if __name__ == '__main__':
+    # the index is built once per trigger config, so its build time is
+    # reported apart from the time spent matching stories
+    print "%8s %8s %12s %12s %12s %8s" % ("phrases", "stories", "build (s)",
+                                          "naive (s)", "index (s)", "speedup")
+    for nphrases, nstories in [(10, 2000), (1000, 500), (100000, 50)]:
+        phrases = [randomWord() + ' ' + randomWord() for i in range(nphrases)]
+        triggers = [PhraseTrigger(p) for p in phrases]
+        stories = makeStories(nstories, phrases)
+        buildTime, index = timeit(buildIndex, triggers)
+        naiveTime, expected = timeit(naive, triggers, stories)
+        indexTime, result = timeit(indexed, index, stories)
+        assert result == expected
+        print "%8d %8d %12.4f %12.4f %12.4f %7.1fx" % (nphrases, nstories, buildTime,
+                                                       naiveTime, indexTime,
+                                                       naiveTime / indexTime)
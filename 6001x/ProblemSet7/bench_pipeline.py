@@ -0,0 +1,53 @@
+# Benchmark: process_many (parsing on one core) vs. process_pipeline
+# (parsing on a pool of processes) over a recorded feed corpus.
+#
+# The corpus is kept in memory and handed to both as feed documents, so
+# only parsing is measured, not the network.  process_pipeline should
+# get close to N times faster with N parse workers, up to the number of
+# cores.
+#
+# Run with: python bench_pipeline.py
+
+import multiprocessing
+import random
+import time
+from xml.sax.saxutils import escape
+from ps7 import process_many, process_pipeline
+
+random.seed(6001)
+
+WORDS = ['market', 'election', 'city', 'report', 'storm', 'game', 'council', 'science']
+
+def makeFeed(n, nitems):
+    items = []
+    for i in range(nitems):
+        words = ' '.join([random.choice(WORDS) for j in range(40)])
+        summary = ('<p onclick="x()">Story %d: <b>%s</b> <a href="/story/%d">more</a></p>'
+                   '<script>track()</script>' % (i, words, i))
+        items.append('<item><guid>%d-%d</guid><title>Story %d</title>'
+                     '<link>http://example.com/%d</link><category>world</category>'
+                     '<pubDate>Mon, 01 Oct 2012 10:00:00 GMT</pubDate>'
+                     '<description>%s</description></item>'
+                     % (n, i, i, i, escape(summary)))
+    return ('<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+            '<title>Feed %d</title><link>http://example.com/</link>%s</channel></rss>'
+            % (n, ''.join(items)))
+
+def run(func, *args, **kwargs):
+    start = time.time()
+    results = list(func(*args, **kwargs))
+    return time.time() - start, results
+
+def stories(results):
+    return sorted([(url, [str(s) for s in feedStories]) for url, feedStories, error in results])
+
+if __name__ == '__main__':
+    corpus = [makeFeed(n, 100) for n in range(32)]
+    print "%d feeds x 100 entries, %d cores" % (len(corpus), multiprocessing.cpu_count())
+    baseTime, expected = run(process_many, corpus)
+    print "%-28s %8.3f s" % ("process_many", baseTime)
+    for workers in [1, 2, 4, 8]:
+        pipeTime, results = run(process_pipeline, corpus, parse_workers=workers)
+        assert stories(results) == stories(expected)
+        print "%-28s %8.3f s  %5.2fx" % ("process_pipeline, %d workers" % workers,
+                                         pipeTime, baseTime / pipeTime)
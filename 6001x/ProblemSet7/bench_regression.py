@@ -0,0 +1,513 @@
+# Benchmark and regression check for the whole RSS pipeline
+#
+# Times every stage of the poller over the recorded feeds in bench_corpus
+# (RSS 0.91/0.92/1.0/2.0, Atom 0.3/1.0, CDF, a gzipped feed and feeds in
+# odd or wrongly declared encodings) and synthetic trigger sets:
+#
+#   feedparser.parse    parsing the corpus documents
+#   translate_html      decoding the raw entry summaries
+#   process             process() on every feed, served over local http
+#   filterStories       the small and the large trigger set
+#   CompiledTriggers    the large trigger set, compiled
+#
+# Each stage runs in a fresh process and reports its best time, peak
+# memory growth (resident set, KB) and the number of objects it left
+# alive. Python 2 has no allocation tracer, so the object count comes
+# from the gc module and only covers container objects.
+#
+# The results are compared with a baseline saved by an earlier run, and
+# the exit status is 1 if a stage got slower or bigger by more than the
+# threshold, or produced a different number of results. Baselines only
+# compare well on the machine they were saved on.
+#
+# Run with: python bench_regression.py [--save] [--threshold 0.25]
+#           python bench_regression.py --record    (rewrites bench_corpus)
+
+import argparse
+import BaseHTTPServer
+import SocketServer
+import gc
+import gzip
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from StringIO import StringIO
+from xml.sax.saxutils import escape
+import feedparser
+import ps7
+from feed_cache import FeedValidatorCache
+from project_util import translate_html
+
+CORPUS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'bench_corpus')
+BASELINE_FILENAME = 'bench_baseline.json'
+THRESHOLD = 0.25        # a stage regressed if it is 25% slower or bigger
+MEMORY_SLACK = 1024     # KB of peak memory growth ignored as noise
+REPEAT = 5              # runs of each stage, the best time is kept
+STORY_COPIES = 20       # the small trigger set runs over this many copies of the stories
+FEED_TIMEOUT = 10       # seconds -- socket timeout of the process stage
+
+#======================
+# Recorded corpus
+#======================
+
+ENGLISH = ['market', 'election', 'city', 'report', 'storm', 'game', 'council',
+           'science', 'Obama', 'Romney', 'New', 'York', 'koala', 'world',
+           'Intel', 'soft', 'rally', 'vote', 'budget', 'space']
+WESTERN = [u'caf\xe9', u'na\xefve', u'\u2019quoted\u2019', u'r\xe9sum\xe9',
+           u'\u20ac5', u'se\xf1or', u'\u2014']
+RUSSIAN = [u'\u043d\u043e\u0432\u043e\u0441\u0442\u0438', u'\u0433\u043e\u0440\u043e\u0434',
+           u'\u0432\u044b\u0431\u043e\u0440\u044b', u'\u043c\u0438\u0440']
+JAPANESE = [u'\u30cb\u30e5\u30fc\u30b9', u'\u5929\u6c17', u'\u9078\u6319', u'\u4e16\u754c']
+MARKUP = [u'<b>%s</b>', u'<a href="http://example.com/more?id=1&src=rss">%s</a>',
+          u'<p>%s</p>', u'%s<br />', u'<img src="http://example.com/x.jpg" />%s',
+          u'<script>track()</script>%s', u'%s &amp; more']
+
+ITEMS = 25
+
+def words(rand, n, extra=()):
+    vocabulary = ENGLISH + list(extra)
+    return u' '.join([rand.choice(vocabulary) for i in range(n)])
+
+def html(rand, n, extra=()):
+    pieces = []
+    for i in range(n // 5):
+        pieces.append(rand.choice(MARKUP) % words(rand, 5, extra))
+    return u' '.join(pieces)
+
+def date(i, atom=False):
+    stamp = time.gmtime(1349085600 + 3600 * i)     # from 1 Oct 2012 10:00 GMT
+    if atom:
+        return unicode(time.strftime('%Y-%m-%dT%H:%M:%SZ', stamp))
+    return unicode(time.strftime('%a, %d %b %Y %H:%M:%S GMT', stamp))
+
+def rss09(rand, version, extra=()):
+    items = []
+    for i in range(ITEMS):
+        category = u''
+        if version == '0.92':
+            category = (u'<category>%s</category><enclosure url="http://example.com/%d.mp3" '
+                        u'length="1000" type="audio/mpeg"/>' % (rand.choice(ENGLISH), i))
+        items.append(u'<item><title>%s</title><link>http://example.com/%d</link>'
+                     u'<description>%s</description>%s</item>'
+                     % (words(rand, 8, extra), i, escape(html(rand, 50, extra)), category))
+    return (u'<rss version="%s"><channel><title>RSS %s</title>'
+            u'<link>http://example.com/</link><description>Feed</description>'
+            u'<language>en-us</language>%s</channel></rss>' % (version, version, u''.join(items)))
+
+def rss20(rand, extra=()):
+    items = []
+    for i in range(ITEMS):
+        items.append(u'<item><guid isPermaLink="false">rss20-%d</guid><title>%s</title>'
+                     u'<link>http://example.com/%d</link><category>%s</category>'
+                     u'<pubDate>%s</pubDate><description>%s</description></item>'
+                     % (i, words(rand, 8, extra), i, rand.choice(ENGLISH), date(i),
+                        escape(html(rand, 50, extra))))
+    return (u'<rss version="2.0"><channel><title>RSS 2.0</title><ttl>30</ttl>'
+            u'<link>http://example.com/</link><description>Feed</description>%s'
+            u'</channel></rss>' % u''.join(items))
+
+def rss10(rand):
+    seq = u''.join([u'<rdf:li resource="http://example.com/%d"/>' % i
+                    for i in range(ITEMS)])
+    items = []
+    for i in range(ITEMS):
+        items.append(u'<item rdf:about="http://example.com/%d"><title>%s</title>'
+                     u'<link>http://example.com/%d</link><dc:subject>%s</dc:subject>'
+                     u'<dc:date>%s</dc:date><description>%s</description></item>'
+                     % (i, words(rand, 8), i, rand.choice(ENGLISH), date(i, True),
+                        escape(html(rand, 50))))
+    return (u'<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+            u'xmlns="http://purl.org/rss/1.0/" xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            u'<channel rdf:about="http://example.com/"><title>RSS 1.0</title>'
+            u'<link>http://example.com/</link><description>Feed</description>'
+            u'<items><rdf:Seq>%s</rdf:Seq></items></channel>%s</rdf:RDF>' % (seq, u''.join(items)))
+
+def atom10(rand, extra=()):
+    entries = []
+    for i in range(ITEMS):
+        entries.append(u'<entry><id>tag:example.com,2012:%d</id><title>%s</title>'
+                       u'<link rel="alternate" href="http://example.com/%d"/>'
+                       u'<updated>%s</updated><category term="%s"/>'
+                       u'<summary type="html">%s</summary></entry>'
+                       % (i, words(rand, 8, extra), i, date(i, True), rand.choice(ENGLISH),
+                          escape(html(rand, 50, extra))))
+    return (u'<feed xmlns="http://www.w3.org/2005/Atom"><title>Atom 1.0</title>'
+            u'<id>tag:example.com,2012:feed</id><updated>%s</updated>'
+            u'<link rel="alternate" href="http://example.com/"/>%s</feed>'
+            % (date(0, True), u''.join(entries)))
+
+def atom03(rand):
+    entries = []
+    for i in range(ITEMS):
+        entries.append(u'<entry><id>tag:example.com,2012:03-%d</id><title>%s</title>'
+                       u'<link rel="alternate" type="text/html" href="http://example.com/%d"/>'
+                       u'<modified>%s</modified><issued>%s</issued>'
+                       u'<content type="text/html" mode="escaped">%s</content></entry>'
+                       % (i, words(rand, 8), i, date(i, True), date(i, True),
+                          escape(html(rand, 50))))
+    return (u'<feed version="0.3" xmlns="http://purl.org/atom/ns#"><title>Atom 0.3</title>'
+            u'<link rel="alternate" type="text/html" href="http://example.com/"/>'
+            u'<modified>%s</modified>%s</feed>' % (date(0, True), u''.join(entries)))
+
+def cdf(rand):
+    items = []
+    for i in range(ITEMS):
+        items.append(u'<ITEM HREF="http://example.com/%d" LASTMOD="2012-10-01T10:%02d">'
+                     u'<TITLE>%s</TITLE><ABSTRACT>%s</ABSTRACT></ITEM>'
+                     % (i, i, words(rand, 8), words(rand, 50)))
+    return (u'<CHANNEL HREF="http://example.com/"><TITLE>CDF</TITLE>'
+            u'<ABSTRACT>Feed</ABSTRACT>%s</CHANNEL>' % u''.join(items))
+
+def declare(document, declared, actual):
+    return (u'<?xml version="1.0" encoding="%s"?>\n' % declared + document).encode(actual)
+
+def recordCorpus(directory=CORPUS_DIRECTORY):
+    """Writes the corpus files. Only needed when the corpus changes."""
+    rand = random.Random(6001)
+    documents = [
+        ('rss091.xml', declare(rss09(rand, '0.91'), 'iso-8859-1', 'iso-8859-1')),
+        ('rss092.xml', declare(rss09(rand, '0.92'), 'utf-8', 'utf-8')),
+        ('rss10.rdf', declare(rss10(rand), 'utf-8', 'utf-8')),
+        ('rss20.xml', declare(rss20(rand), 'utf-8', 'utf-8')),
+        ('atom03.xml', declare(atom03(rand), 'utf-8', 'utf-8')),
+        ('atom10.xml', declare(atom10(rand), 'utf-8', 'utf-8')),
+        ('cdf.xml', declare(cdf(rand), 'utf-8', 'utf-8')),
+        ('rss20-utf16.xml', declare(rss20(rand, WESTERN), 'utf-16', 'utf-16')),
+        ('rss20-koi8r.xml', declare(rss20(rand, RUSSIAN), 'koi8-r', 'koi8-r')),
+        ('atom10-shiftjis.xml', declare(atom10(rand, JAPANESE), 'Shift_JIS', 'shift_jis')),
+        # declares utf-8 but is windows-1252, as many feeds do
+        ('rss20-cp1252-as-utf8.xml', declare(rss20(rand, WESTERN), 'utf-8', 'windows-1252')),
+    ]
+    gzipped = StringIO()
+    outFile = gzip.GzipFile('atom10.xml', 'wb', 9, gzipped, 0)
+    outFile.write(declare(atom10(rand, WESTERN), 'utf-8', 'utf-8'))
+    outFile.close()
+    documents.append(('atom10.xml.gz', gzipped.getvalue()))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for name, data in documents:
+        outFile = open(os.path.join(directory, name), 'wb')
+        try:
+            outFile.write(data)
+        finally:
+            outFile.close()
+
+def loadCorpus(directory=CORPUS_DIRECTORY):
+    """
+    Returns the corpus as a sorted list of (name, data, document) tuples:
+    data is the file as served, document the feed itself (data
+    uncompressed).
+    """
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        inFile = open(os.path.join(directory, name), 'rb')
+        try:
+            data = inFile.read()
+        finally:
+            inFile.close()
+        document = data
+        if name.endswith('.gz'):
+            document = gzip.GzipFile(fileobj=StringIO(data)).read()
+        corpus.append((name, data, document))
+    return corpus
+
+class _CorpusServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class _CorpusHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the corpus files, the .gz ones gzip-encoded"""
+    protocol_version = 'HTTP/1.1'
+    files = {}      # path -> data
+
+    def do_GET(self):
+        data = self.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        if self.path.endswith('.gz'):
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def serveCorpus(corpus):
+    """
+    Serves corpus on a local http server.
+    Returns (server, urls).
+    """
+    _CorpusHandler.files = dict(('/' + name, data) for name, data, document in corpus)
+    server = _CorpusServer(('127.0.0.1', 0), _CorpusHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    urls = ['http://127.0.0.1:%d/%s' % (server.server_port, name)
+            for name, data, document in corpus]
+    return server, urls
+
+#======================
+# Synthetic triggers
+#======================
+
+# trigger words that never appear in the corpus, so most triggers miss and
+# the filter stages pay for evaluating every trigger, not just the first
+MISSING = ['harbor', 'glacier', 'violin', 'tractor', 'orchid', 'lantern',
+           'pelican', 'quartz', 'saddle', 'tundra', 'walnut', 'zeppelin',
+           'anchor', 'bramble', 'canyon', 'dolphin', 'ember', 'falcon',
+           'granite', 'hammock', 'igloo', 'juniper', 'kettle', 'lagoon',
+           'meadow', 'nectar', 'oyster', 'pepper', 'quiver', 'raven',
+           'spindle', 'thistle', 'umbrella', 'velvet', 'willow', 'yodel']
+HIT_LEAVES = 4          # leaves of a trigger set that can match, on average
+MAX_MATCH_RATE = 0.25   # most stories a trigger set may match, as a fraction
+
+def makeTriggers(n, rand):
+    """
+    Returns n random triggers: word triggers on every field, phrase
+    triggers and AND/OR/NOT trees of them.
+
+    Leaves use words missing from the corpus, except about HIT_LEAVES of
+    them, which are three-word phrases of the corpus vocabulary; so only a
+    few stories match whatever n is, and filtering costs about n trigger
+    evaluations per story.
+    """
+    hitRate = min(1.0, HIT_LEAVES / float(n))
+    def leaf():
+        if rand.random() < hitRate:
+            return ps7.PhraseTrigger(' '.join([rand.choice(ENGLISH) for j in range(3)]))
+        kind = rand.random()
+        if kind < 0.3:
+            return ps7.TitleTrigger(rand.choice(MISSING))
+        if kind < 0.5:
+            return ps7.SubjectTrigger(rand.choice(MISSING))
+        if kind < 0.8:
+            return ps7.SummaryTrigger(rand.choice(MISSING))
+        return ps7.PhraseTrigger(rand.choice(MISSING) + ' ' + rand.choice(MISSING))
+    triggers = []
+    for i in range(n):
+        kind = rand.random()
+        if kind < 0.5:
+            triggers.append(leaf())
+        elif kind < 0.7:
+            triggers.append(ps7.AndTrigger(leaf(), leaf()))
+        elif kind < 0.9:
+            triggers.append(ps7.OrTrigger(leaf(), leaf()))
+        else:
+            # NOT only under an AND, or nearly every story would match
+            triggers.append(ps7.AndTrigger(leaf(), ps7.NotTrigger(leaf())))
+    return triggers
+
+def checkMatchRate(stories, triggers):
+    """
+    Raises ValueError if triggers match more than MAX_MATCH_RATE of
+    stories, which would let filterStories stop at the first triggers
+    and time nothing.
+    """
+    matched = len(ps7.filterStories(stories, triggers))
+    if matched > MAX_MATCH_RATE * len(stories):
+        raise ValueError('triggers match %d of %d stories'
+                         % (matched, len(stories)))
+
+#======================
+# Stages
+#======================
+# Each stage takes the corpus and the urls serving it, does its setup and
+# returns a function that runs the stage once and returns the number of
+# results, which must not change from run to run.
+
+def stageParse(corpus, urls):
+    documents = [document for name, data, document in corpus]
+    def run():
+        return sum([len(feedparser.parse(d).entries) for d in documents])
+    return run
+
+def stageTranslateHtml(corpus, urls):
+    summaries = []
+    for name, data, document in corpus:
+        summaries.extend([entry.get('summary', u'')
+                          for entry in feedparser.parse(document).entries])
+    def run():
+        return len([translate_html(s) for s in summaries])
+    return run
+
+def stageProcess(corpus, urls):
+    # no validators, so every run downloads and parses every feed
+    ps7.validatorCache = FeedValidatorCache()
+    def run():
+        stories = 0
+        for url in urls:
+            try:
+                stories += len(ps7.process(url, timeout=FEED_TIMEOUT))
+            except Exception:
+                pass    # counted as no stories, so a new failure shows
+        return stories
+    return run
+
+def corpusStories(corpus, copies=STORY_COPIES):
+    """Returns copies copies of the corpus stories, decoded"""
+    stories = []
+    for name, data, document in corpus:
+        try:
+            feed = ps7.storiesFromFeed(feedparser.parse(document))
+        except Exception:
+            continue    # no guids: ps7 can't read these feeds
+        stories.extend([ps7.NewsStory(s.getGuid(), s.getTitle(), s.getSubject(),
+                                      s.getSummary(), s.getLink()) for s in feed])
+    return stories * copies
+
+def stageFilter(ntriggers, copies=STORY_COPIES):
+    def stage(corpus, urls):
+        stories = corpusStories(corpus, copies)
+        triggers = makeTriggers(ntriggers, random.Random(ntriggers))
+        checkMatchRate(stories[:len(stories) // copies], triggers)
+        def run():
+            return len(ps7.filterStories(stories, triggers))
+        return run
+    return stage
+
+def stageCompiled(ntriggers, copies=STORY_COPIES):
+    def stage(corpus, urls):
+        stories = corpusStories(corpus, copies)
+        triggers = makeTriggers(ntriggers, random.Random(ntriggers))
+        checkMatchRate(stories[:len(stories) // copies], triggers)
+        compiled = ps7.compileTriggers(triggers)
+        def run():
+            return len(compiled.filter(stories))
+        return run
+    return stage
+
+STAGES = [('feedparser.parse', stageParse),
+          ('translate_html', stageTranslateHtml),
+          ('process', stageProcess),
+          ('filterStories, 10 triggers', stageFilter(10)),
+          # nearly every story is tested against every trigger, so the
+          # large set runs over one copy of the stories
+          ('filterStories, 1000 triggers', stageFilter(1000, 1)),
+          ('CompiledTriggers, 1000 triggers', stageCompiled(1000, 1))]
+
+def _measureStage(conn, stage, corpus, urls, repeat):
+    """Runs in a fresh process: measures one stage, sends the result"""
+    try:
+        run = stage(corpus, urls)
+        gc.collect()
+        objects = len(gc.get_objects())
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        best = None
+        for i in range(repeat):
+            start = time.time()
+            results = run()
+            seconds = time.time() - start
+            if best is None or seconds < best:
+                best = seconds
+        growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak
+        gc.collect()
+        conn.send({'seconds': best, 'results': results, 'peak_kb': growth,
+                   'objects': len(gc.get_objects()) - objects})
+    except Exception as e:
+        conn.send({'error': '%s: %s' % (e.__class__.__name__, e)})
+    conn.close()
+
+def measure(stage, corpus, urls, repeat=REPEAT):
+    """Returns the measurements of stage, taken in a fresh process"""
+    parentConn, childConn = multiprocessing.Pipe()
+    worker = multiprocessing.Process(target=_measureStage,
+                                     args=(childConn, stage, corpus, urls, repeat))
+    worker.start()
+    result = parentConn.recv()
+    worker.join()
+    return result
+
+def compare(name, result, baseline, threshold):
+    """
+    Returns the list of regressions of result against the baseline of
+    the same stage.
+    """
+    regressions = []
+    if result['results'] != baseline['results']:
+        regressions.append('%s: %d results instead of %d'
+                           % (name, result['results'], baseline['results']))
+    if result['seconds'] > baseline['seconds'] * (1 + threshold):
+        regressions.append('%s: %.4f s instead of %.4f s'
+                           % (name, result['seconds'], baseline['seconds']))
+    if result['peak_kb'] > max(baseline['peak_kb'], MEMORY_SLACK) * (1 + threshold):
+        regressions.append('%s: %d KB peak instead of %d KB'
+                           % (name, result['peak_kb'], baseline['peak_kb']))
+    return regressions
+
+def change(value, base):
+    if not base:
+        return ''
+    return '%+6.1f%%' % (100.0 * (value - base) / base)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RSS pipeline benchmark')
+    parser.add_argument('--baseline', default=BASELINE_FILENAME,
+                        help='baseline file (default %(default)s)')
+    parser.add_argument('--save', action='store_true',
+                        help='save the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='allowed slowdown or growth, as a fraction '
+                             '(default %(default)s)')
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help='runs of each stage (default %(default)s)')
+    parser.add_argument('--record', action='store_true',
+                        help='rewrite the corpus files and exit')
+    args = parser.parse_args()
+    if args.record:
+        recordCorpus()
+        sys.exit(0)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        inFile = open(args.baseline, 'r')
+        try:
+            baseline = json.load(inFile)['stages']
+        finally:
+            inFile.close()
+    corpus = loadCorpus()
+    server, urls = serveCorpus(corpus)
+    print "%d feeds, %d KB, baseline: %s" % (len(corpus),
+        sum([len(data) for name, data, document in corpus]) // 1024,
+        baseline and args.baseline or "none")
+    print "%-32s %8s %10s %8s %10s %10s" % ("stage", "results", "best (s)",
+                                            "vs base", "peak (KB)", "objects")
+    results = {}
+    regressions = []
+    for name, stage in STAGES:
+        result = measure(stage, corpus, urls, args.repeat)
+        if 'error' in result:
+            print "%-32s failed: %s" % (name, result['error'])
+            regressions.append('%s: failed' % name)
+            continue
+        results[name] = result
+        base = baseline.get(name)
+        print "%-32s %8d %10.4f %8s %10d %10d" % (name, result['results'],
+            result['seconds'], base and change(result['seconds'], base['seconds']) or '',
+            result['peak_kb'], result['objects'])
+        if base:
+            regressions.extend(compare(name, result, base, args.threshold))
+    server.shutdown()
+    server.server_close()
+
+    if args.save:
+        outFile = open(args.baseline, 'w')
+        try:
+            json.dump({'python': sys.version.split()[0], 'stages': results},
+                      outFile, indent=1, sort_keys=True)
+        finally:
+            outFile.close()
+        print "Saved the baseline to", args.baseline
+    elif regressions:
+        print "Regressions over %d%%:" % (100 * args.threshold)
+        for regression in regressions:
+            print "   ", regression
+        sys.exit(1)
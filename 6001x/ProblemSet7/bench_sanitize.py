@@ -0,0 +1,74 @@
+# Benchmark: embedded markup processing in feedparser.parse
+#
+# Compares the old path (resolve relative URIs, then sanitize, each with
+# its own sgmllib pass) with the merged single pass, with and without the
+# content hash cache, over three polls of a corpus of feeds.
+#
+# Run with: python bench_sanitize.py
+
+import random
+import time
+from xml.sax.saxutils import escape
+import feedparser
+
+random.seed(6001)
+
+BOILERPLATE = [
+    '<p><a href="/share?via=rss">Share</a> | <a href="/comments">Comments</a></p>',
+    '<img src="/pixel.gif" width="1" height="1" alt="" />',
+    '<div class="footer">Copyright &copy; Example News. <a href="/terms">Terms</a></div>',
+    '<script src="/track.js"></script><script>track("rss")</script>',
+    '<p>Read more at <a href="http://example.com/more">example.com</a></p>',
+]
+WORDS = ['market', 'election', 'city', 'report', 'storm', 'game', 'council', 'science']
+
+def makeSummary(i):
+    words = ' '.join([random.choice(WORDS) for j in range(40)])
+    return ('<p onclick="x()">Story %d: <b>%s</b> <a href="story/%d.html">more</a></p>' % (i, words, i)
+            + ''.join(random.sample(BOILERPLATE, 3)))
+
+def makeFeed(n, nitems):
+    items = ''.join(['<item><guid>%d-%d</guid><title>Story &lt;b&gt;%d&lt;/b&gt;</title>'
+                     '<link>http://example.com/%d</link><description>%s</description></item>'
+                     % (n, i, i, i, escape(makeSummary(i % 15))) for i in range(nitems)])
+    return ('<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+            '<title>Feed %d</title><link>http://example.com/</link>%s</channel></rss>' % (n, items))
+
+def oldProcessMarkup(htmlSource, baseURI, encoding, resolve, sanitize):
+    if resolve:
+        htmlSource = feedparser._resolveRelativeURIs(htmlSource, baseURI, encoding)
+    if sanitize:
+        htmlSource = feedparser._sanitizeHTML(htmlSource, encoding)
+    return htmlSource
+
+def poll(feeds, polls=3):
+    start = time.time()
+    results = []
+    for i in range(polls):
+        results = [feedparser.parse(feed) for feed in feeds]
+    return time.time() - start, [[e.summary for e in r.entries] for r in results]
+
+if __name__ == '__main__':
+    feeds = [makeFeed(n, 50) for n in range(20)]
+    newProcessMarkup = feedparser._processMarkup
+    cacheSize = feedparser.MARKUP_CACHE_SIZE
+
+    feedparser._processMarkup = oldProcessMarkup
+    oldTime, expected = poll(feeds)
+
+    feedparser._processMarkup = newProcessMarkup
+    feedparser.MARKUP_CACHE_SIZE = 0
+    mergedTime, result = poll(feeds)
+    # no attribute value of the corpus holds &, < or ", which only the
+    # merged pass escapes, so both paths give the same output here
+    assert result == expected
+
+    feedparser.MARKUP_CACHE_SIZE = cacheSize
+    feedparser._markup_cache.clear()
+    cachedTime, result = poll(feeds)
+    assert result == expected
+
+    print "3 polls of %d feeds x 50 entries" % len(feeds)
+    print "%-32s %8.3f s" % ("resolve + sanitize (two passes)", oldTime)
+    print "%-32s %8.3f s  %5.2fx" % ("merged single pass", mergedTime, oldTime / mergedTime)
+    print "%-32s %8.3f s  %5.2fx" % ("merged pass + cache", cachedTime, oldTime / cachedTime)
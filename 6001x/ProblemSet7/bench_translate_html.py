@@ -0,0 +1,46 @@
+# Benchmark: translate_html vs. the character-by-character translate_html_slow
+#
+# Run with: python bench_translate_html.py
+
+import random
+import time
+from project_util import translate_html, translate_html_slow
+
+random.seed(6001)
+
+WORDS = ['news', 'report', 'world', 'election', 'market', 'today', 'city',
+         u'caf\xe9', u'na\xefve', u'\u2019s']
+MARKUP = ['<b>', '</b>', '<br />', '<p>', '</p>', '&amp;', '&quot;', '&nbsp;',
+          '&#39;', '<a href="http://example.com/story?id=1&amp;src=rss">',
+          '</a>', '<img src="http://example.com/x.jpg" />', '&mdash;']
+
+def makeFragment(nwords, useUnicode):
+    pieces = []
+    for i in range(nwords):
+        if random.random() < 0.2:
+            pieces.append(random.choice(MARKUP))
+        word = random.choice(WORDS)
+        if not useUnicode:
+            word = word.encode('ascii', 'replace')
+        pieces.append(word)
+    return ' '.join(pieces)
+
+def timeit(func, fragments):
+    start = time.time()
+    result = [func(f) for f in fragments]
+    return time.time() - start, result
+
+if __name__ == '__main__':
+    print "%-28s %10s %10s %8s" % ("fragments", "slow (s)", "fast (s)", "speedup")
+    for label, nfragments, nwords, useUnicode in [
+            ("2000 titles, ascii", 2000, 10, False),
+            ("2000 titles, unicode", 2000, 10, True),
+            ("2000 summaries, ascii", 2000, 150, False),
+            ("2000 summaries, unicode", 2000, 150, True),
+            ("20 large feeds, unicode", 20, 15000, True)]:
+        fragments = [makeFragment(nwords, useUnicode) for i in range(nfragments)]
+        slowTime, expected = timeit(translate_html_slow, fragments)
+        fastTime, result = timeit(translate_html, fragments)
+        assert result == expected
+        print "%-28s %10.4f %10.4f %7.1fx" % (label, slowTime, fastTime,
+                                              slowTime / fastTime)
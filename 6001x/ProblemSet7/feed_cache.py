@@ -0,0 +1,111 @@
+#
+# Conditional GET support for the RSS poller
+#
+
+import json
+import os
+import threading
+
+
+class FeedValidatorCache(object):
+    """
+    Remembers the ETag and Last-Modified validators sent by every feed,
+    so the next poll can ask the server for the feed only if it changed.
+
+    Validators are kept in a json file so they survive restarts.
+    """
+    def __init__(self, filename=None):
+        """
+        filename: path of the json file backing the cache, or None to
+                  keep the validators in memory only
+        """
+        self.filename = filename
+        self.validators = {}    # url -> (etag, modified)
+        self.hits = 0           # polls answered with 304 Not Modified
+        self.misses = 0         # polls that downloaded the whole feed
+        self.dirty = False
+        self.lock = threading.Lock()
+        if filename is not None and os.path.exists(filename):
+            self.load()
+
+    def load(self):
+        """Reads the validators from self.filename"""
+        inFile = open(self.filename, 'r')
+        try:
+            stored = json.load(inFile)
+        finally:
+            inFile.close()
+        with self.lock:
+            for url, (etag, modified) in stored.items():
+                if modified is not None:
+                    modified = tuple(modified)
+                self.validators[url] = (etag, modified)
+            self.dirty = False
+
+    def save(self):
+        """Writes the validators to self.filename if they changed"""
+        if self.filename is None:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            stored = dict((url, [etag, modified and list(modified)])
+                          for url, (etag, modified) in self.validators.items())
+            self.dirty = False
+        tmpname = self.filename + '.tmp'
+        outFile = open(tmpname, 'w')
+        try:
+            json.dump(stored, outFile)
+        finally:
+            outFile.close()
+        os.rename(tmpname, self.filename)
+
+    def get(self, url):
+        """
+        Returns the (etag, modified) pair to send when polling url.
+        Both are None if the feed was never seen.
+        """
+        with self.lock:
+            return self.validators.get(url, (None, None))
+
+    def update(self, url, feed):
+        """
+        Records the outcome of polling url.
+
+        url: the feed url
+        feed: the result of feedparser.parse for that url
+        """
+        status = feed.get('status')
+        if status is None:
+            # not fetched over http, nothing to validate against
+            return
+        with self.lock:
+            if status == 304:
+                self.hits += 1
+                return
+            self.misses += 1
+            modified = feed.get('modified')
+            if modified is not None:
+                modified = tuple(modified)
+            validators = (feed.get('etag'), modified)
+            if validators == (None, None):
+                if url in self.validators:
+                    del self.validators[url]
+                    self.dirty = True
+            elif self.validators.get(url) != validators:
+                self.validators[url] = validators
+                self.dirty = True
+
+    def stats(self):
+        """
+        Returns a dictionary with the hit and miss counters and the
+        fraction of polls that were answered with 304 Not Modified.
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            if total:
+                ratio = float(self.hits) / total
+            else:
+                ratio = 0.0
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': ratio}
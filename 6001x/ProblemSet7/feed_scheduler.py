@@ -0,0 +1,195 @@
+#
+# Adaptive polling schedule for the RSS poller
+#
+
+import calendar
+import heapq
+import random
+import threading
+import time
+
+
+def feedSchedule(feed):
+    """
+    Extracts what FeedScheduler.update learns from a feed.
+
+    feed: the result of feedparser.parse
+    Returns a dictionary of keyword arguments for FeedScheduler.update.
+    """
+    entryTimes = []
+    for entry in feed.get('entries', []):
+        parsed = entry.get('updated_parsed') or entry.get('published_parsed')
+        if parsed:
+            entryTimes.append(calendar.timegm(parsed))
+    channel = feed.get('feed', {})
+    try:
+        ttl = int(channel.get('ttl'))
+    except (TypeError, ValueError):
+        ttl = None
+    return {'notModified': feed.get('status') == 304,
+            'entryTimes': entryTimes,
+            'ttl': ttl,
+            'skipHours': channel.get('skiphours', [])}
+
+
+class FeedScheduler(object):
+    """
+    Decides when every feed is polled next.
+
+    Each feed gets its own interval, learnt from the feed itself: when
+    new entries come in, the interval becomes the median time between
+    the entries' timestamps; an unchanged feed (304 Not Modified, or no
+    entry newer than before) is polled BACKOFF times less often, and a
+    failing one ERROR_BACKOFF times less often. Intervals stay between
+    minInterval and maxInterval, and never go below the feed's RSS ttl.
+    No poll is due during the feed's RSS skipHours.
+
+    Every due time is moved by up to +/- jitter of the interval, so feeds
+    added together do not all come due in the same second.
+    """
+    BACKOFF = 1.5
+    ERROR_BACKOFF = 2.0
+    GAP_SAMPLES = 10    # most recent entry gaps the median is taken over
+
+    def __init__(self, urls=(), minInterval=60, maxInterval=3600, jitter=0.1,
+                 clock=time.time, random=random.random):
+        """
+        urls: feeds to schedule, all due within jitter * minInterval
+        minInterval: shortest time between two polls of a feed, in seconds
+        maxInterval: longest time between two polls of a feed, in seconds
+        jitter: fraction of the interval due times are moved by at random
+        clock: function returning the current time in seconds
+        random: function returning a random float in [0, 1)
+        """
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.jitter = jitter
+        self.clock = clock
+        self.random = random
+        self.heap = []          # (due, seq, url), earliest first
+        self.seq = 0
+        self.due = {}           # url -> (due, seq) of its live heap entry
+        self.intervals = {}     # url -> current interval in seconds
+        self.newest = {}        # url -> timestamp of its newest entry
+        self.lock = threading.Lock()
+        for url in urls:
+            self.add(url)
+
+    def add(self, url):
+        """Schedules a new feed, due within jitter * minInterval"""
+        with self.lock:
+            self.intervals.setdefault(url, self.minInterval)
+            delay = self.random() * self.jitter * self.minInterval
+            self.push(url, self.clock() + delay)
+
+    def push(self, url, due):
+        """Puts url on the heap at due, replacing its earlier due time"""
+        self.seq += 1
+        self.due[url] = (due, self.seq)
+        heapq.heappush(self.heap, (due, self.seq, url))
+
+    def dropStale(self):
+        """Pops heap entries that were replaced by a later push"""
+        heap = self.heap
+        while heap and self.due.get(heap[0][2]) != heap[0][:2]:
+            heapq.heappop(heap)
+
+    def nextDue(self):
+        """
+        Returns the time the next feed is due, or None if no feed is
+        waiting to be polled.
+        """
+        with self.lock:
+            self.dropStale()
+            if not self.heap:
+                return None
+            return self.heap[0][0]
+
+    def popDue(self):
+        """
+        Returns the list of feeds due now, earliest first. They are not
+        scheduled again until update is called for them.
+        """
+        now = self.clock()
+        urls = []
+        with self.lock:
+            self.dropStale()
+            while self.heap and self.heap[0][0] <= now:
+                due, seq, url = heapq.heappop(self.heap)
+                del self.due[url]
+                urls.append(url)
+                self.dropStale()
+        return urls
+
+    def update(self, url, notModified=False, entryTimes=(), ttl=None,
+               skipHours=(), error=None):
+        """
+        Records the outcome of polling url and schedules its next poll.
+        feedSchedule builds all arguments but url and error from a feed.
+
+        notModified: True if the server answered 304 Not Modified
+        entryTimes: timestamps of the feed's entries, in seconds
+        ttl: the feed's RSS ttl, in minutes, or None
+        skipHours: the feed's RSS skipHours, hours (GMT) not to poll in
+        error: the exception that stopped the poll, or None
+        """
+        with self.lock:
+            interval = self.intervals.get(url, self.minInterval)
+            if error is not None:
+                interval *= self.ERROR_BACKOFF
+            elif notModified:
+                interval *= self.BACKOFF
+            else:
+                interval = self.learn(url, interval, entryTimes)
+            interval = min(max(interval, self.minInterval), self.maxInterval)
+            if ttl:
+                interval = max(interval, ttl * 60)
+            self.intervals[url] = interval
+            spread = self.jitter * (2 * self.random() - 1)
+            due = self.skip(self.clock() + interval * (1 + spread), skipHours)
+            self.push(url, due)
+            return due
+
+    def reschedule(self, urls, error=None):
+        """
+        Schedules again every feed of urls that was returned by popDue
+        but never updated, as a failed poll, so a poll that did not finish
+        does not drop feeds from the schedule. Returns those feeds.
+        """
+        with self.lock:
+            lost = [url for url in urls if url not in self.due]
+        for url in lost:
+            self.update(url, error=error or RuntimeError('poll did not finish'))
+        return lost
+
+    def learn(self, url, interval, entryTimes):
+        """
+        Returns the next interval of url, given the timestamps of the
+        entries it just served.
+        """
+        times = sorted(set(entryTimes))
+        if not times:
+            return interval     # nothing to learn from
+        previous = self.newest.get(url)
+        self.newest[url] = times[-1]
+        if previous is not None and times[-1] <= previous:
+            return interval * self.BACKOFF
+        gaps = [b - a for a, b in zip(times, times[1:])][-self.GAP_SAMPLES:]
+        if not gaps:
+            return interval
+        gaps.sort()
+        return gaps[len(gaps) // 2]
+
+    def skip(self, due, skipHours):
+        """Moves due past the hours (GMT) in skipHours"""
+        skipHours = set(skipHours)
+        if len(skipHours) >= 24:
+            return due          # a feed may not ask never to be polled
+        while time.gmtime(due).tm_hour in skipHours:
+            due = due - due % 3600 + 3600
+        return due
+
+    def stats(self):
+        """Returns a dictionary of the current interval of every feed"""
+        with self.lock:
+            return dict(self.intervals)
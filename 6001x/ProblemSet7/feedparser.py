@@ -66,7 +66,10 @@ TIDY_MARKUP = 0
 PREFERRED_TIDY_INTERFACES = ["uTidy", "mxTidy"]
 
 # ---------- required modules (should come with any Python distribution) ----------
-import sgmllib, re, sys, copy, urlparse, time, rfc822, types, cgi, urllib, urllib2
+import sgmllib, re, sys, copy, urlparse, time, rfc822, types, cgi, urllib, urllib2, codecs, threading
+import httplib, socket
+from collections import OrderedDict
+from hashlib import sha1
 try:
     from cStringIO import StringIO as _StringIO
 except:
@@ -170,6 +173,13 @@ except NameError:
         return rc
 
 class FeedParserDict(UserDict):
+    '''A dictionary whose keys can also be read as attributes
+
+    The old names in keymap are aliases of the current ones.  Aliases are
+    resolved when a value is stored, so the dictionary only ever holds
+    current names and reading a key is a single lookup; only reading an
+    alias costs a second one.
+    '''
     keymap = {'channel': 'feed',
               'items': 'entries',
               'guid': 'id',
@@ -185,32 +195,44 @@ class FeedParserDict(UserDict):
               'copyright_detail': 'rights_detail',
               'tagline': 'subtitle',
               'tagline_detail': 'subtitle_detail'}
+    # alias -> the key a value stored under the alias is stored under
+    storekeys = dict([(k, type(v) == types.ListType and v[0] or v)
+                      for k, v in keymap.items()])
+
+    def __init__(self, *args, **kwargs):
+        UserDict.__init__(self)
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
     def __getitem__(self, key):
+        try:
+            return UserDict.__getitem__(self, key)
+        except KeyError:
+            pass
         if key == 'category':
             return UserDict.__getitem__(self, 'tags')[0]['term']
         if key == 'categories':
             return [(tag['scheme'], tag['term']) for tag in UserDict.__getitem__(self, 'tags')]
-        realkey = self.keymap.get(key, key)
+        realkey = self.keymap.get(key)
         if type(realkey) == types.ListType:
             for k in realkey:
-                if UserDict.has_key(self, k):
+                if UserDict.__contains__(self, k):
                     return UserDict.__getitem__(self, k)
-        if UserDict.has_key(self, key):
-            return UserDict.__getitem__(self, key)
-        return UserDict.__getitem__(self, realkey)
+        elif realkey is not None:
+            return UserDict.__getitem__(self, realkey)
+        raise KeyError, key
 
     def __setitem__(self, key, value):
-        for k in self.keymap.keys():
-            if key == k:
-                key = self.keymap[k]
-                if type(key) == types.ListType:
-                    key = key[0]
-        return UserDict.__setitem__(self, key, value)
+        UserDict.__setitem__(self, self.storekeys.get(key, key), value)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
 
     def get(self, key, default=None):
-        if self.has_key(key):
+        try:
             return self[key]
-        else:
+        except (KeyError, IndexError):
             return default
 
     def setdefault(self, key, value):
@@ -219,30 +241,34 @@ class FeedParserDict(UserDict):
         return self[key]
         
     def has_key(self, key):
+        if UserDict.__contains__(self, key):
+            return True
         try:
-            return hasattr(self, key) or UserDict.has_key(self, key)
-        except AttributeError:
+            self[key]
+            return True
+        except (KeyError, IndexError):
             return False
+
+    __contains__ = has_key
         
     def __getattr__(self, key):
+        # only called when key is not a real attribute
         try:
-            return self.__dict__[key]
+            return UserDict.__getitem__(self, key)
         except KeyError:
             pass
+        if key.startswith('_'):
+            raise AttributeError, "object has no attribute '%s'" % key
         try:
-            assert not key.startswith('_')
-            return self.__getitem__(key)
-        except:
+            return self[key]
+        except (KeyError, IndexError):
             raise AttributeError, "object has no attribute '%s'" % key
 
     def __setattr__(self, key, value):
         if key.startswith('_') or key == 'data':
-            self.__dict__[key] = value
+            UserDict.__setattr__(self, key, value)
         else:
-            return self.__setitem__(key, value)
-
-    def __contains__(self, key):
-        return self.has_key(key)
+            self[key] = value
 
 def zopeCompatibilityHack():
     global FeedParserDict
@@ -372,6 +398,7 @@ class _FeedParserMixin:
         self.incontent = 0
         self.intextinput = 0
         self.inimage = 0
+        self.inskiphours = 0
         self.inauthor = 0
         self.incontributor = 0
         self.inpublisher = 0
@@ -387,6 +414,11 @@ class _FeedParserMixin:
         self.lang = baselang or None
         if baselang:
             self.feeddata['language'] = baselang
+        # when set to a list, finished entries are moved there instead of
+        # being kept in self.entries (see parse_stream)
+        self.entryQueue = None
+        # the date handler that last worked for this feed (see _parse_date)
+        self.dateHandlerHint = _date_handler_hints.setdefault(self.baseuri, [None])
 
     def unknown_starttag(self, tag, attrs):
         if _debug: sys.stderr.write('start %s with %s\n' % (tag, attrs))
@@ -635,15 +667,11 @@ class _FeedParserMixin:
         except KeyError:
             pass
 
-        # resolve relative URIs within embedded markup
-        if self.mapContentType(self.contentparams.get('type', 'text/html')) in self.html_types:
-            if element in self.can_contain_relative_uris:
-                output = _resolveRelativeURIs(output, self.baseuri, self.encoding)
-        
-        # sanitize embedded markup
+        # resolve relative URIs within embedded markup and sanitize it
         if self.mapContentType(self.contentparams.get('type', 'text/html')) in self.html_types:
-            if element in self.can_contain_dangerous_markup:
-                output = _sanitizeHTML(output, self.encoding)
+            output = _processMarkup(output, self.baseuri, self.encoding,
+                                    element in self.can_contain_relative_uris,
+                                    element in self.can_contain_dangerous_markup)
 
         if self.encoding and type(output) != type(u''):
             try:
@@ -815,6 +843,29 @@ class _FeedParserMixin:
         self.intextinput = 0
     _end_textInput = _end_textinput
 
+    def _start_skiphours(self, attrsD):
+        self.inskiphours = 1
+        self.push('skiphours', 0)
+        context = self._getContext()
+        context['skiphours'] = []
+    _start_skipHours = _start_skiphours
+
+    def _end_skiphours(self):
+        self.pop('skiphours')
+        self.inskiphours = 0
+    _end_skipHours = _end_skiphours
+
+    def _start_hour(self, attrsD):
+        self.push('hour', 1)
+
+    def _end_hour(self):
+        value = self.pop('hour')
+        if self.inskiphours:
+            try:
+                self._getContext()['skiphours'].append(int(value))
+            except (TypeError, ValueError):
+                pass
+
     def _start_author(self, attrsD):
         self.inauthor = 1
         self.push('author', 1)
@@ -1027,6 +1078,8 @@ class _FeedParserMixin:
     def _end_item(self):
         self.pop('item')
         self.inentry = 0
+        if (self.entryQueue is not None) and self.entries:
+            self.entryQueue.append(self.entries.pop())
     _end_entry = _end_item
 
     def _start_dc_language(self, attrsD):
@@ -1053,7 +1106,7 @@ class _FeedParserMixin:
 
     def _end_published(self):
         value = self.pop('published')
-        self._save('published_parsed', _parse_date(value))
+        self._save('published_parsed', _parse_date(value, self.dateHandlerHint))
     _end_dcterms_issued = _end_published
     _end_issued = _end_published
 
@@ -1066,7 +1119,7 @@ class _FeedParserMixin:
 
     def _end_updated(self):
         value = self.pop('updated')
-        parsed_value = _parse_date(value)
+        parsed_value = _parse_date(value, self.dateHandlerHint)
         self._save('updated_parsed', parsed_value)
     _end_modified = _end_updated
     _end_dcterms_modified = _end_updated
@@ -1079,14 +1132,14 @@ class _FeedParserMixin:
 
     def _end_created(self):
         value = self.pop('created')
-        self._save('created_parsed', _parse_date(value))
+        self._save('created_parsed', _parse_date(value, self.dateHandlerHint))
     _end_dcterms_created = _end_created
 
     def _start_expirationdate(self, attrsD):
         self.push('expired', 1)
 
     def _end_expirationdate(self):
-        self._save('expired_parsed', _parse_date(self.pop('expired')))
+        self._save('expired_parsed', _parse_date(self.pop('expired'), self.dateHandlerHint))
 
     def _start_cc_license(self, attrsD):
         self.push('license', 1)
@@ -1647,10 +1700,86 @@ class _HTMLSanitizer(_BaseHTMLProcessor):
         if not self.unacceptablestack:
             _BaseHTMLProcessor.handle_data(self, text)
 
+def _escapeAttribute(value):
+    '''Escapes an attribute value sgmllib decoded, so it stays one value'''
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;')
+
+class _SanitizingURIResolver(_HTMLSanitizer):
+    '''Sanitizes markup and resolves the relative URIs left in it, in one pass.
+
+    Attribute values are written back escaped.  The two-pass path relies on
+    the second parse to drop whatever a decoded &quot; let out of a value;
+    with one pass, nothing would.'''
+    relative_uris = _RelativeURIResolver.relative_uris
+
+    def __init__(self, baseuri, encoding):
+        _HTMLSanitizer.__init__(self, encoding)
+        self.baseuri = baseuri
+
+    def unknown_starttag(self, tag, attrs):
+        if not tag in self.acceptable_elements:
+            if tag in self.unacceptable_elements_with_end_tag:
+                self.unacceptablestack += 1
+            return
+        attrs = self.normalize_attrs(attrs)
+        attrs = [(key, _escapeAttribute(((tag, key) in self.relative_uris) and _urljoin(self.baseuri, value) or value))
+                 for key, value in attrs if key in self.acceptable_attributes]
+        _BaseHTMLProcessor.unknown_starttag(self, tag, attrs)
+
 def _sanitizeHTML(htmlSource, encoding):
     p = _HTMLSanitizer(encoding)
     p.feed(htmlSource)
-    data = p.output()
+    return _tidyHTML(p.output())
+
+def _sanitizeAndResolveHTML(htmlSource, baseURI, encoding):
+    '''Same as _sanitizeHTML(_resolveRelativeURIs(...)), parsing the markup once'''
+    p = _SanitizingURIResolver(baseURI, encoding)
+    p.feed(htmlSource)
+    return _tidyHTML(p.output())
+
+# Processed markup by content hash, most recently used last.  Feeds repeat
+# the same boilerplate (and the same entries, poll after poll), so most
+# fragments are found here and never parsed.  0 turns the cache off.
+MARKUP_CACHE_SIZE = 1024
+_markup_cache = OrderedDict()
+_markup_cache_lock = threading.Lock()
+
+def _processMarkup(htmlSource, baseURI, encoding, resolve, sanitize):
+    '''Resolves relative URIs in and/or sanitizes embedded markup, remembering
+    the result for the next time the same fragment comes along'''
+    if not (resolve or sanitize):
+        return htmlSource
+    if type(htmlSource) == type(u''):
+        digest = sha1(htmlSource.encode('utf-8')).digest()
+    else:
+        digest = sha1(htmlSource).digest()
+    key = (digest, type(htmlSource), resolve and baseURI, encoding, sanitize, TIDY_MARKUP)
+    _markup_cache_lock.acquire()
+    try:
+        if _markup_cache.has_key(key):
+            output = _markup_cache.pop(key)
+            _markup_cache[key] = output
+            return output
+    finally:
+        _markup_cache_lock.release()
+    if resolve and sanitize:
+        output = _sanitizeAndResolveHTML(htmlSource, baseURI, encoding)
+    elif resolve:
+        output = _resolveRelativeURIs(htmlSource, baseURI, encoding)
+    else:
+        output = _sanitizeHTML(htmlSource, encoding)
+    if MARKUP_CACHE_SIZE:
+        _markup_cache_lock.acquire()
+        try:
+            _markup_cache[key] = output
+            while len(_markup_cache) > MARKUP_CACHE_SIZE:
+                _markup_cache.popitem(last=False)
+        finally:
+            _markup_cache_lock.release()
+    return output
+
+def _tidyHTML(data):
+    '''Runs sanitized markup through HTML Tidy if TIDY_MARKUP is set'''
     if TIDY_MARKUP:
         # loop through list of preferred Tidy interfaces looking for one that's installed,
         # then set up a common _tidy function to wrap the interface-specific API.
@@ -1740,7 +1869,182 @@ class _FeedURLHandler(urllib2.HTTPDigestAuthHandler, urllib2.HTTPRedirectHandler
         except:
             return self.http_error_default(req, fp, code, msg, headers)
 
-def _open_resource(url_file_stream_or_string, etag, modified, agent, referrer, handlers):
+class HTTPConnectionPool(urllib2.HTTPHandler, urllib2.HTTPSHandler):
+    '''Transport for parse() that keeps HTTP connections open between requests
+
+    By default every request opens a new connection, so polling many feeds
+    on the same host pays for a TCP (and TLS) handshake every time.  Pass
+    an HTTPConnectionPool as the transport argument of parse() or
+    parse_stream() and connections are kept alive and reused instead.
+
+    At most maxPerHost requests to the same host run at the same time;
+    more wait until one of them is finished.  Up to maxIdlePerHost idle
+    connections per host are kept for the next request.  One pool can be
+    shared by many threads.
+
+    A transport is a urllib2 handler that opens http and https URLs, so
+    any such handler can be passed instead.
+    '''
+    def __init__(self, maxPerHost=4, maxIdlePerHost=None):
+        urllib2.HTTPSHandler.__init__(self)
+        self.maxPerHost = maxPerHost
+        self.maxIdlePerHost = maxIdlePerHost or maxPerHost
+        self.idle = {}          # (scheme, host) -> idle connections
+        self.slots = {}         # (scheme, host) -> semaphore, maxPerHost
+        self.lock = threading.Lock()
+        self.requests = 0       # requests sent
+        self.connections = 0    # connections opened
+
+    def http_open(self, req):
+        return self._open(httplib.HTTPConnection, 'http', req)
+
+    def https_open(self, req):
+        return self._open(httplib.HTTPSConnection, 'https', req)
+
+    def _open(self, connectionClass, scheme, req):
+        if req._tunnel_host:
+            # no pooling through proxy tunnels
+            return self.do_open(connectionClass, req)
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+        key = (scheme, host)
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items()
+                            if k not in headers))
+        headers['Connection'] = 'keep-alive'
+        headers = dict((name.title(), val) for name, val in headers.items())
+        slot = self._slot(key)
+        slot.acquire()
+        try:
+            conn, response = self._send(connectionClass, key, req, headers)
+        except:
+            slot.release()
+            raise
+        fp = _PooledResponse(self, key, conn, response, slot)
+        resp = urllib.addinfourl(fp, response.msg, req.get_full_url())
+        resp.code = response.status
+        resp.msg = response.reason
+        return resp
+
+    def _slot(self, key):
+        self.lock.acquire()
+        try:
+            if not self.slots.has_key(key):
+                self.slots[key] = threading.Semaphore(self.maxPerHost)
+            return self.slots[key]
+        finally:
+            self.lock.release()
+
+    def _send(self, connectionClass, key, req, headers):
+        '''Sends req on an idle connection to its host, or on a new one
+        if there is none.  Returns (connection, response).'''
+        timeout = req.timeout
+        if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+            timeout = socket.getdefaulttimeout()
+        while 1:
+            conn = None
+            self.lock.acquire()
+            try:
+                self.requests += 1
+                if self.idle.get(key):
+                    conn = self.idle[key].pop()
+                else:
+                    self.connections += 1
+            finally:
+                self.lock.release()
+            reused = conn is not None
+            if reused:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+            elif connectionClass is httplib.HTTPSConnection:
+                conn = connectionClass(key[1], timeout=timeout, context=self._context)
+            else:
+                conn = connectionClass(key[1], timeout=timeout)
+            try:
+                conn.request(req.get_method(), req.get_selector(), req.data, headers)
+                return conn, conn.getresponse(buffering=True)
+            except (socket.error, httplib.HTTPException), err:
+                conn.close()
+                if not reused:
+                    if isinstance(err, socket.error):
+                        raise urllib2.URLError(err)
+                    raise
+                # the server closed the idle connection in the meantime,
+                # try again on a new one
+                self.lock.acquire()
+                try:
+                    self.requests -= 1
+                finally:
+                    self.lock.release()
+
+    def _release(self, key, conn, reusable):
+        '''Takes a connection back once its response was closed'''
+        if reusable:
+            self.lock.acquire()
+            try:
+                idle = self.idle.setdefault(key, [])
+                if len(idle) < self.maxIdlePerHost:
+                    idle.append(conn)
+                    return
+            finally:
+                self.lock.release()
+        conn.close()
+
+    def closeIdle(self):
+        '''Closes every idle connection'''
+        self.lock.acquire()
+        try:
+            idle, self.idle = self.idle, {}
+        finally:
+            self.lock.release()
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def stats(self):
+        '''Returns a dictionary counting the requests sent, the connections
+        opened for them, and the requests that reused a connection'''
+        self.lock.acquire()
+        try:
+            return {'requests': self.requests, 'connections': self.connections,
+                    'reused': self.requests - self.connections}
+        finally:
+            self.lock.release()
+
+class _PooledResponse:
+    '''File object for a response from an HTTPConnectionPool
+
+    Closing it hands the connection back to the pool if the response was
+    read to the end, and closes the connection otherwise.
+    '''
+    def __init__(self, pool, key, conn, response, slot):
+        self.pool = pool
+        self.key = key
+        self.conn = conn
+        self.response = response
+        self.slot = slot
+        # same wrapping as urllib2, for readline() and readlines()
+        response.recv = response.read
+        self.fileobj = socket._fileobject(response, close=True)
+        self.read = self.fileobj.read
+        self.readline = self.fileobj.readline
+        self.readlines = self.fileobj.readlines
+
+    def close(self):
+        response = self.response
+        if response is None:
+            return
+        self.response = None
+        reusable = response.isclosed() and not response.will_close
+        self.fileobj.close()
+        try:
+            self.pool._release(self.key, self.conn, reusable)
+        finally:
+            self.slot.release()
+
+def _open_resource(url_file_stream_or_string, etag, modified, agent, referrer, handlers, timeout=None, transport=None):
     """URL, filename, or string --> stream
 
     This function lets you define parsers that take any input source
@@ -1765,6 +2069,12 @@ def _open_resource(url_file_stream_or_string, etag, modified, agent, referrer, h
 
     If handlers is supplied, it is a list of handlers used to build a
     urllib2 opener.
+
+    If the timeout argument is supplied, it is the number of seconds any
+    single network operation (connect, read) may block before giving up.
+
+    If the transport argument is supplied, it is the urllib2 handler that
+    opens http and https URLs, for example an HTTPConnectionPool.
     """
 
     if hasattr(url_file_stream_or_string, 'read'):
@@ -1814,10 +2124,14 @@ def _open_resource(url_file_stream_or_string, etag, modified, agent, referrer, h
         if ACCEPT_HEADER:
             request.add_header('Accept', ACCEPT_HEADER)
         request.add_header('A-IM', 'feed') # RFC 3229 support
+        if transport is not None:
+            handlers = [transport] + handlers
         opener = apply(urllib2.build_opener, tuple([_FeedURLHandler()] + handlers))
         opener.addheaders = [] # RMK - must clear so we only send our custom User-Agent
         try:
-            return opener.open(request)
+            if timeout is None:
+                return opener.open(request)
+            return opener.open(request, timeout=timeout)
         finally:
             opener.close() # JohnD
     
@@ -1834,6 +2148,46 @@ _date_handlers = []
 def registerDateHandler(func):
     '''Register a date handler function (takes string, returns 9-tuple date in GMT)'''
     _date_handlers.insert(0, func)
+    _date_cache_lock.acquire()
+    try:
+        _date_cache.clear()
+    finally:
+        _date_cache_lock.release()
+
+# Parsed dates, most recently used last.  Feeds repeat the same date strings
+# over and over (every poll, and often within a feed), so remembering the
+# last DATE_CACHE_SIZE of them skips the handler chain almost every time.
+DATE_CACHE_SIZE = 2048
+_date_cache = OrderedDict()
+_date_cache_lock = threading.Lock()
+
+# feed URL -> one item list holding the date handler that last parsed a date
+# of that feed; _parse_date tries it before all the others
+_date_handler_hints = {}
+
+# number of dates parsed by each handler, and of cache hits and failures
+_date_handler_stats = {}
+
+def _countDateStat(key):
+    _date_handler_stats[key] = _date_handler_stats.get(key, 0) + 1
+
+def getDateHandlerStats():
+    '''Returns a dictionary counting the dates parsed by each date handler
+    (by function name), plus the dates served from the cache ('cache') and
+    the dates no handler could parse ('failed')'''
+    _date_cache_lock.acquire()
+    try:
+        return dict(_date_handler_stats)
+    finally:
+        _date_cache_lock.release()
+
+def resetDateHandlerStats():
+    '''Clears the counters returned by getDateHandlerStats'''
+    _date_cache_lock.acquire()
+    try:
+        _date_handler_stats.clear()
+    finally:
+        _date_cache_lock.release()
     
 # ISO-8601 date parsing routines written by Fazal Majid.
 # The ISO 8601 standard is very convoluted and irregular - a full ISO 8601
@@ -2223,9 +2577,27 @@ _additional_timezones = {'AT': -400, 'ET': -500, 'CT': -600, 'MT': -700, 'PT': -
 rfc822._timezones.update(_additional_timezones)
 registerDateHandler(_parse_date_rfc822)    
 
-def _parse_date(dateString):
-    '''Parses a variety of date formats into a 9-tuple in GMT'''
-    for handler in _date_handlers:
+def _parse_date(dateString, hint=None):
+    '''Parses a variety of date formats into a 9-tuple in GMT
+
+    hint is an optional one item list holding the handler that last parsed
+    a date of the same feed.  That handler is tried first, and the list is
+    updated with whichever handler succeeds.
+    '''
+    _date_cache_lock.acquire()
+    try:
+        if _date_cache.has_key(dateString):
+            date9tuple = _date_cache.pop(dateString)
+            _date_cache[dateString] = date9tuple
+            _countDateStat('cache')
+            return date9tuple
+    finally:
+        _date_cache_lock.release()
+    handlers = _date_handlers
+    if hint and hint[0] in handlers:
+        handlers = [hint[0]] + [h for h in handlers if h is not hint[0]]
+    date9tuple = None
+    for handler in handlers:
         try:
             date9tuple = handler(dateString)
             if not date9tuple: continue
@@ -2233,11 +2605,26 @@ def _parse_date(dateString):
                 if _debug: sys.stderr.write('date handler function must return 9-tuple\n')
                 raise ValueError
             map(int, date9tuple)
-            return date9tuple
+            break
         except Exception, e:
             if _debug: sys.stderr.write('%s raised %s\n' % (handler.__name__, repr(e)))
-            pass
-    return None
+            date9tuple = None
+    else:
+        date9tuple = None
+    _date_cache_lock.acquire()
+    try:
+        if date9tuple:
+            _countDateStat(handler.__name__)
+            if hint is not None:
+                hint[0] = handler
+        else:
+            _countDateStat('failed')
+        _date_cache[dateString] = date9tuple
+        if len(_date_cache) > DATE_CACHE_SIZE:
+            _date_cache.popitem(last=False)
+    finally:
+        _date_cache_lock.release()
+    return date9tuple
 
 def _getCharacterEncoding(http_headers, xml_data):
     '''Get the character encoding of the XML document
@@ -2428,6 +2815,101 @@ def _toUTF8(data, encoding):
         newdata = newdecl + u'\n' + newdata
     return newdata.encode('utf-8')
 
+# How many bytes are decoded to weed out a wrong encoding before the whole
+# document is, and how many bytes chardet looks at.
+ENCODING_PREFIX_SIZE = 4096
+
+# feed URL -> the encoding that decoded it last time, most recently used
+# last.  It is tried instead of asking chardet when none of the declared
+# encodings work, since feeds that lie about their encoding keep lying the
+# same way.
+ENCODING_CACHE_SIZE = 1024
+_encoding_cache = OrderedDict()
+_encoding_cache_lock = threading.Lock()
+
+_utf8_compatible = ('utf-8', 'ascii')
+_xml_declaration = re.compile('^<\?xml[^>]*?>')
+
+def _convertToUTF8(data, encoding):
+    '''Same as _toUTF8, but decodes data only once
+
+    The first ENCODING_PREFIX_SIZE bytes are decoded first, so a wrong
+    encoding is usually rejected without a pass over the whole document.
+    Data that already is utf-8 (or ascii) is only validated, not re-encoded.
+    Raises an exception if data is not valid in encoding.
+    '''
+    for bom, bom_encoding in _stream_boms:
+        if data.startswith(bom):
+            if _debug and encoding != bom_encoding:
+                sys.stderr.write('stripping BOM, trying %s instead\n' % bom_encoding)
+            encoding = bom_encoding
+            data = data[len(bom):]
+            break
+    decoder = codecs.getincrementaldecoder(encoding)()
+    decoder.decode(data[:ENCODING_PREFIX_SIZE])
+    newdecl = '''<?xml version='1.0' encoding='utf-8'?>'''
+    if codecs.lookup(encoding).name in _utf8_compatible:
+        unicode(data, encoding)
+    else:
+        data = unicode(data, encoding).encode('utf-8')
+    if _debug: sys.stderr.write('successfully converted %s data to unicode\n' % encoding)
+    declmatch = _xml_declaration.match(data)
+    if declmatch:
+        return newdecl + data[declmatch.end():]
+    return newdecl + '\n' + data
+
+def _fallbackEncodings(url, data):
+    '''Returns the encodings to try when none of the declared ones work:
+    the one that worked for url last time (or else chardet's guess from the
+    first ENCODING_PREFIX_SIZE bytes), then utf-8 and windows-1252'''
+    _encoding_cache_lock.acquire()
+    try:
+        guess = _encoding_cache.get(url)
+    finally:
+        _encoding_cache_lock.release()
+    if (not guess) and chardet:
+        try:
+            guess = chardet.detect(data[:ENCODING_PREFIX_SIZE])['encoding']
+        except:
+            pass
+    return [guess, 'utf-8', 'windows-1252']
+
+def _rememberEncoding(url, encoding):
+    '''Records the encoding that decoded the feed at url'''
+    if not url or not ENCODING_CACHE_SIZE:
+        return
+    _encoding_cache_lock.acquire()
+    try:
+        _encoding_cache.pop(url, None)
+        _encoding_cache[url] = encoding
+        while len(_encoding_cache) > ENCODING_CACHE_SIZE:
+            _encoding_cache.popitem(last=False)
+    finally:
+        _encoding_cache_lock.release()
+
+def _decodeDocument(data, url, proposed_encodings):
+    '''Converts data to utf-8 from the first of proposed_encodings that
+    works, trying the fallback encodings after them
+
+    Returns (converted data, encoding), or (data, None) if nothing worked.
+    '''
+    tried_encodings = []
+    fallbacks_added = 0
+    while 1:
+        if not proposed_encodings:
+            if fallbacks_added: break
+            proposed_encodings = _fallbackEncodings(url, data)
+            fallbacks_added = 1
+        proposed_encoding = proposed_encodings.pop(0)
+        if not proposed_encoding: continue
+        if proposed_encoding in tried_encodings: continue
+        tried_encodings.append(proposed_encoding)
+        try:
+            return _convertToUTF8(data, proposed_encoding), proposed_encoding
+        except:
+            pass
+    return data, None
+
 def _stripDoctype(data):
     '''Strips DOCTYPE from XML document, returns (rss_version, stripped_data)
 
@@ -2446,22 +2928,39 @@ def _stripDoctype(data):
     data = doctype_pattern.sub('', data)
     return version, data
     
-def parse(url_file_stream_or_string, etag=None, modified=None, agent=None, referrer=None, handlers=[]):
-    '''Parse a feed from a URL, file, stream, or string'''
-    result = FeedParserDict()
-    result['feed'] = FeedParserDict()
-    result['entries'] = []
-    if _XML_AVAILABLE:
-        result['bozo'] = 0
+def _saveResourceInfo(result, f):
+    '''Copies the HTTP headers and status of an opened resource into result'''
+    if hasattr(f, 'info'):
+        info = f.info()
+        result['etag'] = info.getheader('ETag')
+        last_modified = info.getheader('Last-Modified')
+        if last_modified:
+            result['modified'] = _parse_date(last_modified)
+    if hasattr(f, 'url'):
+        result['href'] = f.url
+        result['status'] = 200
+    if hasattr(f, 'status'):
+        result['status'] = f.status
+    if hasattr(f, 'headers'):
+        result['headers'] = f.headers.dict
+
+def _fetch(result, url_file_stream_or_string, etag, modified, agent, referrer, handlers, timeout, transport):
+    '''Reads (and decompresses) a feed, saving HTTP headers and errors in result
+
+    Returns the raw document, or '' if nothing could be read.
+    '''
     if type(handlers) == types.InstanceType:
         handlers = [handlers]
+    f = None
     try:
-        f = _open_resource(url_file_stream_or_string, etag, modified, agent, referrer, handlers)
+        f = _open_resource(url_file_stream_or_string, etag, modified, agent, referrer, handlers, timeout, transport)
         data = f.read()
     except Exception, e:
         result['bozo'] = 1
         result['bozo_exception'] = e
         data = ''
+        if hasattr(f, 'close'):
+            f.close()
         f = None
 
     # if feed is gzip-compressed, decompress it
@@ -2486,21 +2985,46 @@ def parse(url_file_stream_or_string, etag=None, modified=None, agent=None, refer
                 data = ''
 
     # save HTTP headers
-    if hasattr(f, 'info'):
-        info = f.info()
-        result['etag'] = info.getheader('ETag')
-        last_modified = info.getheader('Last-Modified')
-        if last_modified:
-            result['modified'] = _parse_date(last_modified)
-    if hasattr(f, 'url'):
-        result['href'] = f.url
-        result['status'] = 200
-    if hasattr(f, 'status'):
-        result['status'] = f.status
-    if hasattr(f, 'headers'):
-        result['headers'] = f.headers.dict
+    _saveResourceInfo(result, f)
     if hasattr(f, 'close'):
         f.close()
+    return data
+
+def fetch(url_file_stream_or_string, etag=None, modified=None, agent=None, referrer=None, handlers=[], timeout=None, transport=None):
+    '''Download a feed from a URL, file, stream, or string without parsing it
+
+    Returns a dictionary with the same HTTP information as parse() (bozo,
+    status, headers, etag, modified, href) and 'data', the raw document.
+    Pass data to parse() with headers as response_headers to parse it
+    later, for example in another process.
+    '''
+    result = FeedParserDict()
+    if _XML_AVAILABLE:
+        result['bozo'] = 0
+    result['data'] = _fetch(result, url_file_stream_or_string, etag, modified, agent, referrer, handlers, timeout, transport)
+    return result
+
+def parse(url_file_stream_or_string, etag=None, modified=None, agent=None, referrer=None, handlers=[], timeout=None, transport=None, response_headers=None, href=None):
+    '''Parse a feed from a URL, file, stream, or string
+
+    response_headers is a dictionary of HTTP headers to use as if they had
+    come with the document, for documents downloaded with fetch().  href is
+    the URL such a document came from: it becomes result['href'], so the
+    encoding that decodes the feed is remembered for its next parse.
+    '''
+    result = FeedParserDict()
+    result['feed'] = FeedParserDict()
+    result['entries'] = []
+    if _XML_AVAILABLE:
+        result['bozo'] = 0
+    data = _fetch(result, url_file_stream_or_string, etag, modified, agent, referrer, handlers, timeout, transport)
+    if href and not result.get('href'):
+        result['href'] = href
+    if response_headers:
+        headers = dict(result.get('headers', {}))
+        for name, value in response_headers.items():
+            headers[name.lower()] = value
+        result['headers'] = headers
 
     # there are four encodings to keep track of:
     # - http_encoding is the encoding declared in the Content-Type HTTP header
@@ -2535,48 +3059,12 @@ def parse(url_file_stream_or_string, etag=None, modified=None, agent=None, refer
         return result
 
     # determine character encoding
-    use_strict_parser = 0
-    known_encoding = 0
-    tried_encodings = []
-    # try: HTTP encoding, declared XML encoding, encoding sniffed from BOM
-    for proposed_encoding in (result['encoding'], xml_encoding, sniffed_xml_encoding):
-        if not proposed_encoding: continue
-        if proposed_encoding in tried_encodings: continue
-        tried_encodings.append(proposed_encoding)
-        try:
-            data = _toUTF8(data, proposed_encoding)
-            known_encoding = use_strict_parser = 1
-            break
-        except:
-            pass
-    # if no luck and we have auto-detection library, try that
-    if (not known_encoding) and chardet:
-        try:
-            proposed_encoding = chardet.detect(data)['encoding']
-            if proposed_encoding and (proposed_encoding not in tried_encodings):
-                tried_encodings.append(proposed_encoding)
-                data = _toUTF8(data, proposed_encoding)
-                known_encoding = use_strict_parser = 1
-        except:
-            pass
-    # if still no luck and we haven't tried utf-8 yet, try that
-    if (not known_encoding) and ('utf-8' not in tried_encodings):
-        try:
-            proposed_encoding = 'utf-8'
-            tried_encodings.append(proposed_encoding)
-            data = _toUTF8(data, proposed_encoding)
-            known_encoding = use_strict_parser = 1
-        except:
-            pass
-    # if still no luck and we haven't tried windows-1252 yet, try that
-    if (not known_encoding) and ('windows-1252' not in tried_encodings):
-        try:
-            proposed_encoding = 'windows-1252'
-            tried_encodings.append(proposed_encoding)
-            data = _toUTF8(data, proposed_encoding)
-            known_encoding = use_strict_parser = 1
-        except:
-            pass
+    # try: HTTP encoding, declared XML encoding, encoding sniffed from BOM,
+    # then the encoding that worked last time (or chardet), utf-8, windows-1252
+    href = result.get('href')
+    data, proposed_encoding = _decodeDocument(data, href,
+        [result['encoding'], xml_encoding, sniffed_xml_encoding])
+    known_encoding = use_strict_parser = proposed_encoding and 1 or 0
     # if still no luck, give up
     if not known_encoding:
         result['bozo'] = 1
@@ -2585,12 +3073,14 @@ def parse(url_file_stream_or_string, etag=None, modified=None, agent=None, refer
             '%s, %s, utf-8, and windows-1252 but nothing worked' % \
             (result['encoding'], xml_encoding))
         result['encoding'] = ''
-    elif proposed_encoding != result['encoding']:
-        result['bozo'] = 1
-        result['bozo_exception'] = CharacterEncodingOverride( \
-            'documented declared as %s, but parsed as %s' % \
-            (result['encoding'], proposed_encoding))
-        result['encoding'] = proposed_encoding
+    else:
+        _rememberEncoding(href, proposed_encoding)
+        if proposed_encoding != result['encoding']:
+            result['bozo'] = 1
+            result['bozo_exception'] = CharacterEncodingOverride( \
+                'documented declared as %s, but parsed as %s' % \
+                (result['encoding'], proposed_encoding))
+            result['encoding'] = proposed_encoding
 
     if not _XML_AVAILABLE:
         use_strict_parser = 0
@@ -2627,6 +3117,275 @@ def parse(url_file_stream_or_string, etag=None, modified=None, agent=None, refer
     result['namespaces'] = feedparser.namespacesInUse
     return result
 
+# How many bytes parse_stream reads at a time, and how many it reads
+# before deciding on the character encoding.
+STREAM_CHUNK_SIZE = 16384
+STREAM_SNIFF_SIZE = 1024
+
+def parse_stream(url_file_stream_or_string, etag=None, modified=None, agent=None, referrer=None, handlers=[], timeout=None, chunksize=STREAM_CHUNK_SIZE, transport=None):
+    '''Parse a feed from a URL, file, stream, or string, one chunk at a time
+
+    Returns the same dictionary as parse(), except that result['entries']
+    is an iterator.  The feed is downloaded and parsed as the iterator is
+    consumed, and every entry is yielded as soon as its closing tag has
+    been parsed, so memory use does not grow with the size of the feed.
+    result['feed'], result['version'], result['namespaces'] and the bozo
+    bit are filled in while the entries are consumed, and are complete
+    once the iterator is exhausted.
+
+    The character encoding is decided from the first STREAM_SNIFF_SIZE
+    bytes.  If the feed turns out not to be well-formed part way through,
+    parsing carries on with the loose parser from the last chunk that
+    finished an entry, and entries that were already yielded are skipped.
+    '''
+    result = FeedParserDict()
+    result['feed'] = FeedParserDict()
+    result['entries'] = iter([])
+    if _XML_AVAILABLE:
+        result['bozo'] = 0
+    if type(handlers) == types.InstanceType:
+        handlers = [handlers]
+    try:
+        f = _open_resource(url_file_stream_or_string, etag, modified, agent, referrer, handlers, timeout, transport)
+    except Exception, e:
+        result['bozo'] = 1
+        result['bozo_exception'] = e
+        return result
+    _saveResourceInfo(result, f)
+
+    # if server sent 304, we're done
+    if result.get('status', 0) == 304:
+        result['version'] = ''
+        result['debug_message'] = 'The feed has not changed since you last checked, ' + \
+            'so the server sent no data.  This is a feature, not a bug!'
+        if hasattr(f, 'close'):
+            f.close()
+        return result
+
+    result['entries'] = _streamEntries(result, f, chunksize)
+    return result
+
+def _readChunks(result, f, chunksize):
+    '''Yields the (decompressed) contents of f, chunksize bytes at a time'''
+    decompressor = None
+    if hasattr(f, 'headers'):
+        if zlib and f.headers.get('content-encoding', '') == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif zlib and f.headers.get('content-encoding', '') == 'deflate':
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    try:
+        while 1:
+            try:
+                raw = f.read(chunksize)
+                if not decompressor:
+                    data = raw
+                elif raw:
+                    data = decompressor.decompress(raw)
+                else:
+                    data = decompressor.flush()
+            except Exception, e:
+                result['bozo'] = 1
+                result['bozo_exception'] = e
+                return
+            if data:
+                yield data
+            if not raw:
+                return
+    finally:
+        if hasattr(f, 'close'):
+            f.close()
+
+_stream_boms = [('\x00\x00\xfe\xff', 'utf-32be'),
+                ('\xff\xfe\x00\x00', 'utf-32le'),
+                ('\xfe\xff', 'utf-16be'),
+                ('\xff\xfe', 'utf-16le'),
+                ('\xef\xbb\xbf', 'utf-8')]
+
+def _streamEntryKey(entry):
+    '''Identifies an entry, to avoid yielding it twice'''
+    return entry.get('id') or entry.get('link') or entry.get('title')
+
+def _streamEntries(result, f, chunksize):
+    '''Generator behind parse_stream: parses f and yields its entries'''
+    chunks = _readChunks(result, f, chunksize)
+
+    # read enough of the feed to decide on its character encoding
+    data = ''
+    for chunk in chunks:
+        data += chunk
+        if len(data) >= STREAM_SNIFF_SIZE:
+            break
+    if not data:
+        return
+
+    http_headers = result.get('headers', {})
+    result['encoding'], http_encoding, xml_encoding, sniffed_xml_encoding, acceptable_content_type = \
+        _getCharacterEncoding(http_headers, data)
+    if http_headers and (not acceptable_content_type):
+        if http_headers.has_key('content-type'):
+            bozo_message = '%s is not an XML media type' % http_headers['content-type']
+        else:
+            bozo_message = 'no Content-type specified'
+        result['bozo'] = 1
+        result['bozo_exception'] = NonXMLContentType(bozo_message)
+    result['version'], data = _stripDoctype(data)
+    baseuri = http_headers.get('content-location', result.get('href'))
+    baselang = http_headers.get('content-language', None)
+
+    # determine character encoding, trying the same encodings in the same
+    # order as parse(), but only on the first chunk
+    proposed_encodings = [result['encoding'], xml_encoding, sniffed_xml_encoding]
+    for bom, bom_encoding in _stream_boms:
+        if data.startswith(bom):
+            data = data[len(bom):]
+            proposed_encodings.insert(0, bom_encoding)
+            break
+    proposed_encodings.extend(_fallbackEncodings(result.get('href'), data))
+    decoder = None
+    tried_encodings = []
+    for proposed_encoding in proposed_encodings:
+        if not proposed_encoding: continue
+        if proposed_encoding in tried_encodings: continue
+        tried_encodings.append(proposed_encoding)
+        try:
+            decoder = codecs.getincrementaldecoder(proposed_encoding)()
+            text = decoder.decode(data)
+            break
+        except:
+            decoder = None
+    if not decoder:
+        result['bozo'] = 1
+        result['bozo_exception'] = CharacterEncodingUnknown( \
+            'document encoding unknown, I tried ' + \
+            '%s, %s, utf-8, and windows-1252 but nothing worked' % \
+            (result['encoding'], xml_encoding))
+        result['encoding'] = ''
+    else:
+        if proposed_encoding != result['encoding']:
+            result['bozo'] = 1
+            result['bozo_exception'] = CharacterEncodingOverride( \
+                'documented declared as %s, but parsed as %s' % \
+                (result['encoding'], proposed_encoding))
+            result['encoding'] = proposed_encoding
+        declmatch = re.compile(u'^<\?xml[^>]*?>')
+        newdecl = u'''<?xml version='1.0' encoding='utf-8'?>'''
+        if declmatch.search(text):
+            text = declmatch.sub(newdecl, text)
+        else:
+            text = newdecl + u'\n' + text
+        data = text.encode('utf-8')
+
+    def convert(chunk):
+        if decoder:
+            return decoder.decode(chunk).encode('utf-8')
+        return chunk
+
+    use_strict_parser = decoder and _XML_AVAILABLE
+    if use_strict_parser:
+        feedparser = _StrictFeedParser(baseuri, baselang, 'utf-8')
+        saxparser = xml.sax.make_parser(PREFERRED_XML_PARSERS)
+        saxparser.setFeature(xml.sax.handler.feature_namespaces, 1)
+        saxparser.setContentHandler(feedparser)
+        saxparser.setErrorHandler(feedparser)
+        if hasattr(saxparser, '_ns_stack'):
+            saxparser._ns_stack.append({'http://www.w3.org/XML/1998/namespace':'xml'})
+    else:
+        feedparser = _LooseFeedParser(baseuri, baselang, decoder and 'utf-8' or '')
+    feedparser.entryQueue = []
+    result['feed'] = feedparser.feeddata
+    result['namespaces'] = feedparser.namespacesInUse
+
+    # the loose parser is fed whole tags only, so that its regex
+    # preprocessing never sees half a tag
+    loose_tail = ['']
+    def feed_loose(parser, data, final=0):
+        data = loose_tail[0] + data
+        i = data.rfind('<')
+        if final or i < 0:
+            loose_tail[0] = ''
+        else:
+            data, loose_tail[0] = data[:i], data[i:]
+        if data:
+            parser.feed(data)
+
+    # chunks fed since (and including) the last one that finished an
+    # entry, and the entries yielded from them: enough to restart with
+    # the loose parser without yielding any entry twice
+    replay = []
+    replay_keys = set()
+    skip_keys = set()
+    final = 0
+    while 1:
+        if use_strict_parser:
+            try:
+                if final:
+                    saxparser.close()
+                else:
+                    saxparser.feed(data)
+                failed = 0
+            except Exception, e:
+                result['bozo'] = 1
+                result['bozo_exception'] = feedparser.exc or e
+                failed = 1
+            if not final:
+                if feedparser.entryQueue:
+                    replay = []
+                    replay_keys = set()
+                replay.append(data)
+            finished = feedparser.entryQueue
+            feedparser.entryQueue = []
+            for entry in finished:
+                replay_keys.add(_streamEntryKey(entry))
+                yield entry
+            if failed:
+                use_strict_parser = 0
+                strictparser = feedparser
+                feedparser = _LooseFeedParser(baseuri, baselang, 'utf-8')
+                feedparser.feeddata = strictparser.feeddata
+                feedparser.namespacesInUse = strictparser.namespacesInUse
+                feedparser.version = strictparser.version
+                feedparser.entryQueue = []
+                skip_keys = replay_keys
+                data = ''.join(replay)
+                replay = []
+                continue
+        else:
+            feed_loose(feedparser, data, final)
+            finished = feedparser.entryQueue
+            feedparser.entryQueue = []
+            if final:
+                # like parse(), keep an entry the feed never closed
+                finished.extend(feedparser.entries)
+                feedparser.entries = []
+            for entry in finished:
+                key = _streamEntryKey(entry)
+                if key is not None and key in skip_keys:
+                    skip_keys.discard(key)
+                    continue
+                yield entry
+        if final:
+            break
+        try:
+            data = convert(chunks.next())
+        except StopIteration:
+            final = 1
+            data = ''
+            if decoder:
+                try:
+                    data = decoder.decode('', True).encode('utf-8')
+                except Exception, e:
+                    result['bozo'] = 1
+                    result['bozo_exception'] = e
+                if data:
+                    # feed what the decoder held back before finishing
+                    final = 0
+        except Exception, e:
+            result['bozo'] = 1
+            result['bozo_exception'] = e
+            final = 1
+            data = ''
+    result['version'] = result['version'] or feedparser.version
+
 if __name__ == '__main__':
     if not sys.argv[1:]:
         print __doc__
@@ -0,0 +1,241 @@
+#
+# Remembers which story GUIDs have already been shown
+#
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class BloomFilter(object):
+    """
+    A fixed size set that can only answer "maybe seen" or "never seen".
+
+    It uses about 1.2 bytes per item at a 1% false positive rate and
+    never forgets anything, which makes it a cheap backstop for histories
+    too large to keep exactly.
+    """
+    def __init__(self, capacity, errorRate=0.01):
+        """
+        capacity: number of items the filter is sized for
+        errorRate: false positive rate once capacity items were added
+        """
+        # standard sizing: m = -n ln p / (ln 2)^2, k = m / n ln 2
+        ln2 = math.log(2)
+        nbits = int(-capacity * math.log(errorRate) / (ln2 * ln2)) + 1
+        self.nbits = nbits
+        self.nhashes = max(1, int(round(float(nbits) / capacity * ln2)))
+        self.bits = bytearray((nbits + 7) // 8)
+
+    def positions(self, item):
+        """Returns the bit positions of item (double hashing on md5)"""
+        if type(item) is unicode:
+            item = item.encode('utf-8')
+        digest = hashlib.md5(item).hexdigest()
+        h1 = int(digest[:16], 16)
+        h2 = int(digest[16:], 16) | 1
+        return [(h1 + i * h2) % self.nbits for i in range(self.nhashes)]
+
+    def add(self, item):
+        for pos in self.positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        for pos in self.positions(item):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def save(self, filename):
+        """Writes the filter to filename, replacing it in one rename"""
+        tmpname = filename + '.tmp'
+        outFile = open(tmpname, 'wb')
+        try:
+            outFile.write(self.bits)
+        finally:
+            outFile.close()
+        os.rename(tmpname, filename)
+
+    def load(self, filename):
+        inFile = open(filename, 'rb')
+        try:
+            bits = bytearray(inFile.read())
+        finally:
+            inFile.close()
+        if len(bits) == len(self.bits):
+            self.bits = bits
+
+
+class GuidStore(object):
+    """
+    The set of story GUIDs already shown, for long running pollers.
+
+    Membership checks are O(1), and a store can be shared by threads.
+    The set can be capped: once it holds maxsize GUIDs, the least
+    recently seen ones are forgotten, and GUIDs not seen for ttl seconds
+    are forgotten too. A GUID is seen when it is
+    added and whenever `in` finds it, so the GUID of a story that stays
+    in its feed, and is checked on every poll, is kept.
+
+    With a filename, every GUID is also appended to a log file, so a
+    restarted poller does not show old stories again. The log is
+    rewritten from the live GUIDs when it grows too long, and on close.
+    Lookups are not logged: after a crash, GUIDs only found by `in`
+    since the last rewrite are as old as their last add.
+
+    With bloomCapacity, a BloomFilter remembers every GUID ever added,
+    including the ones evicted by maxsize or ttl. A GUID is then new only
+    if neither knows it, at the price of a small false positive rate
+    (a new story is taken for an old one about 1% of the time once
+    bloomCapacity GUIDs were added). The filter is saved next to the log
+    (filename + '.bloom') before every rewrite, and the GUIDs logged
+    since are added back to it on load, so a crash forgets none.
+    """
+    def __init__(self, maxsize=None, ttl=None, filename=None,
+                 bloomCapacity=None, clock=time.time):
+        """
+        maxsize: maximum number of GUIDs kept exactly, None for no limit
+        ttl: seconds a GUID is kept after it was last seen, None for ever
+        filename: path of the log file backing the store, or None
+        bloomCapacity: number of GUIDs to size a BloomFilter for, or None
+        clock: function returning the current time in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.filename = filename
+        self.clock = clock
+        self.guids = OrderedDict()  # guid -> time last seen, oldest first
+        # lookups reorder self.guids, and the fetch threads of process_many
+        # all look GUIDs up at once
+        self.lock = threading.RLock()
+        self.bloom = None
+        if bloomCapacity:
+            self.bloom = BloomFilter(bloomCapacity)
+        self.logFile = None
+        self.logLines = 0
+        if filename is not None:
+            self.load()
+            self.logFile = open(filename, 'a')
+
+    def load(self):
+        """Reads the GUIDs back from the log file"""
+        if self.bloom is not None and os.path.exists(self.filename + '.bloom'):
+            self.bloom.load(self.filename + '.bloom')
+        if not os.path.exists(self.filename):
+            return
+        inFile = open(self.filename, 'r')
+        try:
+            for line in inFile:
+                try:
+                    seen, guid = json.loads(line)
+                except ValueError:
+                    continue        # a line cut short by a crash
+                self.logLines += 1
+                self.guids.pop(guid, None)
+                if seen is None:
+                    continue        # discarded
+                self.guids[guid] = seen
+                if self.bloom is not None:
+                    self.bloom.add(guid)
+        finally:
+            inFile.close()
+        self.evict()
+
+    def evict(self):
+        """Forgets the GUIDs that are over maxsize or older than ttl"""
+        if self.ttl is not None:
+            oldest = self.clock() - self.ttl
+            while self.guids:
+                guid, seen = next(self.guids.iteritems())
+                if seen >= oldest:
+                    break
+                del self.guids[guid]
+        if self.maxsize is not None:
+            while len(self.guids) > self.maxsize:
+                self.guids.popitem(last=False)
+
+    def __contains__(self, guid):
+        with self.lock:
+            seen = self.guids.get(guid)
+            if seen is not None:
+                now = self.clock()
+                if self.ttl is None or seen >= now - self.ttl:
+                    # seen again: now the most recently seen
+                    del self.guids[guid]
+                    self.guids[guid] = now
+                    return True
+            return self.bloom is not None and guid in self.bloom
+
+    def __len__(self):
+        with self.lock:
+            return len(self.guids)
+
+    def add(self, guid):
+        """Records guid as seen now"""
+        with self.lock:
+            now = self.clock()
+            self.guids.pop(guid, None)
+            self.guids[guid] = now
+            if self.bloom is not None:
+                self.bloom.add(guid)
+            if self.logFile is not None:
+                self.logFile.write(json.dumps([now, guid]) + '\n')
+                self.logFile.flush()
+                self.logLines += 1
+            self.evict()
+            if self.logFile is not None and self.logLines > 2 * len(self.guids) + 1000:
+                self.compact()
+
+    def discard(self, guid):
+        """
+        Forgets guid, if it is kept, so it is new again. A BloomFilter
+        can't forget: with bloomCapacity, guid still looks seen.
+        """
+        with self.lock:
+            if guid not in self.guids:
+                return
+            del self.guids[guid]
+            if self.logFile is not None:
+                self.logFile.write(json.dumps([None, guid]) + '\n')
+                self.logFile.flush()
+                self.logLines += 1
+
+    def addIfNew(self, guid):
+        """
+        Records guid as seen.
+        Returns True if it was not seen before, False otherwise.
+        """
+        with self.lock:
+            isNew = guid not in self
+            self.add(guid)
+            return isNew
+
+    def compact(self):
+        """Rewrites the log file with only the GUIDs still kept"""
+        with self.lock:
+            # the filter first: the GUIDs dropped from the log are only in it
+            if self.bloom is not None:
+                self.bloom.save(self.filename + '.bloom')
+            self.logFile.close()
+            tmpname = self.filename + '.tmp'
+            outFile = open(tmpname, 'w')
+            try:
+                for guid, seen in self.guids.iteritems():
+                    outFile.write(json.dumps([seen, guid]) + '\n')
+            finally:
+                outFile.close()
+            os.rename(tmpname, self.filename)
+            self.logLines = len(self.guids)
+            self.logFile = open(self.filename, 'a')
+
+    def close(self):
+        """Compacts and closes the log file"""
+        with self.lock:
+            if self.logFile is not None:
+                self.compact()
+                self.logFile.close()
+                self.logFile = None
@@ -0,0 +1,105 @@
+#
+# Multi-phrase matching (Aho-Corasick) for phrase triggers
+#
+
+from collections import deque
+
+
+class PhraseIndex(object):
+    """
+    Finds every occurrence of many phrases in a single pass over a text.
+
+    Matching is case-sensitive and phrases may appear anywhere in the
+    text, the same rules PhraseTrigger uses. Each phrase is added with a
+    value (for example the trigger it came from), and search returns the
+    values of the phrases that were found.
+    """
+    def __init__(self, phrases=()):
+        """
+        phrases: iterable of (phrase, value) pairs
+        """
+        self.goto = [{}]        # state -> {char: next state}
+        self.fail = [0]         # state -> longest proper suffix state
+        self.out = [[]]         # state -> values of phrases ending here
+        self.dictLink = [0]     # state -> next suffix state with values
+        self.built = True
+        for phrase, value in phrases:
+            self.add(phrase, value)
+
+    def add(self, phrase, value):
+        """
+        Adds phrase to the index. value is returned by search when
+        the phrase is found. Empty phrases never match.
+        """
+        if not phrase:
+            return
+        state = 0
+        for ch in phrase:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.dictLink.append(0)
+            state = nxt
+        self.out[state].append(value)
+        self.built = False
+
+    def build(self):
+        """
+        Computes the failure links. Called by search when needed.
+        """
+        goto, fail, out, dictLink = self.goto, self.fail, self.out, self.dictLink
+        queue = deque()
+        for nxt in goto[0].values():
+            fail[nxt] = 0
+            dictLink[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].iteritems():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[nxt] = f
+                if out[f]:
+                    dictLink[nxt] = f
+                else:
+                    dictLink[nxt] = dictLink[f]
+                queue.append(nxt)
+        self.built = True
+
+    def search(self, text, found=None):
+        """
+        Returns the set of values of all phrases that appear in text.
+
+        found: optional set to add the values to
+        """
+        if not self.built:
+            self.build()
+        if found is None:
+            found = set()
+        goto, fail, out, dictLink = self.goto, self.fail, self.out, self.dictLink
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            s = state if out[state] else dictLink[state]
+            while s:
+                found.update(out[s])
+                s = dictLink[s]
+        return found
+
+    def searchAll(self, texts):
+        """
+        Returns the set of values of all phrases that appear in any of
+        texts. A phrase has to appear within one text, never across two.
+        """
+        found = set()
+        for text in texts:
+            self.search(text, found)
+        return found
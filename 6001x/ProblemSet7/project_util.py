@@ -2,6 +2,8 @@
 # Utility functions for 6.00
 #
 
+import re
+
 # A HTML escape code -> text decoding table
 HTML_ESCAPE_DECODE_TABLE = { "#39"   : "\'",
                              "quot"  : "\"",
@@ -15,10 +17,58 @@ HTML_ESCAPE_DECODE_TABLE = { "#39"   : "\'",
                              "nbsp"  : " ",
                              "#160"  : " "   }
 
+# A tag or escape code, possibly cut short by the end of the fragment.
+# Inside a tag everything up to '>' is part of the tag, inside an escape
+# code everything up to ';' (even '<') is part of the code.
+HTML_MARKUP = re.compile(r'<[^>]*(?:>|\Z)|&[^;]*(?:;|\Z)')
+
+# Complete tag or escape code -> text, for everything that doesn't
+# translate to nothing (tags) or a space (unknown escape codes)
+HTML_MARKUP_TABLE = { "<br>"     : "\n",
+                      "</table>" : "\n",
+                      "<p>"      : "\n\n" }
+for esc, txt in HTML_ESCAPE_DECODE_TABLE.items():
+    HTML_MARKUP_TABLE["&" + esc + ";"] = txt
+del esc, txt
+
+def _translate_markup(match):
+    markup = match.group()
+    txt = HTML_MARKUP_TABLE.get(markup)
+    if txt is not None:
+        return txt
+    if markup[0] == '&':
+        if markup[-1] == ';':
+            return " "          # unknown escape code -> space
+    elif markup[1:4] == "br " and markup[-1] == '>':
+        return "\n"
+    return ""                   # other tags and unfinished markup
+
 def translate_html(html_fragment):
     """
     Translates a HTML fragment to plain text.
 
+    Gives the same result as translate_html_slow, but finds the tags and
+    escape codes with a single compiled regex instead of stepping through
+    the fragment one character at a time.
+
+    html_fragment: string (ascii or unicode)
+    returns: string (ascii)
+    """
+    if '<' in html_fragment or '&' in html_fragment:
+        txt = HTML_MARKUP.sub(_translate_markup, html_fragment)
+    else:
+        txt = html_fragment
+
+    if type(txt) is unicode:
+        txt = unicode_to_ascii(txt)
+        
+    return txt
+
+def translate_html_slow(html_fragment):
+    """
+    Translates a HTML fragment to plain text, one character at a time.
+    This is the reference implementation translate_html must agree with.
+
     html_fragment: string (ascii or unicode)
     returns: string (ascii)
     """
@@ -76,12 +126,4 @@ def unicode_to_ascii(s):
     
     s: unicode string
     """
-    ret = ""
-    for ch in s:
-        try:
-            ach = str(ch)
-            ret += ach
-        except UnicodeEncodeError:
-            ret += "?"
-    return ret
-
+    return s.encode('ascii', 'replace')
@@ -1,10 +1,25 @@
 # 6.00.1x Problem Set 7
 # RSS Feed Filter
 
+import atexit
 import feedparser
+import itertools
+import multiprocessing
+import operator
+import os
+import re
 import string
+import threading
 import time
+from multiprocessing.pool import ThreadPool
 from project_util import translate_html
+from feed_cache import FeedValidatorCache
+from feed_scheduler import FeedScheduler, feedSchedule
+from phrase_index import PhraseIndex
+from guid_store import GuidStore
+from story_archive import StoryArchive, readChunks, readRecords
+from story_bridge import StoryBridge
+from story_index import StoryIndex, intersect, union, difference
 from Tkinter import *
 
 
@@ -17,26 +32,297 @@ from Tkinter import *
 # Do not change this code
 #======================
 
-def process(url):
+def process(url, timeout=None, skipGuids=None):
     """
     Fetches news items from the rss url and parses them.
     Returns a list of NewsStory-s.
+
+    Returns an empty list if the feed did not change since the last poll.
+    Entries whose guid is in skipGuids are dropped before they are decoded.
     """
-    feed = feedparser.parse(url)
-    entries = feed.entries
-    ret = []
-    for entry in entries:
-        guid = entry.guid
-        title = translate_html(entry.title)
-        link = entry.link
-        summary = translate_html(entry.summary)
-        try:
-            subject = translate_html(entry.tags[0]['term'])
-        except AttributeError:
-            subject = ""
-        newsStory = NewsStory(guid, title, subject, summary, link)
-        ret.append(newsStory)
-    return ret
+    feed = fetchFeed(url, timeout)
+    validatorCache.save()
+    return storiesFromFeed(feed, skipGuids)
+
+VALIDATOR_CACHE_FILENAME = "feed_validators.json"
+validatorCache = FeedValidatorCache(VALIDATOR_CACHE_FILENAME)
+
+# connections are kept open between polls and shared by all feeds on the
+# same host; at most FEED_HOST_LIMIT requests go to one host at a time
+FEED_HOST_LIMIT = 4
+transport = feedparser.HTTPConnectionPool(maxPerHost=FEED_HOST_LIMIT)
+
+def fetchFeed(url, timeout=None):
+    """
+    Downloads and parses the rss url with a conditional GET, using the
+    ETag and Last-Modified validators remembered in validatorCache.
+    An unchanged feed is answered with 304 Not Modified and not parsed.
+    The request goes through the shared connection pool, transport.
+
+    Returns the result of feedparser.parse.
+    """
+    etag, modified = validatorCache.get(url)
+    feed = feedparser.parse(url, etag=etag, modified=modified, timeout=timeout,
+                            transport=transport)
+    validatorCache.update(url, feed)
+    return feed
+
+def storiesFromFeed(feed, skipGuids=None):
+    """
+    Builds a NewsStory for every entry of an already parsed feed.
+    Returns a list of NewsStory-s.
+
+    skipGuids: optional container of guids already seen; their entries
+               are dropped before anything is decoded
+    """
+    if skipGuids is None:
+        return [storyFromEntry(entry) for entry in feed.entries]
+    return [storyFromEntry(entry) for entry in feed.entries
+            if entry.guid not in skipGuids]
+
+def storyFromEntry(entry):
+    """
+    Builds a NewsStory from a single feed entry.
+
+    The story keeps the raw title, subject and summary; translate_html
+    runs on a field only when it is first read (see FeedStory).
+    """
+    try:
+        subject = entry.tags[0]['term']
+    except AttributeError:
+        subject = ""
+    return FeedStory(entry.guid, entry.title, subject, entry.summary,
+                     entry.link)
+
+def processStream(url, timeout=None, skipGuids=None):
+    """
+    Fetches news items from the rss url and parses them while they are
+    downloaded, using feedparser.parse_stream.
+
+    Returns an iterator of NewsStory-s. Each story is available as soon
+    as its entry has been parsed, so stories can be filtered before the
+    whole feed is downloaded, and memory use stays flat however large
+    the feed is. Nothing is yielded if the feed did not change since the
+    last poll. Entries whose guid is in skipGuids are skipped.
+    """
+    etag, modified = validatorCache.get(url)
+    feed = feedparser.parse_stream(url, etag=etag, modified=modified,
+                                   timeout=timeout, transport=transport)
+    validatorCache.update(url, feed)
+    validatorCache.save()
+    for entry in feed.entries:
+        if skipGuids is None or entry.guid not in skipGuids:
+            yield storyFromEntry(entry)
+
+FEED_WORKERS = 8    # how many feeds are fetched at the same time
+FEED_TIMEOUT = 30   # seconds -- socket timeout for a single feed
+
+def _processFeed(args):
+    """
+    Worker for process_many: fetches and parses one feed.
+    Returns a (stories, error, schedule) tuple, error is None on success
+    and schedule is what feedSchedule found in the feed.
+    """
+    url, timeout, skipGuids = args
+    try:
+        feed = fetchFeed(url, timeout)
+        if feed.get('status') == 304:
+            return [], None, feedSchedule(feed)
+        if feed.get('bozo') and not feed.entries:
+            # nothing usable came back, most likely a network error
+            return [], feed.get('bozo_exception'), {}
+        return storiesFromFeed(feed, skipGuids), None, feedSchedule(feed)
+    except Exception as e:
+        return [], e, {}
+
+def process_many(urls, max_workers=FEED_WORKERS, timeout=FEED_TIMEOUT,
+                 skipGuids=None, scheduler=None):
+    """
+    Fetches and parses many rss urls at once on a pool of worker threads.
+
+    urls: list of rss urls
+    max_workers: maximum number of feeds fetched at the same time
+    timeout: seconds any network operation on a single feed may block
+    skipGuids: optional container of guids already seen; their entries
+               are dropped before anything is decoded
+    scheduler: optional FeedScheduler, told the outcome of every poll
+
+    Returns a list of (url, stories, error) tuples in the same order as
+    urls. stories is a list of NewsStory-s, error is None if the feed
+    was processed, otherwise the exception that stopped it. A failing
+    feed never discards the results of the others.
+    """
+    if not urls:
+        return []
+    pool = ThreadPool(max(1, min(max_workers, len(urls))))
+    try:
+        results = pool.map(_processFeed, [(url, timeout, skipGuids)
+                                             for url in urls])
+    finally:
+        pool.close()
+        pool.join()
+    validatorCache.save()
+    if scheduler is not None:
+        for url, (stories, error, schedule) in zip(urls, results):
+            scheduler.update(url, error=error, **schedule)
+    return [(url, stories, error)
+            for url, (stories, error, schedule) in zip(urls, results)]
+
+class FeedParseError(Exception):
+    """A feed could not be parsed by a process_pipeline worker"""
+
+def _fetchRaw(args):
+    """
+    Fetch step of process_pipeline, runs on a thread: downloads one feed
+    with a conditional GET, without parsing it.
+    Returns (url, fetched), fetched is the result of feedparser.fetch.
+    """
+    url, timeout = args
+    etag, modified = validatorCache.get(url)
+    try:
+        fetched = feedparser.fetch(url, etag=etag, modified=modified,
+                                   timeout=timeout, transport=transport)
+    except Exception as e:
+        return url, {'bozo': 1, 'bozo_exception': e, 'data': ''}
+    validatorCache.update(url, fetched)
+    return url, fetched
+
+def _parseRaw(args):
+    """
+    Parse step of process_pipeline, runs in a worker process: parses and
+    sanitizes one downloaded feed.
+
+    Returns (url, records, error, schedule). records is a list of
+    (guid, title, subject, summary, link) tuples holding the raw fields,
+    which are all a FeedStory needs and are cheap to send back. schedule
+    is what feedSchedule found in the feed.
+    """
+    url, data, headers, href = args
+    try:
+        # with href, the worker remembers the encoding of the feed
+        feed = feedparser.parse(data, response_headers=headers, href=href)
+        if feed.get('bozo') and not feed.entries:
+            e = feed.get('bozo_exception')
+            return (url, [], FeedParseError('%s: %s' % (e.__class__.__name__, e)),
+                    {})
+        records = []
+        for entry in feed.entries:
+            try:
+                subject = entry.tags[0]['term']
+            except AttributeError:
+                subject = ""
+            records.append((entry.guid, entry.title, subject, entry.summary,
+                            entry.link))
+        return url, records, None, feedSchedule(feed)
+    except Exception as e:
+        return (url, [], FeedParseError('%s: %s' % (e.__class__.__name__, e)),
+                {})
+
+# (parse_workers, multiprocessing.Pool) kept by process_pipeline between
+# polls, so the parse caches of its workers (dates, markup, encodings)
+# keep hitting from one poll to the next
+_parsePool = (None, None)
+_parsePoolLock = threading.Lock()
+
+def getParsePool(parse_workers=None):
+    """
+    Returns the pool of parse_workers processes process_pipeline parses
+    feeds on, made on the first call and kept until closeParsePool. A
+    call with another number of workers replaces the pool.
+    """
+    global _parsePool
+    with _parsePoolLock:
+        workers, pool = _parsePool
+        if pool is None or workers != parse_workers:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            pool = multiprocessing.Pool(parse_workers)
+            _parsePool = (parse_workers, pool)
+        return pool
+
+def closeParsePool():
+    """Stops the processes of the parse pool, if there is one"""
+    global _parsePool
+    with _parsePoolLock:
+        workers, pool = _parsePool
+        _parsePool = (None, None)
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+atexit.register(closeParsePool)
+
+def process_pipeline(urls, fetch_workers=FEED_WORKERS, parse_workers=None,
+                     timeout=FEED_TIMEOUT, skipGuids=None, scheduler=None):
+    """
+    Fetches many rss urls on a pool of threads and parses them on a pool
+    of processes, so parsing is spread over all cores instead of one.
+
+    urls: list of rss urls
+    fetch_workers: maximum number of feeds downloaded at the same time
+    parse_workers: number of parsing processes, None for one per core
+    timeout: seconds any network operation on a single feed may block
+    skipGuids: optional container of guids already seen; their entries
+               are dropped before anything is decoded
+    scheduler: optional FeedScheduler, told the outcome of every poll
+
+    The parsing processes are kept from one call to the next (see
+    getParsePool), and closeParsePool stops them.
+
+    Returns an iterator of (url, stories, error) tuples like the list
+    process_many returns, except that feeds come out as soon as they are
+    parsed rather than in the order of urls.
+    """
+    if not urls:
+        return
+    # the processes are forked before the fetch threads start, so that no
+    # worker starts life with a lock held by one of them
+    parsePool = getParsePool(parse_workers)
+    fetchPool = ThreadPool(max(1, min(fetch_workers, len(urls))))
+    pending = []
+    try:
+        fetched = fetchPool.imap_unordered(_fetchRaw,
+                                           [(url, timeout) for url in urls])
+        for url, feed in fetched:
+            if feed.get('status') == 304:
+                if scheduler is not None:
+                    scheduler.update(url, notModified=True)
+                yield url, [], None
+            elif feed.get('bozo') and not feed['data']:
+                # nothing was downloaded, most likely a network error
+                if scheduler is not None:
+                    scheduler.update(url, error=feed.get('bozo_exception'))
+                yield url, [], feed.get('bozo_exception')
+            else:
+                headers = dict(feed.get('headers', {}))
+                if feed.get('href'):
+                    headers.setdefault('content-location', feed['href'])
+                pending.append(parsePool.apply_async(
+                    _parseRaw, ((url, feed['data'], headers,
+                                 feed.get('href') or url),)))
+            while pending and pending[0].ready():
+                yield _storiesFromRecords(pending.pop(0).get(), skipGuids,
+                                          scheduler)
+        while pending:
+            yield _storiesFromRecords(pending.pop(0).get(), skipGuids,
+                                      scheduler)
+    finally:
+        fetchPool.close()
+        fetchPool.join()
+        validatorCache.save()
+
+def _storiesFromRecords(result, skipGuids, scheduler=None):
+    """
+    Turns a (url, records, error, schedule) result of _parseRaw into
+    (url, stories, error), telling scheduler the outcome of the poll.
+    """
+    url, records, error, schedule = result
+    if scheduler is not None:
+        scheduler.update(url, error=error, **schedule)
+    if skipGuids is not None:
+        records = [r for r in records if r[0] not in skipGuids]
+    return url, [FeedStory(*record) for record in records], error
 #======================
 
 #======================
@@ -47,17 +333,72 @@ def process(url):
 # Problem 1
 
 class NewsStory(object):
-    def __init__(self):
-        getGuid(self)
-        getTitle(self)
-        getSubject(self)
-        getSummary(self)
-        getLink(self)
-        
+    __slots__ = ('guid', 'title', 'subject', 'summary', 'link')
+
+    def __init__(self, guid, title, subject, summary, link):
+        self.guid = guid
+        self.title = title
+        self.subject = subject
+        self.summary = summary
+        self.link = link
+
+    def getGuid(self):
+        return self.guid
+
+    def getTitle(self):
+        return self.title
+
+    def getSubject(self):
+        return self.subject
+
+    def getSummary(self):
+        return self.summary
+
+    def getLink(self):
+        return self.link
+
     def __str__(self):
         """Returns a string representation of self"""
-        #self.vals.sort()
-        return '{' + ','.join([str(e) for e in self.vals]) + '}'
+        return '{' + ','.join([str(e) for e in (self.getGuid(),
+                                                self.getTitle(),
+                                                self.getSubject(),
+                                                self.getSummary(),
+                                                self.getLink())]) + '}'
+
+class FeedStory(NewsStory):
+    """
+    A NewsStory built straight from a feed entry.
+
+    Title, subject and summary are kept as the raw html from the feed and
+    are translated to plain text the first time they are read, so stories
+    that are filtered out never pay for translate_html on fields no
+    trigger looked at.
+    """
+    __slots__ = ('decoded',)
+
+    TITLE, SUBJECT, SUMMARY = 1, 2, 4   # bits of self.decoded
+
+    def __init__(self, guid, title, subject, summary, link):
+        NewsStory.__init__(self, guid, title, subject, summary, link)
+        self.decoded = 0
+
+    def getTitle(self):
+        if not self.decoded & FeedStory.TITLE:
+            self.title = translate_html(self.title)
+            self.decoded |= FeedStory.TITLE
+        return self.title
+
+    def getSubject(self):
+        if not self.decoded & FeedStory.SUBJECT:
+            self.subject = translate_html(self.subject)
+            self.decoded |= FeedStory.SUBJECT
+        return self.subject
+
+    def getSummary(self):
+        if not self.decoded & FeedStory.SUMMARY:
+            self.summary = translate_html(self.summary)
+            self.decoded |= FeedStory.SUMMARY
+        return self.summary
 
 #======================
 # Part 2
@@ -75,25 +416,80 @@ class Trigger(object):
 # Whole Word Triggers
 # Problems 2-5
 
-# TODO: WordTrigger
+WORD_SEPARATORS = re.compile('[%s\\s]+' % re.escape(string.punctuation))
+
+def splitWords(text):
+    """
+    Splits text into lowercase words. Punctuation separates words just
+    like whitespace does, so "Soft's" gives the words "soft" and "s".
+
+    text: string (ascii or unicode)
+    returns: list of strings
+    """
+    return [word for word in WORD_SEPARATORS.split(text.lower()) if word]
+
+class WordTrigger(Trigger):
+    def __init__(self, word):
+        self.word = word.lower()
+
+    def isWordIn(self, text):
+        """
+        Returns True if self.word appears in text as a whole word,
+        ignoring case and punctuation.
+        """
+        return self.word in splitWords(text)
+
+class TitleTrigger(WordTrigger):
+    def evaluate(self, story):
+        return self.isWordIn(story.getTitle())
+
+class SubjectTrigger(WordTrigger):
+    def evaluate(self, story):
+        return self.isWordIn(story.getSubject())
 
-# TODO: TitleTrigger
-# TODO: SubjectTrigger
-# TODO: SummaryTrigger
+class SummaryTrigger(WordTrigger):
+    def evaluate(self, story):
+        return self.isWordIn(story.getSummary())
 
 
 # Composite Triggers
 # Problems 6-8
 
-# TODO: NotTrigger
-# TODO: AndTrigger
-# TODO: OrTrigger
+class NotTrigger(Trigger):
+    def __init__(self, trigger):
+        self.trigger = trigger
+
+    def evaluate(self, story):
+        return not self.trigger.evaluate(story)
+
+class AndTrigger(Trigger):
+    def __init__(self, trigger1, trigger2):
+        self.trigger1 = trigger1
+        self.trigger2 = trigger2
+
+    def evaluate(self, story):
+        return self.trigger1.evaluate(story) and self.trigger2.evaluate(story)
+
+class OrTrigger(Trigger):
+    def __init__(self, trigger1, trigger2):
+        self.trigger1 = trigger1
+        self.trigger2 = trigger2
+
+    def evaluate(self, story):
+        return self.trigger1.evaluate(story) or self.trigger2.evaluate(story)
 
 
 # Phrase Trigger
 # Question 9
 
-# TODO: PhraseTrigger
+class PhraseTrigger(Trigger):
+    def __init__(self, phrase):
+        self.phrase = phrase
+
+    def evaluate(self, story):
+        return (self.phrase in story.getTitle() or
+                self.phrase in story.getSubject() or
+                self.phrase in story.getSummary())
 
 
 #======================
@@ -107,9 +503,230 @@ def filterStories(stories, triggerlist):
 
     Returns: a list of only the stories for which a trigger in triggerlist fires.
     """
-    # TODO: Problem 10
-    # This is a placeholder (we're just returning all the stories, with no filtering) 
-    return stories
+    ret = []
+    for story in stories:
+        for trigger in triggerlist:
+            if trigger.evaluate(story):
+                ret.append(story)
+                break
+    return ret
+
+#======================
+# Compiled triggers
+#======================
+
+# Node kinds of a compiled trigger list
+WORD, PHRASE, NOT, AND, OR, CUSTOM = range(6)
+
+# story field read by each kind of word trigger
+WORD_TRIGGER_FIELDS = [(TitleTrigger, 'title'),
+                       (SubjectTrigger, 'subject'),
+                       (SummaryTrigger, 'summary')]
+
+# below this many phrase triggers, checking each phrase with the
+# built-in substring search beats a PhraseIndex scan
+# (see bench_phrase_index.py)
+PHRASE_INDEX_MIN = 100
+
+STORY_FIELDS = {'title': operator.methodcaller('getTitle'),
+                'subject': operator.methodcaller('getSubject'),
+                'summary': operator.methodcaller('getSummary')}
+
+class CompiledTriggers(object):
+    """
+    A trigger list compiled for fast evaluation of many stories.
+
+    Every trigger tree is flattened into a list of nodes, and identical
+    subtrees (the same word in the same field, the same phrase, ...) share
+    a single node, so each is evaluated at most once per story.
+
+    All word triggers are folded into one word -> nodes index per field.
+    A story field is split into words once, and every word costs a single
+    dictionary lookup, no matter how many word triggers there are.
+    With many phrase triggers, they are folded into one PhraseIndex, which
+    finds every phrase in a single pass over the story's title, subject
+    and summary.
+
+    The remaining nodes are evaluated lazily with short-circuiting, so a
+    branch that can't change the result is never looked at.
+
+    Triggers other than the ones defined in this file are evaluated by
+    calling their evaluate method.
+    """
+    def __init__(self, triggerlist):
+        """
+        triggerlist: list of Trigger-s, as returned by readTriggerConfig
+        """
+        self.triggerlist = list(triggerlist)
+        self.nodes = []         # (kind, arg1, arg2)
+        self.nodeIds = {}       # node -> index in self.nodes
+        self.wordIndex = {}     # field -> {word: [node index, ...]}
+        self.roots = [self.compile(t) for t in self.triggerlist]
+        # value of every node before a story is looked at: word and phrase
+        # nodes are False until they are found in the story, the rest is
+        # unknown
+        self.initial = [None] * len(self.nodes)
+        for field in self.wordIndex:
+            for ids in self.wordIndex[field].values():
+                for i in ids:
+                    self.initial[i] = False
+        self.phraseIndex = None
+        phraseIds = [i for i, node in enumerate(self.nodes) if node[0] == PHRASE]
+        if len(phraseIds) >= PHRASE_INDEX_MIN:
+            self.phraseIndex = PhraseIndex()
+            for i in phraseIds:
+                self.phraseIndex.add(self.nodes[i][1], i)
+                self.initial[i] = False
+
+    def addNode(self, node):
+        """
+        Returns the index of node, adding it to self.nodes if no identical
+        node has been compiled yet.
+        """
+        if node not in self.nodeIds:
+            self.nodeIds[node] = len(self.nodes)
+            self.nodes.append(node)
+        return self.nodeIds[node]
+
+    def compile(self, trigger):
+        """
+        Compiles trigger and its subtriggers.
+        Returns the index of the node for trigger.
+        """
+        for triggerType, field in WORD_TRIGGER_FIELDS:
+            if type(trigger) is triggerType:
+                node = (WORD, field, trigger.word)
+                isNew = node not in self.nodeIds
+                i = self.addNode(node)
+                if isNew:
+                    self.wordIndex.setdefault(field, {}) \
+                        .setdefault(trigger.word, []).append(i)
+                return i
+        if type(trigger) is PhraseTrigger:
+            return self.addNode((PHRASE, trigger.phrase, None))
+        if type(trigger) is NotTrigger:
+            return self.addNode((NOT, self.compile(trigger.trigger), None))
+        if type(trigger) is AndTrigger:
+            return self.addNode((AND, self.compile(trigger.trigger1),
+                                 self.compile(trigger.trigger2)))
+        if type(trigger) is OrTrigger:
+            return self.addNode((OR, self.compile(trigger.trigger1),
+                                 self.compile(trigger.trigger2)))
+        return self.addNode((CUSTOM, trigger, None))
+
+    def scan(self, story):
+        """
+        Returns the node values for story with all word and phrase nodes
+        resolved.
+        """
+        values = self.initial[:]
+        for field, index in self.wordIndex.iteritems():
+            for word in set(splitWords(STORY_FIELDS[field](story))):
+                ids = index.get(word)
+                if ids:
+                    for i in ids:
+                        values[i] = True
+        if self.phraseIndex is not None:
+            for i in self.phraseIndex.searchAll((story.getTitle(),
+                                                 story.getSubject(),
+                                                 story.getSummary())):
+                values[i] = True
+        return values
+
+    def value(self, i, story, values):
+        """
+        Returns the value of node i for story, evaluating it if it is
+        not known yet.
+        """
+        v = values[i]
+        if v is None:
+            kind, arg1, arg2 = self.nodes[i]
+            if kind == AND:
+                v = (self.value(arg1, story, values) and
+                     self.value(arg2, story, values))
+            elif kind == OR:
+                v = (self.value(arg1, story, values) or
+                     self.value(arg2, story, values))
+            elif kind == NOT:
+                v = not self.value(arg1, story, values)
+            elif kind == PHRASE:
+                v = (arg1 in story.getTitle() or
+                     arg1 in story.getSubject() or
+                     arg1 in story.getSummary())
+            else:
+                v = bool(arg1.evaluate(story))
+            values[i] = v
+        return v
+
+    def evaluate(self, story):
+        """
+        Returns True if any trigger of the list fires for story.
+        """
+        values = self.scan(story)
+        for root in self.roots:
+            if self.value(root, story, values):
+                return True
+        return False
+
+    def firedTriggers(self, story):
+        """
+        Returns the list of triggers of the list that fire for story.
+        """
+        return [self.triggerlist[i] for i in self.firedIndexes(story)]
+
+    def firedIndexes(self, story):
+        """
+        Returns the positions in the trigger list of the triggers that
+        fire for story.
+        """
+        values = self.scan(story)
+        return [i for i, root in enumerate(self.roots)
+                if self.value(root, story, values)]
+
+    def filter(self, stories):
+        """
+        Returns: a list of only the stories for which a trigger fires,
+        same as filterStories(stories, self.triggerlist).
+        """
+        return [story for story in stories if self.evaluate(story)]
+
+def buildPhraseIndex(triggerlist):
+    """
+    Collects every PhraseTrigger in the trigger trees of triggerlist.
+
+    Returns a PhraseIndex whose values are the PhraseTrigger-s, so that
+    firedPhraseTriggers can find all of them in one pass over a story.
+    """
+    index = PhraseIndex()
+    pending = list(triggerlist)
+    seen = set()
+    while pending:
+        trigger = pending.pop()
+        if id(trigger) in seen:
+            continue
+        seen.add(id(trigger))
+        if isinstance(trigger, PhraseTrigger):
+            index.add(trigger.phrase, trigger)
+        elif isinstance(trigger, NotTrigger):
+            pending.append(trigger.trigger)
+        elif isinstance(trigger, (AndTrigger, OrTrigger)):
+            pending.append(trigger.trigger1)
+            pending.append(trigger.trigger2)
+    return index
+
+def firedPhraseTriggers(phraseIndex, story):
+    """
+    Returns the set of PhraseTrigger-s of phraseIndex that fire for story.
+    """
+    return phraseIndex.searchAll((story.getTitle(), story.getSubject(),
+                                  story.getSummary()))
+
+def compileTriggers(triggerlist):
+    """
+    Compiles a list of triggers, as returned by readTriggerConfig.
+    Returns a CompiledTriggers.
+    """
+    return CompiledTriggers(triggerlist)
 
 #======================
 # Part 4
@@ -131,26 +748,52 @@ def makeTrigger(triggerMap, triggerType, params, name):
 
     Returns a new instance of a trigger (ex: TitleTrigger, AndTrigger).
     """
-    # TODO: Problem 11
+    if triggerType == "TITLE":
+        trigger = TitleTrigger(params[0])
+    elif triggerType == "SUBJECT":
+        trigger = SubjectTrigger(params[0])
+    elif triggerType == "SUMMARY":
+        trigger = SummaryTrigger(params[0])
+    elif triggerType == "PHRASE":
+        trigger = PhraseTrigger(" ".join(params))
+    elif triggerType == "NOT":
+        trigger = NotTrigger(triggerMap[params[0]])
+    elif triggerType == "AND":
+        trigger = AndTrigger(triggerMap[params[0]], triggerMap[params[1]])
+    elif triggerType == "OR":
+        trigger = OrTrigger(triggerMap[params[0]], triggerMap[params[1]])
+    else:
+        raise ValueError("unknown trigger type: " + triggerType)
+    triggerMap[name] = trigger
+    return trigger
 
 
-def readTriggerConfig(filename):
+def readTriggerLines(filename):
     """
-    Returns a list of trigger objects
-    that correspond to the rules set
-    in the file filename
+    Returns the lines of the trigger config file filename,
+    without blank lines and comments
     """
-
     # Here's some code that we give you
     # to read in the file and eliminate
     # blank lines and comments
     triggerfile = open(filename, "r")
     all = [ line.rstrip() for line in triggerfile.readlines() ]
+    triggerfile.close()
     lines = []
     for line in all:
         if len(line) == 0 or line[0] == '#':
             continue
         lines.append(line)
+    return lines
+
+def readTriggerConfig(filename):
+    """
+    Returns a list of trigger objects
+    that correspond to the rules set
+    in the file filename
+    """
+
+    lines = readTriggerLines(filename)
 
     triggers = []
     triggerMap = {}
@@ -172,26 +815,348 @@ def readTriggerConfig(filename):
                 triggers.append(triggerMap[name])
 
     return triggers
-    
-import thread
 
-SLEEPTIME = 60 #seconds -- how often we poll
+# trigger types whose parameters are names of other triggers
+COMPOSITE_TRIGGER_TYPES = ("NOT", "AND", "OR")
+
+class WatchedTriggerConfig(object):
+    """
+    A trigger config file that is reloaded when it changes, so the rules
+    can be edited while the poller runs.
+
+    On reload, every trigger definition is compared with the previous
+    one. Only triggers whose definition changed, and the composite
+    triggers built on them, are made again; the others are reused as
+    they are. The new trigger list is compiled and swapped in with a
+    single assignment, so self.active is always a complete trigger set.
+
+    A config that can't be read or has errors is ignored, and the
+    previous triggers stay active.
+    """
+    def __init__(self, filename):
+        """
+        filename: path of the trigger config file
+        """
+        self.filename = filename
+        self.definitions = {}   # name -> (trigger type, params)
+        self.triggerMap = {}    # name -> trigger
+        self.triggerlist = []
+        self.active = CompiledTriggers([])
+        self.stamp = None       # (mtime, size) of the file last loaded
+        self.rebuilt = set()    # names made again by the last reload
+        self.error = None       # why the last reload failed, or None
+        self.check()
+
+    def check(self):
+        """
+        Reloads the config if the file changed since it was last loaded.
+        Returns True if a new trigger set was swapped in.
+        """
+        try:
+            st = os.stat(self.filename)
+        except OSError as e:
+            self.error = e
+            return False
+        stamp = (st.st_mtime, st.st_size)
+        if stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        try:
+            self.reload(readTriggerLines(self.filename))
+        except (IOError, IndexError, KeyError, ValueError) as e:
+            self.error = e
+            return False
+        self.error = None
+        return True
+
+    def reload(self, lines):
+        """
+        Builds the trigger set described by lines, reusing the triggers
+        whose definition did not change, and makes it the active one.
+        """
+        definitions = {}
+        triggerMap = {}
+        rebuilt = set()
+        triggers = []
+        for line in lines:
+            linesplit = line.split(" ")
+            if linesplit[0] == "ADD":
+                for name in linesplit[1:]:
+                    triggers.append(triggerMap[name])
+                continue
+            name, triggerType, params = linesplit[0], linesplit[1], linesplit[2:]
+            definition = (triggerType, tuple(params))
+            uses = ()
+            if triggerType in COMPOSITE_TRIGGER_TYPES:
+                uses = params
+            if (self.definitions.get(name) != definition or
+                    name not in self.triggerMap or
+                    [n for n in uses if n in rebuilt]):
+                makeTrigger(triggerMap, triggerType, params, name)
+                rebuilt.add(name)
+            else:
+                triggerMap[name] = self.triggerMap[name]
+            definitions[name] = definition
+        active = compileTriggers(triggers)
+        # nothing failed, swap the new set in
+        self.definitions = definitions
+        self.triggerMap = triggerMap
+        self.triggerlist = triggers
+        self.rebuilt = rebuilt
+        self.active = active
+
+    def filter(self, stories):
+        """
+        Returns: a list of only the stories for which an active trigger
+        fires.
+        """
+        return self.active.filter(stories)
+
+#======================
+# Replay
+#======================
+
+REPLAY_CHUNK = 2000     # archive lines handed to a replay worker at a time
+
+_replayTriggers = None  # CompiledTriggers of a replay worker process
+
+def _initReplayWorker(triggerlist):
+    global _replayTriggers
+    _replayTriggers = compileTriggers(triggerlist)
+
+def _replayChunk(lines):
+    """
+    Replays archive lines against _replayTriggers.
+    Returns (stories, matched, counts): the number of stories, of stories
+    some trigger fired for, and of stories each trigger fired for.
+    """
+    counts = [0] * len(_replayTriggers.triggerlist)
+    stories = matched = 0
+    for record in readRecords(lines):
+        fired = _replayTriggers.firedIndexes(NewsStory(*record))
+        stories += 1
+        if fired:
+            matched += 1
+            for i in fired:
+                counts[i] += 1
+    return stories, matched, counts
+
+def replay(filename, triggerlist, workers=1, chunksize=REPLAY_CHUNK):
+    """
+    Runs a trigger list against the stories of an archive, for trying
+    out a trigger config on past stories before using it live.
+
+    filename: path of a StoryArchive file
+    triggerlist: list of Trigger-s, as returned by readTriggerConfig
+    workers: number of processes evaluating stories, None for one per core
+    chunksize: number of stories handed to a worker at a time
+
+    Returns a dictionary with the number of stories replayed, the number
+    a trigger fired for (the stories filterStories would keep), the number
+    each trigger of triggerlist fired for, the seconds taken and the
+    stories replayed per second.
+    """
+    start = time.time()
+    counts = [0] * len(triggerlist)
+    stories = matched = 0
+    chunks = readChunks(filename, chunksize)
+    if workers == 1:
+        _initReplayWorker(triggerlist)
+        results = itertools.imap(_replayChunk, chunks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, _initReplayWorker, (triggerlist,))
+        results = pool.imap(_replayChunk, chunks)
+    try:
+        for chunkStories, chunkMatched, chunkCounts in results:
+            stories += chunkStories
+            matched += chunkMatched
+            for i, count in enumerate(chunkCounts):
+                counts[i] += count
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    seconds = time.time() - start
+    if seconds:
+        rate = stories / seconds
+    else:
+        rate = 0.0
+    return {'stories': stories, 'matched': matched, 'triggers': counts,
+            'seconds': seconds, 'stories_per_sec': rate}
+
+#======================
+# Story index
+#======================
+
+def storyTerms(record):
+    """
+    Returns the words of a (guid, title, subject, summary, link) record
+    per field, split the way the word triggers split them, for a
+    StoryIndex.
+    """
+    guid, title, subject, summary, link = record
+    return {'title': splitWords(title), 'subject': splitWords(subject),
+            'summary': splitWords(summary)}
+
+def openStoryIndex(directory):
+    """Opens the StoryIndex kept in directory, for queryIndex"""
+    return StoryIndex(directory, storyTerms)
+
+def _phraseCandidates(index, phrase, start, vocabulary):
+    """
+    Returns the sorted ids, from start on, of the stories that may
+    contain phrase, or None if any story may.
+
+    Within the phrase, a word between two others is a whole word of the
+    story field it is found in; the first word may be the end of a longer
+    word and the last the start of one, unless the phrase starts or ends
+    with a separator. A single word may be anywhere inside a word.
+    vocabulary caches index.words per field.
+    """
+    words = splitWords(phrase)
+    if not words:
+        return None
+    openStart = not WORD_SEPARATORS.match(phrase[0])
+    openEnd = not WORD_SEPARATORS.match(phrase[-1])
+    candidates = set()
+    for field in STORY_FIELDS:
+        if field not in vocabulary:
+            vocabulary[field] = index.words(field)
+        fieldIds = None
+        for i, word in enumerate(words):
+            isFirst = openStart and i == 0
+            isLast = openEnd and i == len(words) - 1
+            if isFirst and isLast:
+                matches = [w for w in vocabulary[field] if word in w]
+            elif isFirst:
+                matches = [w for w in vocabulary[field] if w.endswith(word)]
+            elif isLast:
+                matches = [w for w in vocabulary[field] if w.startswith(word)]
+            else:
+                matches = [word]
+            wordIds = set()
+            for match in matches:
+                wordIds.update(index.postings(field, match, start))
+            if fieldIds is None:
+                fieldIds = sorted(wordIds)
+            else:
+                fieldIds = intersect(fieldIds, sorted(wordIds))
+            if not fieldIds:
+                break
+        candidates.update(fieldIds)
+    return sorted(candidates)
+
+def _queryIds(index, trigger, start, vocabulary):
+    """
+    Runs trigger against the stories of index from id start on, as
+    posting list operations.
+
+    Returns (ids, negated): the sorted ids of the stories trigger fires
+    for, or if negated is True, of the stories it does not fire for.
+    Carrying NOT along this way turns AND NOT into a difference instead
+    of a scan of every story.
+    """
+    for triggerType, field in WORD_TRIGGER_FIELDS:
+        if type(trigger) is triggerType:
+            return index.postings(field, trigger.word, start), False
+    if type(trigger) is NotTrigger:
+        ids, negated = _queryIds(index, trigger.trigger, start, vocabulary)
+        return ids, not negated
+    if type(trigger) in (AndTrigger, OrTrigger):
+        ids1, negated1 = _queryIds(index, trigger.trigger1, start, vocabulary)
+        ids2, negated2 = _queryIds(index, trigger.trigger2, start, vocabulary)
+        isAnd = type(trigger) is AndTrigger
+        if negated1 and negated2:
+            # De Morgan: NOT a AND NOT b is NOT (a OR b), and vice versa
+            if isAnd:
+                return union(ids1, ids2), True
+            return intersect(ids1, ids2), True
+        if negated1 or negated2:
+            if negated1:
+                ids1, ids2 = ids2, ids1
+            # a AND NOT b, or a OR NOT b which is NOT (b AND NOT a)
+            if isAnd:
+                return difference(ids1, ids2), False
+            return difference(ids2, ids1), True
+        if isAnd:
+            return intersect(ids1, ids2), False
+        return union(ids1, ids2), False
+    # phrase and custom triggers are checked against the stories
+    # themselves, phrases only against the stories that may contain them
+    candidates = None
+    if type(trigger) is PhraseTrigger:
+        candidates = _phraseCandidates(index, trigger.phrase, start, vocabulary)
+    if candidates is None:
+        candidates = xrange(start, len(index))
+    return [i for i in candidates
+            if trigger.evaluate(NewsStory(*index.get(i)))], False
+
+def queryIndex(index, triggerlist, since=None):
+    """
+    Finds the stories of a StoryIndex some trigger of triggerlist fires
+    for, without looking at every story: word triggers are looked up in
+    the index, and trigger trees become intersections and unions of
+    their posting lists.
+
+    index: StoryIndex, as returned by openStoryIndex
+    triggerlist: list of Trigger-s, as returned by readTriggerConfig
+    since: only look at the stories indexed at or after this time (in
+           seconds, like time.time()), None for all of them
+
+    Returns a list of NewsStory-s, oldest first: the stories filterStories
+    would keep out of all the stories indexed since then.
+    """
+    start = 0
+    if since is not None:
+        start = index.firstSince(since)
+    vocabulary = {}
+    ids = []
+    for trigger in triggerlist:
+        triggerIds, negated = _queryIds(index, trigger, start, vocabulary)
+        if negated:
+            triggerIds = difference(xrange(start, len(index)), triggerIds)
+        ids = union(ids, triggerIds)
+    return [NewsStory(*index.get(i)) for i in ids]
+
+SLEEPTIME = 60 #seconds -- shortest time between two polls of a feed
+MAX_SLEEPTIME = 3600    # seconds -- longest time between two polls of a feed
+
+GUID_HISTORY = 100000   # how many shown stories are remembered
+GUID_FILENAME = "guids_shown.jsonl"
+
+PIPELINE = False    # parse feeds on one process per core (process_pipeline)
+
+# every new story polled is appended to this StoryArchive, for replay;
+# None to keep no archive
+ARCHIVE_FILENAME = None
+
+# every new story polled is added to the StoryIndex in this directory,
+# for queryIndex; None to keep no index
+INDEX_DIRECTORY = None
+
+UI_REFRESH = 200    # milliseconds between two looks at the story queue
+UI_BATCH = 50       # most stories added to the window at once
+UI_BACKLOG = 1000   # most stories waiting for the window, oldest dropped
+
+FEEDS = ["http://news.google.com/?output=rss",
+         "http://rss.news.yahoo.com/rss/topstories"]
 
 
 def main_thread(master):
-    # A sample trigger list - you'll replace
-    # this with something more configurable in Problem 11
+    """
+    Builds the reader window on master and starts polling the feeds on
+    a background thread. Must be called on the Tk thread.
+
+    The poller only pushes the stories to show into a StoryBridge; the
+    window takes them out in batches on an after() timer, so widgets are
+    only ever touched by the Tk thread.
+    """
     try:
-        # These will probably generate a few hits...
-        t1 = TitleTrigger("Obama")
-        t2 = SubjectTrigger("Romney")
-        t3 = PhraseTrigger("Election")
-        t4 = OrTrigger(t2, t3)
-        triggerlist = [t1, t4]
-        
-        # TODO: Problem 11
-        # After implementing makeTrigger, uncomment the line below:
-        # triggerlist = readTriggerConfig("triggers.txt")
+        # triggers.txt is reloaded whenever it is edited
+        triggerConfig = WatchedTriggerConfig("triggers.txt")
+        if triggerConfig.error is not None:
+            raise triggerConfig.error
 
         # **** from here down is about drawing ****
         frame = Frame(master)
@@ -207,37 +1172,124 @@ def main_thread(master):
         cont = Text(master, font=("Helvetica",14), yscrollcommand=scrollbar.set)
         cont.pack(side=BOTTOM)
         cont.tag_config("title", justify='center')
-        button = Button(frame, text="Exit", command=root.destroy)
+        scrollbar.config(command=cont.yview)
+        button = Button(frame, text="Exit", command=master.destroy)
         button.pack(side=BOTTOM)
 
+        bridge = StoryBridge(maxsize=UI_BACKLOG)
+        showStories(master, cont, bridge)
+        poller = threading.Thread(target=pollStories,
+                                  args=(bridge, triggerConfig))
+        poller.daemon = True
+        poller.start()
+
+    except Exception as e:
+        print e
+
+def showStories(master, cont, bridge):
+    """
+    Tk side of the bridge: adds the next batch of stories to the text
+    widget cont with a single insert, then schedules itself again.
+    """
+    stories = bridge.take(UI_BATCH)
+    if stories:
+        chunks = []
+        for newstory in stories:
+            chunks.extend([newstory.getTitle()+"\n", "title",
+                           "\n---------------------------------------------------------------\n", "title",
+                           newstory.getSummary(), (),
+                           "\n*********************************************************************\n", "title"])
+        cont.insert(END, *chunks)
+    # come back right away while there is a backlog
+    if len(bridge):
+        delay = 1
+    else:
+        delay = UI_REFRESH
+    master.after(delay, showStories, master, cont, bridge)
+
+def pollStories(bridge, triggerConfig):
+    """
+    Poller side of the bridge: polls each feed when the FeedScheduler
+    says it is due and puts the stories to show into bridge. Runs on its
+    own thread.
+    """
+    try:
         # Gather stories
-        guidShown = []
-        def get_cont(newstory):
-            if newstory.getGuid() not in guidShown:
-                cont.insert(END, newstory.getTitle()+"\n", "title")
-                cont.insert(END, "\n---------------------------------------------------------------\n", "title")
-                cont.insert(END, newstory.getSummary())
-                cont.insert(END, "\n*********************************************************************\n", "title")
-                guidShown.append(newstory.getGuid())
+        guidShown = GuidStore(maxsize=GUID_HISTORY, filename=GUID_FILENAME)
+        if ARCHIVE_FILENAME:
+            archive = StoryArchive(ARCHIVE_FILENAME)
+            guidArchived = GuidStore(maxsize=GUID_HISTORY,
+                                     filename=ARCHIVE_FILENAME + ".guids")
+        if INDEX_DIRECTORY:
+            storyIndex = openStoryIndex(INDEX_DIRECTORY)
+            guidIndexed = GuidStore(maxsize=GUID_HISTORY,
+                                    filename=os.path.join(INDEX_DIRECTORY,
+                                                          "guids.jsonl"))
+        # every feed is polled as often as it changes, from this one loop
+        scheduler = FeedScheduler(FEEDS, minInterval=SLEEPTIME,
+                                  maxInterval=MAX_SLEEPTIME)
 
         while True:
 
-            print "Polling . . .",
-            # Get stories from Google's Top Stories RSS news feed
-            stories = process("http://news.google.com/?output=rss")
+            due = scheduler.popDue()
+            if not due:
+                nextDue = scheduler.nextDue()
+                if nextDue is None:
+                    # no feed to wait for
+                    time.sleep(SLEEPTIME)
+                else:
+                    time.sleep(max(0, nextDue - time.time()))
+                continue
+
+            try:
+                print "Polling", len(due), "feeds . . .",
+                # Get stories from Google's and Yahoo's Top Stories RSS news feeds
+                stories = []
+                # stories already shown are dropped before they are decoded
+                if PIPELINE:
+                    results = process_pipeline(due, skipGuids=guidShown,
+                                               scheduler=scheduler)
+                else:
+                    results = process_many(due, skipGuids=guidShown,
+                                           scheduler=scheduler)
+                for url, feedStories, error in results:
+                    if error is not None:
+                        print "Failed to fetch", url, ":", error
+                    stories.extend(feedStories)
 
-            # Get stories from Yahoo's Top Stories RSS news feed
-            stories.extend(process("http://rss.news.yahoo.com/rss/topstories"))
+                if ARCHIVE_FILENAME:
+                    archive.extend([story for story in stories
+                                    if guidArchived.addIfNew(story.getGuid())])
+                if INDEX_DIRECTORY:
+                    storyIndex.extend([(story.getGuid(), story.getTitle(),
+                                        story.getSubject(), story.getSummary(),
+                                        story.getLink())
+                                       for story in stories
+                                       if guidIndexed.addIfNew(story.getGuid())])
 
-            # Process the stories
-            stories = filterStories(stories, triggerlist)
+                # Process the stories, with the latest trigger config
+                if triggerConfig.check():
+                    print "Reloaded triggers.txt, rebuilt", sorted(triggerConfig.rebuilt)
+                elif triggerConfig.error is not None:
+                    print "Keeping the old triggers, triggers.txt has errors:", triggerConfig.error
+                stories = triggerConfig.filter(stories)
 
-            map(get_cont, stories)
-            scrollbar.config(command=cont.yview)
+                dropped = bridge.put([story for story in stories
+                                      if guidShown.addIfNew(story.getGuid())])
+                if dropped:
+                    # never shown: they come back if still in their feed
+                    for story in dropped:
+                        guidShown.discard(story.getGuid())
+                    print "Window is behind,", len(dropped), "stories dropped"
 
+            except Exception as e:
+                print "Poll failed:", e
+            finally:
+                # feeds the poll never got to are polled again later
+                scheduler.reschedule(due)
 
-            print "Sleeping..."
-            time.sleep(SLEEPTIME)
+            print "Validator cache:", validatorCache.stats()
+            print "Poll intervals:", scheduler.stats()
 
     except Exception as e:
         print e
@@ -247,6 +1299,5 @@ if __name__ == '__main__':
 
     root = Tk()
     root.title("Some RSS parser")
-    thread.start_new_thread(main_thread, (root,))
+    main_thread(root)
     root.mainloop()
-
@@ -2,7 +2,16 @@
 # Problem Set 7 Test Suite
 import unittest
 import sys 
+import os
+import tempfile
+import threading
+import BaseHTTPServer
+import SocketServer
+import time
+import random
+import ps7
 from ps7 import *
+from project_util import translate_html_slow
 
 class ProblemSet7NewsStory(unittest.TestCase):
     def setUp(self):
@@ -200,11 +209,1009 @@ class ProblemSet7(unittest.TestCase):
         self.assertTrue(nob in filteredStories)
         self.assertEquals(2, len(filteredStories))
 
+SAMPLE_RSS = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>%(name)s</title>
+<item><guid>%(name)s-1</guid><title>%(name)s first</title>
+<link>http://example.com/%(name)s/1</link>
+<description>Koala bears are &lt;b&gt;soft&lt;/b&gt;</description>
+<category>world</category></item>
+<item><guid>%(name)s-2</guid><title>%(name)s second</title>
+<link>http://example.com/%(name)s/2</link>
+<description>New York City</description></item>
+</channel></rss>"""
+
+class ProblemSet7ProcessMany(unittest.TestCase):
+    def testKeepsFeedOrder(self):
+        feeds = [SAMPLE_RSS % {'name': name} for name in ['a', 'b', 'c']]
+        results = process_many(feeds, max_workers=2)
+        self.assertEquals([url for url, stories, error in results], feeds)
+        for (url, stories, error), name in zip(results, ['a', 'b', 'c']):
+            self.assertEquals(error, None)
+            self.assertEquals([s.getGuid() for s in stories],
+                              [name + '-1', name + '-2'])
+        self.assertEquals(results[0][1][0].getSummary(), 'Koala bears are soft')
+        self.assertEquals(results[0][1][0].getSubject(), 'world')
+
+    def testReportsFeedErrors(self):
+        feeds = [SAMPLE_RSS % {'name': 'a'}, "http://127.0.0.1:1/rss"]
+        results = process_many(feeds, timeout=1)
+        self.assertEquals(len(results[0][1]), 2)
+        self.assertEquals(results[0][2], None)
+        self.assertEquals(results[1][1], [])
+        self.assertNotEquals(results[1][2], None)
+
+    def testNoFeeds(self):
+        self.assertEquals(process_many([]), [])
+
+class _FeedHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    etag = '"v1"'
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = SAMPLE_RSS % {'name': 'http'}
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args):
+        pass
+
+TRANSLATE_HTML_CORPUS = [
+    '', 'plain text', 'a &amp; b &foo; <br/> <br> <br x> <p> </table> <P> &lt;',
+    'x &amp y', '<a', 'a<b>c', '&', '&;', '<>', '<br', '<br ', '<br >', '&a<b>;c',
+    'Koala bears are &lt;b&gt;soft&lt;/b&gt;', '<p>One</p><p>Two</p>&#39;&#34;&#38;&#60;&#62;&#160;',
+    '<a href="http://example.com/?a=1&b=2">link</a> &quot;quoted&quot;&nbsp;',
+    'tail newline <b\n', 'escape at end &amp', u'caf\xe9 <b>x</b> &#39;', u'\u2019&nbsp;;<p>',
+    u'<table><tr><td>\u4e2d\u6587</td></tr></table>', u'&lt;\xe9&gt;', u'only ascii unicode',
+    u'<b>', u'&amp;',
+]
+
+class ProblemSet7TranslateHtml(unittest.TestCase):
+    def assertSameAsSlow(self, fragment):
+        fast = translate_html(fragment)
+        slow = translate_html_slow(fragment)
+        self.assertEquals((fast, type(fast)), (slow, type(slow)), repr(fragment))
+
+    def testGoldenCorpus(self):
+        for fragment in TRANSLATE_HTML_CORPUS:
+            self.assertSameAsSlow(fragment)
+
+    def testRandomFragments(self):
+        rand = random.Random(6001)
+        pieces = ['<', '>', '&', ';', 'br', 'p', '/', ' ', 'table', 'amp', 'nbsp',
+                  '#39', 'a', '\n', u'\xe9', u'\u2019']
+        for i in range(2000):
+            fragment = ''.join([rand.choice(pieces) for j in range(rand.randint(0, 20))])
+            self.assertSameAsSlow(fragment)
+
+class ProblemSet7GuidStore(unittest.TestCase):
+    def setUp(self):
+        self.now = [1000.0]
+        fd, self.filename = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        os.remove(self.filename)
+
+    def tearDown(self):
+        for name in [self.filename, self.filename + '.bloom']:
+            if os.path.exists(name):
+                os.remove(name)
+
+    def clock(self):
+        return self.now[0]
+
+    def testLeastRecentlySeenIsEvicted(self):
+        store = GuidStore(maxsize=2)
+        for guid in ['a', 'b', 'a', 'c']:
+            store.add(guid)
+        self.assertTrue('a' in store)
+        self.assertTrue('c' in store)
+        self.assertFalse('b' in store)
+        self.assertEquals(len(store), 2)
+
+    def testTtl(self):
+        store = GuidStore(ttl=60, clock=self.clock)
+        self.assertTrue(store.addIfNew('a'))
+        self.now[0] += 30
+        self.assertFalse(store.addIfNew('a'))
+        self.now[0] += 61
+        self.assertFalse('a' in store)
+        self.assertTrue(store.addIfNew('a'))
+
+    def testSurvivesRestart(self):
+        store = GuidStore(maxsize=3, filename=self.filename, clock=self.clock)
+        for guid in ['a', 'b', u'caf\xe9', 'd']:
+            store.add(guid)
+        restarted = GuidStore(maxsize=3, filename=self.filename, clock=self.clock)
+        self.assertEquals(list(restarted.guids), ['b', u'caf\xe9', 'd'])
+        restarted.close()
+        store.close()
+        self.assertEquals(len(open(self.filename).readlines()), 3)
+
+    def testLookupRefreshes(self):
+        store = GuidStore(maxsize=2, ttl=60, clock=self.clock)
+        store.add('a')
+        store.add('b')
+        self.now[0] += 40
+        # 'a' is still in its feed, so the poller keeps finding it
+        self.assertTrue('a' in store)
+        store.add('c')
+        self.assertEquals(list(store.guids), ['a', 'c'])
+        self.now[0] += 40
+        self.assertTrue('a' in store)
+        self.now[0] += 61
+        self.assertFalse('a' in store)
+
+    def testConcurrentLookups(self):
+        store = GuidStore(maxsize=200)
+        for i in range(200):
+            store.add('guid %d' % i)
+        def lookUp(n):
+            rand = random.Random(n)
+            for i in range(5000):
+                'guid %d' % rand.randrange(300) in store
+                if i % 50 == 0:
+                    store.addIfNew('new %d %d' % (n, i))
+        threads = [threading.Thread(target=lookUp, args=(n,)) for n in range(8)]
+        # switch threads as often as possible
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setcheckinterval(interval)
+        self.assertEquals(len(store), 200)
+        self.assertEquals(len(list(store.guids)), 200)
+        self.assertEquals(len(set(store.guids)), 200)
+
+    def testBloomFilterSurvivesCrash(self):
+        store = GuidStore(maxsize=10, bloomCapacity=5000, filename=self.filename)
+        for i in range(1500):
+            store.add('guid %d' % i)
+        # never closed, but the log was rewritten at least once
+        self.assertTrue(store.logLines < 1500)
+        restarted = GuidStore(maxsize=10, bloomCapacity=5000, filename=self.filename)
+        for i in range(1500):
+            self.assertTrue('guid %d' % i in restarted)
+        restarted.close()
+        store.logFile.close()
+
+    def testDiscard(self):
+        store = GuidStore(filename=self.filename, clock=self.clock)
+        for guid in ['a', 'b', 'c']:
+            store.add(guid)
+        store.discard('b')
+        store.discard('x')
+        self.assertFalse('b' in store)
+        restarted = GuidStore(filename=self.filename, clock=self.clock)
+        self.assertEquals(list(restarted.guids), ['a', 'c'])
+        self.assertTrue(restarted.addIfNew('b'))
+        restarted.close()
+        store.close()
+
+    def testBloomFilterRemembersEvicted(self):
+        store = GuidStore(maxsize=10, bloomCapacity=1000, filename=self.filename)
+        for i in range(500):
+            store.add('guid %d' % i)
+        self.assertEquals(len(store), 10)
+        for i in range(500):
+            self.assertTrue('guid %d' % i in store)
+        falsePositives = len([i for i in range(500, 5500) if 'guid %d' % i in store])
+        self.assertTrue(falsePositives < 50)
+        store.close()
+        restarted = GuidStore(maxsize=10, bloomCapacity=1000, filename=self.filename)
+        self.assertTrue('guid 0' in restarted)
+        restarted.close()
+
+class ProblemSet7ProcessStream(unittest.TestCase):
+    def testSameStoriesAsProcess(self):
+        feed = SAMPLE_RSS % {'name': 'a'}
+        expected = [str(story) for story in process(feed)]
+        for chunksize in [5, feedparser.STREAM_CHUNK_SIZE]:
+            stories = feedparser.parse_stream(feed, chunksize=chunksize).entries
+            self.assertEquals([str(storyFromEntry(e)) for e in stories], expected)
+        self.assertEquals([str(story) for story in processStream(feed)], expected)
+
+    def testStoriesArriveBeforeTheEnd(self):
+        class Source:
+            def __init__(self, data):
+                self.data = data
+                self.pos = 0
+            def read(self, size):
+                chunk = self.data[self.pos:self.pos + size]
+                self.pos += len(chunk)
+                return chunk
+        items = ''.join(['<item><guid>%d</guid><title>t</title><description>d</description></item>' % i
+                         for i in range(2000)])
+        source = Source('<rss version="2.0"><channel>' + items + '</channel></rss>')
+        stories = processStream(source)
+        self.assertEquals(stories.next().getGuid(), '0')
+        self.assertTrue(source.pos < len(source.data) / 2)
+        self.assertEquals(len(list(stories)), 1999)
+
+    def testMalformedFeed(self):
+        feed = (SAMPLE_RSS % {'name': 'a'}).replace('first', 'first &nbsp;')
+        result = feedparser.parse_stream(feed, chunksize=16)
+        self.assertEquals([e.guid for e in result.entries], ['a-1', 'a-2'])
+        self.assertEquals(result.bozo, 1)
+
+class ProblemSet7FeedStory(unittest.TestCase):
+    def testFieldsDecodedOnFirstRead(self):
+        story = FeedStory('1', 'Koala &amp; bear', 'world', '<b>soft</b>', 'link')
+        self.assertEquals(story.title, 'Koala &amp; bear')
+        self.assertEquals(story.getTitle(), 'Koala & bear')
+        self.assertEquals(story.title, 'Koala & bear')
+        self.assertEquals(story.summary, '<b>soft</b>')
+        self.assertEquals(story.getSummary(), 'soft')
+        self.assertEquals(story.getSummary(), 'soft')
+        self.assertFalse(hasattr(story, '__dict__'))
+
+    def testSkipGuids(self):
+        feed = SAMPLE_RSS % {'name': 'a'}
+        self.assertEquals([s.getGuid() for s in process(feed, skipGuids=set(['a-1']))],
+                          ['a-2'])
+        self.assertEquals([s.getGuid() for s in processStream(feed, skipGuids=set(['a-2']))],
+                          ['a-1'])
+        results = process_many([feed], skipGuids=set(['a-1', 'a-2']))
+        self.assertEquals(results[0][1], [])
+
+    def testTriggersSeeDecodedText(self):
+        story = FeedStory('1', 'Koala&nbsp;bears', '', '', '')
+        self.assertTrue(compileTriggers([TitleTrigger('bears')]).filter([story]))
+
+class ProblemSet7DateParsing(unittest.TestCase):
+    def setUp(self):
+        feedparser.resetDateHandlerStats()
+
+    def testCachedAndAdaptive(self):
+        items = ''.join(['<item><guid>%d</guid><pubDate>Mon, 0%d Oct 2012 10:00:00 GMT</pubDate></item>' % (i, i)
+                         for i in range(1, 6)])
+        feed = '<rss version="2.0"><channel>' + items + items + '</channel></rss>'
+        result = feedparser.parse(feed)
+        self.assertEquals(result.entries[0].updated_parsed[:3], (2012, 10, 1))
+        self.assertEquals(result.entries[9].updated_parsed[:3], (2012, 10, 5))
+        stats = feedparser.getDateHandlerStats()
+        self.assertTrue(stats['cache'] >= 5)
+        self.assertEquals(stats.get('failed', 0), 0)
+        hint = feedparser._date_handler_hints['']
+        self.assertEquals(hint[0], feedparser._parse_date_rfc822)
+
+    def testSameResultsAsHandlerChain(self):
+        dates = ['2003-12-31T10:14:55Z', '2003-12-31T10:14:55-08:00', 'Thu, 01 Jan 2004 19:48:21 GMT',
+                 '2004-02-28T18:14:55-08:00', '2003-12-31', 'not a date', '']
+        for hint in [[feedparser._parse_date_rfc822], [feedparser._parse_date_w3dtf]]:
+            for date in dates:
+                feedparser._date_cache.clear()
+                adaptive = feedparser._parse_date(date, hint)
+                feedparser._date_cache.clear()
+                self.assertEquals(adaptive, feedparser._parse_date(date))
+
+class ProblemSet7FeedParserDict(unittest.TestCase):
+    def testAliasesResolvedOnInsert(self):
+        d = feedparser.FeedParserDict({'guid': 'x', 'description': 'd'}, url='u')
+        d.issued = 'p'
+        d['date'] = 'now'
+        self.assertEquals(sorted(d.keys()), ['href', 'id', 'published', 'subtitle', 'updated'])
+        self.assertEquals((d.guid, d['id'], d.url, d.issued, d.modified), ('x', 'x', 'u', 'p', 'now'))
+        self.assertEquals(d.description, 'd')
+        del d['subtitle']
+        d['summary'] = 's'
+        self.assertEquals(d['description'], 's')
+
+    def testMappingApi(self):
+        d = feedparser.FeedParserDict()
+        self.assertFalse('guid' in d)
+        self.assertEquals(d.get('guid', 'none'), 'none')
+        self.assertRaises(AttributeError, getattr, d, 'guid')
+        self.assertRaises(KeyError, d.__getitem__, 'description')
+        self.assertRaises(AttributeError, getattr, d, '_private')
+        self.assertEquals(d.setdefault('tags', []), [])
+        self.assertEquals(d.get('category'), None)
+        d.tags.append(feedparser.FeedParserDict(term='t', scheme='s'))
+        self.assertEquals((d.category, d.categories), ('t', [('s', 't')]))
+        self.assertTrue(d.has_key('guid') is False and d.has_key('category'))
+        import pickle
+        copied = pickle.loads(pickle.dumps(d, 2))
+        self.assertEquals(copied, d)
+        self.assertEquals(copied.category, 't')
+
+class ProblemSet7EncodingDetection(unittest.TestCase):
+    BODY = u'<rss version="2.0"><channel><title>Caf\xe9 \u2019s</title></channel></rss>'
+
+    def testSameResultsAsToUTF8(self):
+        for actual in ['utf-8', 'utf-16', 'windows-1252', 'iso-8859-1']:
+            for decl in ['', '<?xml version="1.0" encoding="%s"?>' % actual,
+                         '<?xml version="1.0" encoding="utf-8"?>\n']:
+                try:
+                    data = (decl + self.BODY).encode(actual)
+                except UnicodeError:
+                    continue
+                for encoding in ['utf-8', 'us-ascii', 'windows-1252', 'utf-16le', actual]:
+                    try:
+                        expected = feedparser._toUTF8(data, encoding)
+                    except Exception:
+                        self.assertRaises(Exception, feedparser._convertToUTF8, data, encoding)
+                    else:
+                        self.assertEquals(feedparser._convertToUTF8(data, encoding), expected)
+
+    def testRemembersEncodingPerFeed(self):
+        url = 'http://example.com/greek'
+        data = u'<a>\u03b1\u03b2</a>'.encode('iso-8859-7')
+        self.assertEquals(feedparser._decodeDocument(data, url, ['us-ascii'])[1], 'windows-1252')
+        feedparser._rememberEncoding(url, 'iso-8859-7')
+        converted, encoding = feedparser._decodeDocument(data, url, ['us-ascii'])
+        self.assertEquals(encoding, 'iso-8859-7')
+        self.assertTrue(u'\u03b1\u03b2'.encode('utf-8') in converted)
+        # a declared encoding that works still wins
+        self.assertEquals(feedparser._decodeDocument(data, url, ['iso-8859-1'])[1], 'iso-8859-1')
+
+    def testPipelineParseRemembersEncoding(self):
+        url = 'http://example.com/greek-feed'
+        feedparser._encoding_cache.pop(url, None)
+        body = u'<rss version="2.0"><channel><item><guid>1</guid><title>\u03b1\u03b2</title>' \
+               u'<link>l</link><description>d</description></item></channel></rss>'
+        declared = u'<?xml version="1.0" encoding="iso-8859-7"?>' + body
+        result = ps7._parseRaw((url, declared.encode('iso-8859-7'), {}, url))
+        self.assertEquals(result[1][0][1], u'\u03b1\u03b2')
+        self.assertEquals(feedparser._encoding_cache.get(url), 'iso-8859-7')
+        # next poll, the feed lost its declaration: the remembered encoding
+        # decodes it instead of the windows-1252 fallback
+        undeclared = body.encode('iso-8859-7')
+        result = ps7._parseRaw((url, undeclared, {}, url))
+        self.assertEquals(result[1][0][1], u'\u03b1\u03b2')
+        result = ps7._parseRaw(('http://example.com/other', undeclared, {},
+                            'http://example.com/other'))
+        self.assertNotEquals(result[1][0][1], u'\u03b1\u03b2')
+
+class ProblemSet7MarkupProcessing(unittest.TestCase):
+    FRAGMENTS = [
+        '<p onclick="x()">Hi <a href="story/1.html">more</a></p><script>evil()</script>',
+        '<img src="/pixel.gif" width="1" /><br/><A HREF="../up">Up</A> &amp; &copy;',
+        '<div><iframe src="x"></iframe><q cite="/q">q</q><!-- note --></div>',
+        'plain text', '',
+    ]
+
+    def testMergedPassMatchesTwoPasses(self):
+        # the same, for attribute values without &, < or "
+        for fragment in self.FRAGMENTS:
+            twoPasses = feedparser._sanitizeHTML(
+                feedparser._resolveRelativeURIs(fragment, 'http://example.com/a/', 'utf-8'), 'utf-8')
+            self.assertEquals(feedparser._sanitizeAndResolveHTML(fragment, 'http://example.com/a/', 'utf-8'),
+                              twoPasses)
+
+    def testAttributeValuesAreEscaped(self):
+        fragment = '<p title="x &quot;onmouseover=&quot;alert(1)">t</p>'
+        self.assertEquals(feedparser._sanitizeAndResolveHTML(fragment, 'http://example.com/', 'utf-8'),
+                          '<p title="x &quot;onmouseover=&quot;alert(1)">t</p>')
+        feed = feedparser.parse('<rss version="2.0"><channel><item><description>%s'
+                                '</description></item></channel></rss>'
+                                % fragment.replace('&', '&amp;').replace('<', '&lt;'))
+        summary = feed.entries[0].summary
+        self.assertFalse('"onmouseover' in summary)
+        self.assertFalse(' onmouseover=' in summary)
+        self.assertEquals(feedparser._sanitizeAndResolveHTML(
+            '<a href="/a?x=1&amp;y=2">a</a>', 'http://example.com/', 'utf-8'),
+            '<a href="http://example.com/a?x=1&amp;y=2">a</a>')
+
+    def testRepeatedFragmentsAreCached(self):
+        feedparser._markup_cache.clear()
+        fragment = self.FRAGMENTS[0]
+        first = feedparser._processMarkup(fragment, 'http://example.com/', 'utf-8', 1, 1)
+        self.assertEquals(len(feedparser._markup_cache), 1)
+        self.assertTrue(feedparser._processMarkup(fragment, 'http://example.com/', 'utf-8', 1, 1) is first)
+        other = feedparser._processMarkup(fragment, 'http://example.org/', 'utf-8', 1, 1)
+        self.assertTrue('http://example.org/story/1.html' in other)
+        self.assertEquals(len(feedparser._markup_cache), 2)
+
+class ProblemSet7ValidatorCache(unittest.TestCase):
+    def setUp(self):
+        import ps7
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), _FeedHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d/rss' % self.server.server_port
+        fd, self.filename = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(self.filename)
+        self.oldCache = ps7.validatorCache
+        ps7.validatorCache = FeedValidatorCache(self.filename)
+
+    def tearDown(self):
+        import ps7
+        ps7.validatorCache = self.oldCache
+        self.server.shutdown()
+        self.server.server_close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def testUnchangedFeedIsNotParsed(self):
+        import ps7
+        self.assertEquals(len(process(self.url)), 2)
+        self.assertEquals(process(self.url), [])
+        self.assertEquals(ps7.validatorCache.stats()['hits'], 1)
+        self.assertEquals(ps7.validatorCache.stats()['misses'], 1)
+        url, stories, error = process_many([self.url])[0]
+        self.assertEquals((stories, error), ([], None))
+        self.assertEquals(ps7.validatorCache.stats()['hits'], 2)
+
+    def testValidatorsSurviveRestart(self):
+        process(self.url)
+        restarted = FeedValidatorCache(self.filename)
+        self.assertEquals(restarted.get(self.url), ('"v1"', None))
+        self.assertEquals(restarted.get('http://example.com/'), (None, None))
+
+class _RecordedFeedServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class _RecordedFeedHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves recorded feeds over keep-alive connections"""
+    protocol_version = 'HTTP/1.1'
+    feeds = {'/a': SAMPLE_RSS % {'name': 'a'}, '/b': SAMPLE_RSS % {'name': 'b'},
+             '/slow': SAMPLE_RSS % {'name': 'slow'}, '/close': SAMPLE_RSS % {'name': 'close'}}
+    lock = threading.Lock()
+    connections = 0
+    active = 0
+    maxActive = 0
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.lock:
+            _RecordedFeedHandler.connections += 1
+
+    def do_GET(self):
+        with self.lock:
+            _RecordedFeedHandler.active += 1
+            _RecordedFeedHandler.maxActive = max(self.maxActive, self.active)
+        try:
+            if self.path == '/slow':
+                time.sleep(0.05)
+            body = self.feeds[self.path]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/rss+xml')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            if self.path == '/close':
+                # hang up without telling the client
+                self.close_connection = 1
+        finally:
+            with self.lock:
+                _RecordedFeedHandler.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+class ProblemSet7ConnectionPool(unittest.TestCase):
+    def setUp(self):
+        _RecordedFeedHandler.connections = 0
+        _RecordedFeedHandler.maxActive = 0
+        self.server = _RecordedFeedServer(('127.0.0.1', 0), _RecordedFeedHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_port
+        self.pool = feedparser.HTTPConnectionPool(maxPerHost=2)
+
+    def tearDown(self):
+        self.pool.closeIdle()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testConnectionIsReused(self):
+        for path in ['/a', '/b', '/a']:
+            result = feedparser.parse(self.url + path, transport=self.pool)
+            self.assertEquals(result.status, 200)
+            self.assertEquals(len(result.entries), 2)
+        entries = feedparser.parse_stream(self.url + '/b', transport=self.pool).entries
+        self.assertEquals([e.title for e in entries], ['b first', 'b second'])
+        self.assertEquals(self.pool.stats(), {'requests': 4, 'connections': 1, 'reused': 3})
+        self.assertEquals(_RecordedFeedHandler.connections, 1)
+
+    def testPerHostLimit(self):
+        from multiprocessing.pool import ThreadPool
+        workers = ThreadPool(6)
+        try:
+            results = workers.map(lambda i: feedparser.parse(self.url + '/slow', transport=self.pool),
+                                  range(12))
+        finally:
+            workers.close()
+            workers.join()
+        self.assertEquals([len(r.entries) for r in results], [2] * 12)
+        self.assertEquals(_RecordedFeedHandler.maxActive, 2)
+        self.assertTrue(self.pool.stats()['connections'] <= 2)
+
+    def testServerClosedIdleConnection(self):
+        feedparser.parse(self.url + '/close', transport=self.pool)
+        time.sleep(0.05)
+        result = feedparser.parse(self.url + '/a', transport=self.pool)
+        self.assertEquals([e.title for e in result.entries], ['a first', 'a second'])
+        self.assertEquals(self.pool.stats()['connections'], 2)
+
+class ProblemSet7Pipeline(unittest.TestCase):
+    def setUp(self):
+        self.server = _RecordedFeedServer(('127.0.0.1', 0), _RecordedFeedHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testSameStoriesAsProcessMany(self):
+        feeds = [self.url + '/a', self.url + '/b', SAMPLE_RSS % {'name': 'c'},
+                 'http://127.0.0.1:1/rss']
+        expected = process_many(feeds, timeout=1)
+        results = list(process_pipeline(feeds, parse_workers=2, timeout=1))
+        self.assertEquals(sorted([url for url, stories, error in results]), sorted(feeds))
+        results = dict([(url, (stories, error)) for url, stories, error in results])
+        for url, stories, error in expected:
+            self.assertEquals([str(s) for s in results[url][0]], [str(s) for s in stories])
+            self.assertEquals(results[url][1] is None, error is None)
+
+    def testSkipGuids(self):
+        results = list(process_pipeline([self.url + '/a'], parse_workers=1,
+                                        skipGuids=set([self.url + '/a-1'])))
+        self.assertEquals([s.getTitle() for s in results[0][1]], ['a second'])
+
+    def testParseError(self):
+        results = list(process_pipeline(['<rss><channel><item>'], parse_workers=1))
+        self.assertEquals(results[0][1], [])
+
+    def testParsePoolKeptBetweenPolls(self):
+        list(process_pipeline([self.url + '/a'], parse_workers=1))
+        pool = getParsePool(1)
+        list(process_pipeline([self.url + '/b'], parse_workers=1))
+        self.assertTrue(getParsePool(1) is pool)
+        self.assertTrue(getParsePool(2) is not pool)
+        closeParsePool()
+        self.assertEquals(len(list(process_pipeline([self.url + '/a'],
+                                                    parse_workers=1))[0][1]), 2)
+
+class ProblemSet7CompiledTriggers(unittest.TestCase):
+    def setUp(self):
+        self.stories = [
+            NewsStory('1', 'Koala bears are soft and cuddly', 'world', 'Nothing', ''),
+            NewsStory('2', 'Intel opens in New York City', 'tech', '', ''),
+            NewsStory('3', "Soft's the new pink!", 'World news', 'New York City', ''),
+            NewsStory('4', 'Microsoft announced today', 'tech', 'intel inside', ''),
+            NewsStory('5', 'Reuters reports something boring', '', '', ''),
+        ]
+
+    def assertSameAsNaive(self, triggers):
+        compiled = compileTriggers(triggers)
+        self.assertEquals(compiled.filter(self.stories),
+                          filterStories(self.stories, triggers))
+        for story in self.stories:
+            self.assertEquals(compiled.firedTriggers(story),
+                              [t for t in triggers if t.evaluate(story)])
+
+    def testWordAndCompositeTriggers(self):
+        soft = TitleTrigger('soft')
+        world = SubjectTrigger('WORLD')
+        intel = SummaryTrigger('intel')
+        nyc = PhraseTrigger('New York City')
+        self.assertSameAsNaive([soft])
+        self.assertSameAsNaive([AndTrigger(soft, world), NotTrigger(intel)])
+        self.assertSameAsNaive([OrTrigger(nyc, intel), AndTrigger(TitleTrigger('intel'), nyc)])
+        self.assertSameAsNaive([NotTrigger(OrTrigger(soft, AndTrigger(world, nyc)))])
+
+    def testSharedSubexpressions(self):
+        t1 = AndTrigger(TitleTrigger('soft'), PhraseTrigger('New York City'))
+        t2 = OrTrigger(TitleTrigger('Soft'), PhraseTrigger('New York City'))
+        compiled = compileTriggers([t1, t2, NotTrigger(t1)])
+        # soft, phrase, and, or, not
+        self.assertEquals(len(compiled.nodes), 5)
+        self.assertSameAsNaive([t1, t2, NotTrigger(t1)])
+
+    def testManyPhraseTriggers(self):
+        phrases = ['New York City', 'York', 'pink!', 'soft', 'Nothing']
+        phrases += ['phrase %d' % i for i in range(PHRASE_INDEX_MIN)]
+        triggers = [PhraseTrigger(p) for p in phrases]
+        self.assertNotEquals(compileTriggers(triggers).phraseIndex, None)
+        self.assertSameAsNaive(triggers)
+        self.assertSameAsNaive([AndTrigger(triggers[0], NotTrigger(triggers[1]))] + triggers[2:])
+
+    def testCustomTriggers(self):
+        calls = []
+        class CountingTrigger(Trigger):
+            def evaluate(self, story):
+                calls.append(story)
+                return story.getGuid() == '5'
+        custom = CountingTrigger()
+        self.assertSameAsNaive([TitleTrigger('intel'), custom])
+        del calls[:]
+        # the custom trigger is never needed when the word trigger fires
+        compileTriggers([OrTrigger(TitleTrigger('intel'), custom)]).evaluate(self.stories[1])
+        self.assertEquals(calls, [])
+
+    def testReadTriggerConfig(self):
+        triggers = readTriggerConfig(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                  'triggers.txt'))
+        self.assertEquals(len(triggers), 2)
+        self.assertTrue(isinstance(triggers[0], SubjectTrigger))
+        self.assertTrue(isinstance(triggers[1], AndTrigger))
+        self.assertSameAsNaive(triggers)
+        self.assertEquals([s.getGuid() for s in compileTriggers(triggers).filter(self.stories)],
+                          ['1', '2', '3'])
+
+class ProblemSet7WatchedTriggerConfig(unittest.TestCase):
+    CONFIG = """# test config
+t1 SUBJECT world
+t2 TITLE Intel
+t3 PHRASE New York City
+t4 AND t2 t3
+t5 NOT t1
+ADD t1 t4
+"""
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.txt')
+        os.close(fd)
+        self.write(self.CONFIG)
+        self.config = WatchedTriggerConfig(self.filename)
+        self.story = NewsStory('1', 'Intel opens office', 'tech', 'in New York City', '')
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def write(self, text):
+        outFile = open(self.filename, 'w')
+        outFile.write(text)
+        outFile.close()
+        # make sure the change is seen even within the same mtime tick
+        st = os.stat(self.filename)
+        os.utime(self.filename, (st.st_atime, st.st_mtime + random.randint(1, 1000)))
+
+    def testInitialLoad(self):
+        self.assertEquals(self.config.error, None)
+        self.assertEquals(self.config.rebuilt, set(['t1', 't2', 't3', 't4', 't5']))
+        self.assertEquals(self.config.filter([self.story]), [self.story])
+        self.assertFalse(self.config.check())
+
+    def testOnlyChangedTriggersAndDependentsRebuilt(self):
+        old = dict(self.config.triggerMap)
+        self.write(self.CONFIG.replace('New York City', 'Boston'))
+        self.assertTrue(self.config.check())
+        self.assertEquals(self.config.rebuilt, set(['t3', 't4']))
+        for name in ['t1', 't2', 't5']:
+            self.assertTrue(self.config.triggerMap[name] is old[name])
+        self.assertTrue(self.config.triggerMap['t4'].trigger1 is old['t2'])
+        self.assertEquals(self.config.filter([self.story]), [])
+
+    def testBrokenConfigKeepsOldTriggers(self):
+        active = self.config.active
+        self.write(self.CONFIG + "ADD t9\n")
+        self.assertFalse(self.config.check())
+        self.assertTrue(isinstance(self.config.error, KeyError))
+        self.assertTrue(self.config.active is active)
+        self.write(self.CONFIG.replace('t5 NOT t1', 't5 TITLE Koala'))
+        self.assertTrue(self.config.check())
+        self.assertEquals(self.config.error, None)
+        self.assertEquals(self.config.rebuilt, set(['t5']))
+
+class ProblemSet7Replay(unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        random.seed(6001)
+        words = ['Intel', 'world', 'New', 'York', 'City', 'koala', 'soft', 'news']
+        self.stories = [NewsStory(str(i), ' '.join(random.sample(words, 3)),
+                                  random.choice(words), ' '.join(random.sample(words, 4)),
+                                  'http://example.com/%d' % i)
+                        for i in range(500)]
+        archive = StoryArchive(self.filename)
+        archive.extend(self.stories)
+        archive.close()
+        self.triggers = [SubjectTrigger('world'), TitleTrigger('koala'),
+                         AndTrigger(TitleTrigger('Intel'), PhraseTrigger('New York City'))]
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def assertReport(self, report):
+        self.assertEquals(report['stories'], 500)
+        self.assertEquals(report['matched'], len(filterStories(self.stories, self.triggers)))
+        self.assertEquals(report['triggers'],
+                          [len(filterStories(self.stories, [t])) for t in self.triggers])
+        self.assertTrue(report['stories_per_sec'] > 0)
+
+    def testReplay(self):
+        self.assertReport(replay(self.filename, self.triggers, chunksize=64))
+
+    def testParallelReplay(self):
+        self.assertReport(replay(self.filename, self.triggers, workers=2, chunksize=64))
+
+    def testPartialLastLine(self):
+        outFile = open(self.filename, 'a')
+        outFile.write('["500", "Intel')
+        outFile.close()
+        self.assertEquals(replay(self.filename, self.triggers)['stories'], 500)
+
+    def testLinesThatAreNotRecords(self):
+        lines = ['42\n', 'null\n', '"guid"\n', '{"a": 1, "b": 2, "c": 3, "d": 4, "e": 5}\n',
+                 '[1, 2]\n', '["g", "t", "s", "u", "l"]\n']
+        self.assertEquals(list(readRecords(lines)), [("g", "t", "s", "u", "l")])
+        outFile = open(self.filename, 'a')
+        outFile.writelines(lines)
+        outFile.close()
+        self.assertEquals(replay(self.filename, self.triggers)['stories'], 501)
+
+class ProblemSet7StoryIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.now = 1000000.0
+        random.seed(6001)
+        words = ['Intel', 'world', 'New', 'York', 'City', 'Yorker', 'koala',
+                 'soft', "koala's", 'news.']
+        self.stories = [NewsStory(str(i), ' '.join(random.sample(words, 3)),
+                                  random.choice(words), ' '.join(random.sample(words, 4)),
+                                  'http://example.com/%d' % i)
+                        for i in range(300)]
+        self.index = self.openIndex()
+        for story in self.stories:
+            self.index.add((story.getGuid(), story.getTitle(), story.getSubject(),
+                            story.getSummary(), story.getLink()))
+            self.now += 1
+
+    def tearDown(self):
+        self.index.close()
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def openIndex(self):
+        return StoryIndex(self.directory, storyTerms, flushSize=32,
+                          clock=lambda: self.now)
+
+    def assertSameAsFilter(self, triggers, stories=None):
+        if stories is None:
+            stories = self.stories
+        self.assertEquals([str(s) for s in queryIndex(self.index, triggers)],
+                          [str(s) for s in filterStories(stories, triggers)])
+
+    def testTriggerTrees(self):
+        intel, koala = TitleTrigger('intel'), SummaryTrigger('KOALA')
+        world = SubjectTrigger('world')
+        for triggers in [[intel], [koala, world], [AndTrigger(intel, koala)],
+                         [OrTrigger(intel, world)], [NotTrigger(world)],
+                         [AndTrigger(intel, NotTrigger(koala))],
+                         [OrTrigger(NotTrigger(intel), world)],
+                         [AndTrigger(NotTrigger(intel), NotTrigger(world))],
+                         [OrTrigger(NotTrigger(intel), NotTrigger(koala))],
+                         [NotTrigger(AndTrigger(world, NotTrigger(koala)))],
+                         [TitleTrigger('missing')]]:
+            self.assertSameAsFilter(triggers)
+
+    def testPhraseTriggers(self):
+        for phrase in ['New York', 'ew Yor', 'York City', 'Yorker', 'ork',
+                       "koala's news.", 'City ', ' ', 'Intel world New']:
+            self.assertSameAsFilter([PhraseTrigger(phrase)])
+        self.assertSameAsFilter([AndTrigger(PhraseTrigger('New York'),
+                                            SubjectTrigger('koala'))])
+
+    def testSince(self):
+        triggers = [OrTrigger(TitleTrigger('intel'), NotTrigger(SubjectTrigger('news')))]
+        self.assertEquals([str(s) for s in queryIndex(self.index, triggers,
+                                                      since=1000000.0 + 250)],
+                          [str(s) for s in filterStories(self.stories[250:], triggers)])
+
+    def testReopenAndRecover(self):
+        triggers = [TitleTrigger('york'), PhraseTrigger('koala')]
+        self.assertTrue(len(self.index.segments) <= StoryIndex.MAX_SEGMENTS)
+        self.index.close()
+        self.index = self.openIndex()
+        self.assertSameAsFilter(triggers)
+        # postings still in memory are lost, but rebuilt on the next open
+        self.index.add(('x', 'York', '', '', ''))
+        self.index = self.openIndex()
+        self.assertEquals(len(self.index), 301)
+        self.assertSameAsFilter(triggers, self.stories + [NewsStory('x', 'York', '', '', '')])
+
+    def testPostingListOperations(self):
+        a, b = [1, 3, 5, 7], range(0, 200, 3)
+        self.assertEquals(intersect(a, b), [3])
+        self.assertEquals(intersect(b, a), [3])
+        self.assertEquals(union(a, b[:3]), [0, 1, 3, 5, 6, 7])
+        self.assertEquals(difference(a, b), [1, 5, 7])
+
+class ProblemSet7StoryBridge(unittest.TestCase):
+    def testBoundedFifo(self):
+        bridge = StoryBridge(maxsize=5)
+        self.assertEquals(bridge.put(range(3)), [])
+        self.assertEquals(bridge.put(range(3, 8)), [0, 1, 2])
+        self.assertEquals(bridge.dropped, 3)
+        self.assertEquals(bridge.take(2), [3, 4])
+        self.assertEquals(bridge.take(10), [5, 6, 7])
+        self.assertEquals(bridge.take(10), [])
+        # more new stories than room
+        self.assertEquals(bridge.put(range(4)), [])
+        self.assertEquals(bridge.put(range(10, 17)), [0, 1, 2, 3, 10, 11])
+        self.assertEquals(bridge.take(10), [12, 13, 14, 15, 16])
+
+    def testManyProducers(self):
+        bridge = StoryBridge(maxsize=10000)
+        def produce(n):
+            for i in range(100):
+                bridge.put([(n, i)])
+        threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        taken = []
+        while len(taken) < 400:
+            taken.extend(bridge.take(7))
+        for t in threads:
+            t.join()
+        for n in range(4):
+            self.assertEquals([i for m, i in taken if m == n], range(100))
+
+    def testShowStoriesBatchesInserts(self):
+        class Recorder:
+            def __init__(self):
+                self.calls = []
+            def insert(self, *args):
+                self.calls.append(('insert',) + args)
+            def after(self, *args):
+                self.calls.append(('after',) + args)
+        cont, master = Recorder(), Recorder()
+        bridge = StoryBridge()
+        bridge.put([NewsStory(str(i), 'title %d' % i, '', 'summary', '')
+                    for i in range(UI_BATCH + 1)])
+        showStories(master, cont, bridge)
+        self.assertEquals(len(cont.calls), 1)
+        self.assertEquals(len(cont.calls[0]), 2 + 8 * UI_BATCH)
+        self.assertEquals(master.calls[0][1], 1)
+        showStories(master, cont, bridge)
+        self.assertEquals(master.calls[1][1], UI_REFRESH)
+        showStories(master, cont, bridge)
+        self.assertEquals(len(cont.calls), 2)
+
+class ProblemSet7PhraseIndex(unittest.TestCase):
+    def testOverlappingPhrases(self):
+        index = PhraseIndex([('he', 1), ('she', 2), ('his', 3), ('hers', 4), ('Hers', 5)])
+        self.assertEquals(index.search('ushers'), set([1, 2, 4]))
+        self.assertEquals(index.search('ahishers'), set([1, 2, 3, 4]))
+        self.assertEquals(index.search('HERS'), set())
+        self.assertEquals(index.searchAll(['sh', 'e']), set())
+
+    def testFiredPhraseTriggers(self):
+        nyc = PhraseTrigger('New York City')
+        york = PhraseTrigger('York')
+        soft = TitleTrigger('soft')
+        index = buildPhraseIndex([AndTrigger(soft, nyc), NotTrigger(york), nyc])
+        stories = [NewsStory('', "asfdNew York Cityasfdasdfasdf", '', '', ''),
+                   NewsStory('', '', "asdfasfdNew York", '', ''),
+                   NewsStory('', '', '', "something something new york city", '')]
+        for story in stories:
+            self.assertEquals(firedPhraseTriggers(index, story),
+                              set([t for t in [nyc, york] if t.evaluate(story)]))
+
+
+SCHEDULED_RSS = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>scheduled</title><ttl>5</ttl>
+<skipHours><hour>0</hour><hour>1</hour></skipHours>
+<item><guid>s-1</guid><title>first</title><link>http://example.com/first</link>
+<description>first story</description>
+<pubDate>Sat, 17 Oct 2026 10:00:00 GMT</pubDate></item>
+<item><guid>s-2</guid><title>second</title><link>http://example.com/second</link>
+<description>second story</description>
+<pubDate>Sat, 17 Oct 2026 10:10:00 GMT</pubDate></item>
+<item><guid>s-3</guid><title>third</title><link>http://example.com/third</link>
+<description>third story</description>
+<pubDate>Sat, 17 Oct 2026 10:20:00 GMT</pubDate></item>
+</channel></rss>"""
+
+class ProblemSet7FeedScheduler(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000000.0
+        self.scheduler = FeedScheduler(['fast', 'slow'], minInterval=60,
+                                       maxInterval=3600, clock=lambda: self.now,
+                                       random=lambda: 0.5)
+
+    def poll(self, url, **schedule):
+        self.assertEquals(self.scheduler.popDue(), [url])
+        return self.scheduler.update(url, **schedule)
+
+    def testLearnsIntervals(self):
+        self.assertEquals(self.scheduler.popDue(), [])
+        self.now += 3
+        self.assertEquals(sorted(self.scheduler.popDue()), ['fast', 'slow'])
+        self.scheduler.update('fast', entryTimes=[0, 120, 240, 360])
+        self.scheduler.update('slow', notModified=True)
+        self.assertEquals(self.scheduler.stats(), {'fast': 120, 'slow': 90})
+        self.assertEquals(self.scheduler.nextDue(), self.now + 90)
+        self.now += 90
+        self.scheduler.update(*self.scheduler.popDue(), error=IOError())
+        self.assertEquals(self.scheduler.stats()['slow'], 180)
+        self.now += 30
+        # no entry newer than last time: the feed is polled less often
+        self.poll('fast', entryTimes=[0, 120, 240, 360])
+        self.assertEquals(self.scheduler.stats()['fast'], 180)
+        for i in range(20):
+            self.now = self.scheduler.nextDue()
+            self.scheduler.update(self.scheduler.popDue()[0], notModified=True)
+        self.assertEquals(self.scheduler.stats(), {'fast': 3600, 'slow': 3600})
+
+    def testTtlAndSkipHours(self):
+        self.now = 86400 * 20000 + 23 * 3600.0     # 23:00 GMT
+        self.scheduler = FeedScheduler(['a'], minInterval=60,
+                                       clock=lambda: self.now,
+                                       random=lambda: 0.5)
+        self.now += 6
+        due = self.poll('a', entryTimes=[0, 60, 120], ttl=90, skipHours=[0, 1])
+        self.assertEquals(self.scheduler.stats()['a'], 5400)
+        self.assertEquals(time.gmtime(due).tm_hour, 2)
+        self.assertEquals(due % 3600, 0)
+
+    def testJitterSpreadsFeeds(self):
+        urls = [str(i) for i in range(100)]
+        scheduler = FeedScheduler(urls, minInterval=60)
+        dues = set(due for due, seq in scheduler.due.values())
+        self.assertTrue(len(dues) > 90)
+        scheduler = FeedScheduler(urls, minInterval=60, clock=lambda: self.now)
+        self.now += 60
+        for url in scheduler.popDue():
+            scheduler.update(url, notModified=True)
+        dues = sorted(due for due, seq in scheduler.due.values())
+        self.assertTrue(dues[-1] - dues[0] > 9)
+
+    def testRescheduleFeedsOfAnUnfinishedPoll(self):
+        self.now += 3
+        due = self.scheduler.popDue()
+        self.assertEquals(self.scheduler.nextDue(), None)
+        self.scheduler.update('fast', entryTimes=[0, 120, 240])
+        # the poll died before 'slow' was updated
+        self.assertEquals(self.scheduler.reschedule(due), ['slow'])
+        self.assertEquals(self.scheduler.stats(), {'fast': 120, 'slow': 120})
+        self.assertEquals(self.scheduler.reschedule(due), [])
+        self.now += 120
+        self.assertEquals(sorted(self.scheduler.popDue()), ['fast', 'slow'])
+
+    def testProcessManyReschedules(self):
+        self.scheduler = FeedScheduler([SCHEDULED_RSS, 'http://127.0.0.1:1/rss'],
+                                       clock=lambda: self.now, random=lambda: 0.5)
+        self.now += 6
+        results = process_many(self.scheduler.popDue(), timeout=1,
+                               scheduler=self.scheduler)
+        self.assertEquals(len(results[0][1]), 3)
+        self.assertEquals(self.scheduler.stats(),
+                          {SCHEDULED_RSS: 600, 'http://127.0.0.1:1/rss': 120})
+        schedule = feedSchedule(feedparser.parse(SCHEDULED_RSS))
+        self.assertEquals(schedule['ttl'], 5)
+        self.assertEquals(schedule['skipHours'], [0, 1])
+
 
 if __name__ == "__main__":
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(ProblemSet7NewsStory))
     suite.addTest(unittest.makeSuite(ProblemSet7))
+    suite.addTest(unittest.makeSuite(ProblemSet7ProcessMany))
+    suite.addTest(unittest.makeSuite(ProblemSet7TranslateHtml))
+    suite.addTest(unittest.makeSuite(ProblemSet7GuidStore))
+    suite.addTest(unittest.makeSuite(ProblemSet7ProcessStream))
+    suite.addTest(unittest.makeSuite(ProblemSet7FeedStory))
+    suite.addTest(unittest.makeSuite(ProblemSet7DateParsing))
+    suite.addTest(unittest.makeSuite(ProblemSet7FeedParserDict))
+    suite.addTest(unittest.makeSuite(ProblemSet7EncodingDetection))
+    suite.addTest(unittest.makeSuite(ProblemSet7MarkupProcessing))
+    suite.addTest(unittest.makeSuite(ProblemSet7ValidatorCache))
+    suite.addTest(unittest.makeSuite(ProblemSet7ConnectionPool))
+    suite.addTest(unittest.makeSuite(ProblemSet7Pipeline))
+    suite.addTest(unittest.makeSuite(ProblemSet7CompiledTriggers))
+    suite.addTest(unittest.makeSuite(ProblemSet7WatchedTriggerConfig))
+    suite.addTest(unittest.makeSuite(ProblemSet7Replay))
+    suite.addTest(unittest.makeSuite(ProblemSet7StoryIndex))
+    suite.addTest(unittest.makeSuite(ProblemSet7StoryBridge))
+    suite.addTest(unittest.makeSuite(ProblemSet7PhraseIndex))
+    suite.addTest(unittest.makeSuite(ProblemSet7FeedScheduler))
 #    unittest.TextTestRunner(verbosity=2).run(suite)
     unittest.TextTestRunner(verbosity=2, stream=sys.stdout).run(suite) 
 
@@ -0,0 +1,32 @@
+# Runs a trigger config against a story index
+#
+# Run with: python query.py INDEX [TRIGGERS] [DAYS]
+#
+# INDEX is a StoryIndex directory, as written by the poller when
+# INDEX_DIRECTORY is set in ps7.py. TRIGGERS defaults to triggers.txt.
+# With DAYS, only the stories indexed in the last DAYS days are looked at.
+
+import sys
+import time
+from ps7 import openStoryIndex, queryIndex, readTriggerConfig
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print "usage: python query.py INDEX [TRIGGERS] [DAYS]"
+        sys.exit(2)
+    config = len(sys.argv) > 2 and sys.argv[2] or "triggers.txt"
+    since = None
+    if len(sys.argv) > 3:
+        since = time.time() - float(sys.argv[3]) * 86400
+    index = openStoryIndex(sys.argv[1])
+    try:
+        start = time.time()
+        stories = queryIndex(index, readTriggerConfig(config), since=since)
+        seconds = time.time() - start
+        for story in stories:
+            print story.getTitle()
+            print "   ", story.getLink()
+        print "%d of %d stories matched, %.3f s" % (len(stories), len(index),
+                                                     seconds)
+    finally:
+        index.close()
@@ -0,0 +1,33 @@
+# Replays a trigger config against a story archive
+#
+# Run with: python replay.py ARCHIVE [TRIGGERS] [WORKERS]
+#
+# ARCHIVE is a StoryArchive file, as written by the poller when
+# ARCHIVE_FILENAME is set in ps7.py. TRIGGERS defaults to triggers.txt,
+# WORKERS to one process per core.
+
+import sys
+from ps7 import readTriggerConfig, readTriggerLines, replay
+
+def addedNames(filename):
+    """Returns the trigger names of the ADD lines of filename, in order"""
+    names = []
+    for line in readTriggerLines(filename):
+        linesplit = line.split(" ")
+        if linesplit[0] == "ADD":
+            names.extend(linesplit[1:])
+    return names
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print "usage: python replay.py ARCHIVE [TRIGGERS] [WORKERS]"
+        sys.exit(2)
+    archive = sys.argv[1]
+    config = len(sys.argv) > 2 and sys.argv[2] or "triggers.txt"
+    workers = len(sys.argv) > 3 and int(sys.argv[3]) or None
+    report = replay(archive, readTriggerConfig(config), workers=workers)
+    print "%d stories, %d matched, %.2f s, %.0f stories/s" % (
+        report['stories'], report['matched'], report['seconds'],
+        report['stories_per_sec'])
+    for name, count in zip(addedNames(config), report['triggers']):
+        print "%8s %8d" % (name, count)
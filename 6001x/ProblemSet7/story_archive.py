@@ -0,0 +1,72 @@
+#
+# Append-only archive of polled stories, for replaying trigger configs
+#
+
+import json
+
+
+class StoryArchive(object):
+    """
+    A log of stories kept on disk, one JSON array per line:
+
+        [guid, title, subject, summary, link]
+
+    Stories are only ever appended, so the archive can be written by a
+    running poller and read by a replay at the same time.
+    """
+    def __init__(self, filename):
+        """
+        filename: path of the archive file, created if missing
+        """
+        self.filename = filename
+        self.outFile = open(filename, 'a')
+
+    def append(self, story):
+        """Adds story (anything with the NewsStory getters) to the archive"""
+        self.outFile.write(json.dumps([story.getGuid(), story.getTitle(),
+                                       story.getSubject(), story.getSummary(),
+                                       story.getLink()]) + '\n')
+
+    def extend(self, stories):
+        """Adds every story of stories to the archive"""
+        for story in stories:
+            self.append(story)
+        self.outFile.flush()
+
+    def close(self):
+        self.outFile.close()
+
+
+def readRecords(lines):
+    """
+    Decodes archive lines.
+    Returns an iterator of (guid, title, subject, summary, link) tuples,
+    skipping lines that are not complete records (for example the last
+    line while it is being written).
+    """
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, list) and len(record) == 5:
+            yield tuple(record)
+
+
+def readChunks(filename, chunksize):
+    """
+    Reads the archive filename without decoding it.
+    Returns an iterator of lists of at most chunksize lines.
+    """
+    inFile = open(filename, 'r')
+    try:
+        chunk = []
+        for line in inFile:
+            chunk.append(line)
+            if len(chunk) >= chunksize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        inFile.close()
@@ -0,0 +1,55 @@
+#
+# Hands stories from the polling thread to the Tk thread
+#
+
+import threading
+from collections import deque
+
+
+class StoryBridge(object):
+    """
+    A bounded queue of stories between a producer thread (the poller)
+    and the Tk thread, which must be the only one touching widgets.
+
+    The poller puts stories in at any rate. The Tk thread takes them
+    out in batches from an after() timer, so one redraw covers many
+    stories and the mainloop never waits on the network. When more
+    than maxsize stories are waiting, the oldest are dropped.
+    """
+    def __init__(self, maxsize=1000):
+        """
+        maxsize: maximum number of stories waiting to be shown
+        """
+        self.stories = deque(maxlen=maxsize)
+        self.lock = threading.Lock()
+        self.dropped = 0    # stories dropped because the queue was full
+
+    def put(self, stories):
+        """
+        Adds stories to the queue.
+        Returns the list of the stories dropped to make room, oldest
+        first, so the caller can forget it ever sent them.
+        """
+        stories = list(stories)
+        with self.lock:
+            waiting = self.stories
+            overflow = max(0, len(waiting) + len(stories) - waiting.maxlen)
+            dropped = [waiting.popleft() for i in range(min(overflow, len(waiting)))]
+            # more new stories than room: the first ones are dropped too
+            fromNew = overflow - len(dropped)
+            dropped.extend(stories[:fromNew])
+            waiting.extend(stories[fromNew:])
+            self.dropped += overflow
+            return dropped
+
+    def take(self, n):
+        """
+        Returns the list of the (at most) n oldest stories of the queue,
+        removing them from it.
+        """
+        with self.lock:
+            n = min(n, len(self.stories))
+            return [self.stories.popleft() for i in range(n)]
+
+    def __len__(self):
+        return len(self.stories)
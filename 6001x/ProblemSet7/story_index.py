@@ -0,0 +1,335 @@
+#
+# On-disk inverted index of polled stories, for ad-hoc trigger queries
+#
+
+import array
+import bisect
+import json
+import os
+import time
+
+# intersect switches from a set lookup per id to a binary search per id
+# once one list is this many times longer than the other
+GALLOP_RATIO = 16
+
+
+def intersect(a, b):
+    """Returns the sorted list of ids in both sorted lists a and b"""
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return []
+    if len(b) > GALLOP_RATIO * len(a):
+        ids = []
+        lo = 0
+        for x in a:
+            lo = bisect.bisect_left(b, x, lo)
+            if lo == len(b):
+                break
+            if b[lo] == x:
+                ids.append(x)
+        return ids
+    inB = set(b)
+    return [x for x in a if x in inB]
+
+def union(a, b):
+    """Returns the sorted list of ids in either sorted list a or b"""
+    if not a:
+        return list(b)
+    if not b:
+        return list(a)
+    return sorted(set(a).union(b))
+
+def difference(a, b):
+    """Returns the sorted list of ids in sorted list a but not in b"""
+    if not b:
+        return list(a)
+    inB = set(b)
+    return [x for x in a if x not in inB]
+
+
+class StoryIndex(object):
+    """
+    A store of stories with an inverted index, per field, from words to
+    the stories they appear in. Everything is kept in a directory:
+
+        stories.jsonl   one JSON array per story:
+                        [guid, title, subject, summary, link]
+        stories.times   when each story was added and where its line
+                        starts in stories.jsonl, as pairs of doubles
+        NNNNNN.lex      the lexicon of a segment, in JSON:
+                        {"first": id, "end": id,
+                         "fields": {field: {word: [start, count]}}}
+        NNNNNN.post     the posting lists of a segment, 32 bit story ids
+
+    Stories get consecutive ids from 0 in the order they are added, so
+    ids grow with time and every posting list is sorted. New postings are
+    kept in memory and written out as a new segment every flushSize
+    stories; once there are more than MAX_SEGMENTS segments, they are
+    merged into one. A segment is never changed once written, and its
+    lexicon is written last, so a crash only loses postings that were
+    still in memory, and those are rebuilt from stories.jsonl on the next
+    open.
+
+    Only one StoryIndex may write to a directory at a time.
+    """
+    MAX_SEGMENTS = 8
+
+    def __init__(self, directory, terms, flushSize=1000, clock=time.time):
+        """
+        directory: where the index is kept, created if missing
+        terms: function taking a (guid, title, subject, summary, link)
+               record and returning a {field: iterable of words} dictionary
+        flushSize: number of stories whose postings are kept in memory
+        clock: function returning the current time in seconds
+        """
+        self.directory = directory
+        self.terms = terms
+        self.flushSize = flushSize
+        self.clock = clock
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.storiesName = os.path.join(directory, 'stories.jsonl')
+        self.timesName = os.path.join(directory, 'stories.times')
+        self.loadTimes()
+        self.segments = []      # lexicons, oldest first
+        self.loadSegments()
+        self.pending = {}       # field -> {word: array of ids}
+        self.pendingStart = self.indexedEnd()
+        self.storiesFile = open(self.storiesName, 'ab')
+        self.storiesSize = os.path.getsize(self.storiesName)
+        self.timesFile = open(self.timesName, 'ab')
+        self.reader = None
+        for i in range(self.pendingStart, len(self)):
+            self.indexTerms(i, self.get(i))
+
+    def loadTimes(self):
+        """Reads the time and offset of every story"""
+        pairs = array.array('d')
+        if os.path.exists(self.timesName):
+            inFile = open(self.timesName, 'rb')
+            try:
+                data = inFile.read()
+            finally:
+                inFile.close()
+            # drop a pair cut short by a crash
+            usable = len(data) - len(data) % (2 * pairs.itemsize)
+            pairs.fromstring(data[:usable])
+            if usable < len(data):
+                outFile = open(self.timesName, 'r+b')
+                try:
+                    outFile.truncate(usable)
+                finally:
+                    outFile.close()
+        self.times = pairs[0::2]
+        self.offsets = pairs[1::2]
+
+    def loadSegments(self):
+        """
+        Reads the lexicon of every segment, deleting the files left
+        behind by a flush or merge that did not finish.
+        """
+        names = sorted(os.listdir(self.directory))
+        self.nextSegment = 1
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if name.endswith('.lex'):
+                inFile = open(path, 'r')
+                try:
+                    lexicon = json.load(inFile)
+                finally:
+                    inFile.close()
+                lexicon['name'] = path[:-len('.lex')]
+                self.segments.append(lexicon)
+                self.nextSegment = int(name[:-len('.lex')]) + 1
+            elif name.endswith('.post') and name[:-5] + '.lex' not in names:
+                os.remove(path)
+            elif name.endswith('.tmp'):
+                os.remove(path)
+        # a merge that died before deleting the segments it merged
+        live = []
+        for segment in reversed(self.segments):
+            if any(segment['first'] >= s['first'] and segment['end'] <= s['end']
+                   for s in live):
+                self.removeSegment(segment)
+            else:
+                live.append(segment)
+        self.segments = live[::-1]
+
+    def removeSegment(self, segment):
+        os.remove(segment['name'] + '.lex')
+        os.remove(segment['name'] + '.post')
+
+    def indexedEnd(self):
+        """Returns the id after the last story written to a segment"""
+        if not self.segments:
+            return 0
+        return self.segments[-1]['end']
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, record):
+        """
+        Adds a story to the index.
+
+        record: (guid, title, subject, summary, link) tuple
+        Returns the id of the story.
+        """
+        i = self.append(record)
+        self.storiesFile.flush()
+        self.timesFile.flush()
+        return i
+
+    def extend(self, records):
+        """Adds every (guid, title, subject, summary, link) of records"""
+        for record in records:
+            self.append(record)
+        self.storiesFile.flush()
+        self.timesFile.flush()
+
+    def append(self, record):
+        """Adds a story without flushing the files. Returns its id."""
+        i = len(self)
+        line = json.dumps(list(record)) + '\n'
+        self.storiesFile.write(line)
+        # times never go backwards, so the stories since a time are
+        # always the ids from firstSince(time) on
+        when = self.clock()
+        if self.times and when < self.times[-1]:
+            when = self.times[-1]
+        pair = array.array('d', [when, self.storiesSize])
+        pair.tofile(self.timesFile)
+        self.times.append(when)
+        self.offsets.append(self.storiesSize)
+        self.storiesSize += len(line)
+        self.indexTerms(i, record)
+        if len(self) - self.pendingStart >= self.flushSize:
+            self.flush()
+        return i
+
+    def indexTerms(self, i, record):
+        """Adds the postings of story i to the in-memory postings"""
+        for field, words in self.terms(record).iteritems():
+            postings = self.pending.setdefault(field, {})
+            for word in set(words):
+                ids = postings.get(word)
+                if ids is None:
+                    ids = postings[word] = array.array('I')
+                ids.append(i)
+
+    def get(self, i):
+        """Returns story i as a (guid, title, subject, summary, link) tuple"""
+        if self.reader is None:
+            self.reader = open(self.storiesName, 'rb')
+        self.storiesFile.flush()
+        self.reader.seek(int(self.offsets[i]))
+        return tuple(json.loads(self.reader.readline()))
+
+    def firstSince(self, when):
+        """Returns the id of the first story added at or after time when"""
+        return bisect.bisect_left(self.times, when)
+
+    def postings(self, field, word, start=0):
+        """
+        Returns the sorted list of the ids, from start on, of the stories
+        whose field contains word.
+        """
+        ids = []
+        for segment in self.segments:
+            if segment['end'] <= start:
+                continue
+            entry = segment['fields'].get(field, {}).get(word)
+            if entry is not None:
+                segmentIds = self.readPostings(segment, entry)
+                ids.extend(segmentIds[bisect.bisect_left(segmentIds, start):])
+        pending = self.pending.get(field, {}).get(word)
+        if pending:
+            ids.extend(pending[bisect.bisect_left(pending, start):])
+        return ids
+
+    def readPostings(self, segment, entry):
+        """Reads the posting list at entry = [start, count] of segment"""
+        ids = array.array('I')
+        inFile = open(segment['name'] + '.post', 'rb')
+        try:
+            inFile.seek(entry[0] * ids.itemsize)
+            ids.fromfile(inFile, entry[1])
+        finally:
+            inFile.close()
+        return ids
+
+    def words(self, field):
+        """Returns the set of all the words indexed in field"""
+        words = set(self.pending.get(field, ()))
+        for segment in self.segments:
+            words.update(segment['fields'].get(field, ()))
+        return words
+
+    def flush(self):
+        """Writes the postings kept in memory to a new segment"""
+        if self.pendingStart == len(self):
+            return
+        self.writeSegment(self.pending, self.pendingStart, len(self))
+        self.pending = {}
+        self.pendingStart = len(self)
+        if len(self.segments) > self.MAX_SEGMENTS:
+            self.merge()
+
+    def merge(self):
+        """Merges all the segments into one"""
+        if len(self.segments) < 2:
+            return
+        postings = {}
+        for segment in self.segments:
+            for field, lexicon in segment['fields'].iteritems():
+                merged = postings.setdefault(field, {})
+                for word, entry in lexicon.iteritems():
+                    ids = merged.get(word)
+                    if ids is None:
+                        ids = merged[word] = array.array('I')
+                    ids.extend(self.readPostings(segment, entry))
+        old = self.segments
+        self.segments = []
+        self.writeSegment(postings, old[0]['first'], old[-1]['end'])
+        for segment in old:
+            self.removeSegment(segment)
+
+    def writeSegment(self, postings, first, end):
+        """
+        Writes postings ({field: {word: array of ids}}) of stories first
+        to end as a new segment.
+        """
+        name = os.path.join(self.directory, '%06d' % self.nextSegment)
+        self.nextSegment += 1
+        fields = {}
+        outFile = open(name + '.post', 'wb')
+        try:
+            start = 0
+            for field, words in postings.iteritems():
+                lexicon = fields[field] = {}
+                for word in sorted(words):
+                    ids = words[word]
+                    ids.tofile(outFile)
+                    lexicon[word] = [start, len(ids)]
+                    start += len(ids)
+        finally:
+            outFile.close()
+        segment = {'first': first, 'end': end, 'fields': fields}
+        outFile = open(name + '.lex.tmp', 'w')
+        try:
+            json.dump(segment, outFile)
+        finally:
+            outFile.close()
+        os.rename(name + '.lex.tmp', name + '.lex')
+        segment['name'] = name
+        self.segments.append(segment)
+
+    def close(self):
+        """Writes the postings kept in memory and closes the files"""
+        self.flush()
+        self.storiesFile.close()
+        self.timesFile.close()
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
@@ -2,24 +2,32 @@
 #
 # Part 1 - HAIL CAESAR!
 
+import os
 import string
 import random
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from word_cache import loadWordList
+from word_dictionary import WordDictionary, toDictionary
 
-WORDLIST_FILENAME = "words.txt"
+WORDLIST_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "words.txt")
 
 # -----------------------------------
 # Helper code
 # (you don't need to understand this helper code)
-def loadWords():
+def loadWords(filename=None):
     """
     Returns a list of valid words. Words are strings of lowercase letters.
-    
-    Depending on the size of the word list, this function may
-    take a while to finish.
+
+    The first load compiles the word list into a cache file next to it,
+    later loads only map that file (see word_cache.loadWordList).
+
+    filename: path of the word list, WORDLIST_FILENAME if None
+    returns: WordDictionary, a read-only list of strings with fast
+             membership tests
     """
     print "Loading word list from file..."
-    inFile = open(WORDLIST_FILENAME, 'r')
-    wordList = inFile.read().split()
+    wordList = WordDictionary(loadWordList(filename or WORDLIST_FILENAME))
     print "  ", len(wordList), "words loaded."
     return wordList
 
@@ -27,7 +35,7 @@ def isWord(wordList, word):
     """
     Determines if word is a valid word.
 
-    wordList: list of words in the dictionary.
+    wordList: list of words in the dictionary, or a WordDictionary.
     word: a possible word.
     returns True if word is in wordList.
 
@@ -90,6 +98,32 @@ def getStoryString():
 #
 # Problem 1: Encryption
 #
+# SHIFT_TABLES[shift] is the string.translate table of a Caesar shift;
+# every coder is built once, here
+SHIFT_TABLES = [string.maketrans(
+                    string.ascii_lowercase + string.ascii_uppercase,
+                    string.ascii_lowercase[shift:] + string.ascii_lowercase[:shift] +
+                    string.ascii_uppercase[shift:] + string.ascii_uppercase[:shift])
+                for shift in range(26)]
+
+# the same tables for unicode text, which str tables can't translate
+UNICODE_SHIFT_TABLES = [dict((ord(a), ord(b)) for a, b in
+                             zip(string.ascii_letters,
+                                 string.ascii_letters.translate(table)))
+                        for table in SHIFT_TABLES]
+
+def shiftTableFor(text, shift):
+    """
+    Returns the table text.translate shifts text by shift with: a
+    SHIFT_TABLES table for a str, a UNICODE_SHIFT_TABLES one for unicode.
+    """
+    if isinstance(text, unicode):
+        return UNICODE_SHIFT_TABLES[shift]
+    return SHIFT_TABLES[shift]
+
+# characters encodeStream reads at a time
+STREAM_CHUNK_SIZE = 1 << 16
+
 def buildCoder(shift):
     """
     Returns a dict that can apply a Caesar cipher to a letter.
@@ -99,8 +133,21 @@ def buildCoder(shift):
     shift: 0 <= int < 26
     returns: dict
     """
-    ### TODO.
-    return "Not yet implemented." # Remove this comment when you code the function
+    table = SHIFT_TABLES[shift]
+    return dict((letter, table[ord(letter)]) for letter in string.ascii_letters)
+
+def coderTable(coder, text=''):
+    """
+    Returns the table text.translate applies coder to text with.
+
+    coder: dict with mappings of characters to shifted characters
+    text: string the table is for, str or unicode
+    returns: string of 256 characters for a str, dict of code points
+             for unicode
+    """
+    if isinstance(text, unicode):
+        return dict((ord(a), ord(b)) for a, b in coder.iteritems())
+    return string.maketrans(''.join(coder.keys()), ''.join(coder.values()))
 
 def applyCoder(text, coder):
     """
@@ -110,8 +157,7 @@ def applyCoder(text, coder):
     coder: dict with mappings of characters to shifted characters
     returns: text after mapping coder chars to original text
     """
-    ### TODO.
-    return "Not yet implemented." # Remove this comment when you code the function
+    return text.translate(coderTable(coder, text))
 
 def applyShift(text, shift):
     """
@@ -120,26 +166,145 @@ def applyShift(text, shift):
     letters should remain upper case, and all other punctuation should
     stay as it is.
 
+    The whole text is shifted by a single translate, through the
+    precomputed table of the shift; unicode text works too.
+
     text: string to apply the shift to
     shift: amount to shift the text (0 <= int < 26)
     returns: text after being shifted by specified amount.
     """
-    ### TODO.
-    ### HINT: This is a wrapper function.
-    return "Not yet implemented." # Remove this comment when you code the function
+    return text.translate(shiftTableFor(text, shift))
+
+def encodeStream(inFile, outFile, shift, chunkSize=STREAM_CHUNK_SIZE):
+    """
+    Caesar shifts everything read from inFile and writes it to outFile,
+    chunkSize characters at a time, so a file of any size can be
+    encrypted (or decrypted, with (26 - shift) % 26) in constant memory.
+    Files opened with io.open or codecs.open, which read unicode, work
+    too.
+
+    inFile: file object open for reading
+    outFile: file object open for writing
+    shift: amount to shift the text (0 <= int < 26)
+    returns: the number of characters written
+    """
+    written = 0
+    while True:
+        chunk = inFile.read(chunkSize)
+        if not chunk:
+            break
+        outFile.write(chunk.translate(shiftTableFor(chunk, shift)))
+        written += len(chunk)
+    return written
 
 #
 # Problem 2: Decryption
 #
+# Relative frequencies of the letters a..z in English text
+ENGLISH_LETTER_FREQUENCIES = [
+    0.08167, 0.01492, 0.02782, 0.04253, 0.12702, 0.02228, 0.02015, 0.06094,
+    0.06966, 0.00153, 0.00772, 0.04025, 0.02406, 0.06749, 0.07507, 0.01929,
+    0.00095, 0.05987, 0.06327, 0.09056, 0.02758, 0.00978, 0.02360, 0.00150,
+    0.01974, 0.00074]
+
+# only this many characters of a text are decrypted to count its words
+WORD_SAMPLE_SIZE = 4096
+
+def letterCounts(text):
+    """
+    Returns the number of times each letter a..z appears in text,
+    ignoring case, as a list of 26 ints.
+    """
+    lowered = text.lower()
+    return [lowered.count(letter) for letter in string.ascii_lowercase]
+
+def chiSquared(counts, shift):
+    """
+    Returns how far the letters of a text shifted by shift are from
+    English letter frequencies (lower is closer), given the letter
+    counts of the text before the shift. Shifting only rotates the
+    counts, so no text is shifted.
+
+    counts: list of 26 ints, as returned by letterCounts
+    shift: 0 <= int < 26
+    returns: float >= 0
+    """
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+    score = 0.0
+    for i in range(26):
+        expected = total * ENGLISH_LETTER_FREQUENCIES[(i + shift) % 26]
+        score += (counts[i] - expected) ** 2 / expected
+    return score
+
+def countWords(wordSet, text):
+    """
+    Returns the number of space separated words of text in wordSet,
+    read the way isWord reads them.
+    """
+    found = 0
+    for word in text.lower().split(' '):
+        if word.strip(" !@#$%^&*()-_+={}[]|\\:;'<>?,./\"") in wordSet:
+            found += 1
+    return found
+
+def sampleOf(text):
+    """Returns the start of text, at most WORD_SAMPLE_SIZE characters,
+    cut after the last whole word"""
+    if len(text) <= WORD_SAMPLE_SIZE:
+        return text
+    sample = text[:WORD_SAMPLE_SIZE]
+    end = sample.rfind(' ')
+    if end > 0:
+        sample = sample[:end]
+    return sample
+
 def findBestShift(wordList, text):
     """
     Finds a shift key that can decrypt the encoded text.
 
-    text: string
+    Every shift is scored at once: the letters of text are counted in a
+    single pass, and the letter counts of each of the 26 decryptions
+    are rotations of those, compared with English letter frequencies
+    (chi-squared). The shifts are then ranked by how many real words
+    they decrypt the start of text into, with the chi-squared score
+    breaking ties, so neither the whole text nor a long one is ever
+    shifted 26 times.
+
+    wordList: list of words, or a WordDictionary; None to use letter
+              frequencies only
+    text: string, str or unicode
     returns: 0 <= int < 26
     """
-    ### TODO
-    return "Not yet implemented." # Remove this comment when you code the function
+    return findBestShifts(wordList, [text])[0]
+
+def findBestShifts(wordList, texts):
+    """
+    Finds the shift key of each of many encoded texts, as findBestShift
+    does for one.
+
+    wordList: list of words, or a WordDictionary; None to use letter
+              frequencies only
+    texts: list of strings, str or unicode
+    returns: list of ints, 0 <= int < 26
+    """
+    wordSet = None
+    if wordList is not None:
+        wordSet = toDictionary(wordList)
+    shifts = []
+    for text in texts:
+        counts = letterCounts(text)
+        sample = sampleOf(text)
+        scores = []
+        for shift in range(26):
+            hits = 0
+            if wordSet is not None:
+                hits = countWords(wordSet, sample.translate(shiftTableFor(sample, shift)))
+            # most words first, then closest to English, then smallest shift
+            scores.append((hits, -chiSquared(counts, shift), -shift))
+        shifts.append(-max(scores)[2])
+    return shifts
 
 def decryptStory():
     """
@@ -0,0 +1,183 @@
+import codecs
+import io
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+from ps6_encryption import *
+
+#
+# Test code
+# To run these tests, simply run this file (open up in IDLE, then run the file as normal)
+
+PLAIN = "Hello, world! The quick brown fox jumps over the lazy dog, twice."
+
+def test_applyShift():
+    """
+    Unit test for buildCoder, applyCoder and applyShift
+    """
+    failure=False
+    if applyShift('Hello, world!', 8) != 'Pmttw, ewztl!':
+        print "FAILURE: test_applyShift()"
+        print "\tExpected 'Pmttw, ewztl!' but got", repr(applyShift('Hello, world!', 8))
+        failure=True
+    if buildCoder(3)['a'] != 'd' or buildCoder(3)['Z'] != 'C' or len(buildCoder(3)) != 52:
+        print "FAILURE: test_applyShift()"
+        print "\tbuildCoder(3) is wrong:", buildCoder(3)
+        failure=True
+    allChars = ''.join([chr(i) for i in range(256)])
+    for text in [PLAIN, allChars, "", PLAIN.decode('ascii') + u' caf\xe9 \u2014']:
+        for k in range(26):
+            shifted = applyShift(text, k)
+            if applyShift(shifted, (26 - k) % 26) != text:
+                print "FAILURE: test_applyShift()"
+                print "\tShifting by", k, "and", (26 - k) % 26, "did not give back", repr(text)
+                failure=True
+            coder = buildCoder(k)
+            slow = ''.join([coder.get(c, c) for c in text])
+            if applyCoder(text, coder) != shifted or shifted != slow:
+                print "FAILURE: test_applyShift()"
+                print "\tapplyCoder(text, buildCoder(%d)) != applyShift(text, %d) for" % (k, k), repr(text)
+                failure=True
+            if type(shifted) != type(text):
+                print "FAILURE: test_applyShift()"
+                print "\tShifting", type(text), "returned", type(shifted)
+                failure=True
+    if not failure:
+        print "SUCCESS: test_applyShift()"
+
+# end of test_applyShift
+
+
+def test_encodeStream():
+    """
+    Unit test for encodeStream
+    """
+    failure=False
+    text = getStoryString() * 3
+    for chunkSize in [1, 7, 64, len(text), STREAM_CHUNK_SIZE]:
+        for k in [0, 5, 25]:
+            encoded = StringIO()
+            written = encodeStream(StringIO(text), encoded, k, chunkSize)
+            decoded = StringIO()
+            encodeStream(StringIO(encoded.getvalue()), decoded, (26 - k) % 26, chunkSize)
+            if (written != len(text) or encoded.getvalue() != applyShift(text, k)
+                    or decoded.getvalue() != text):
+                print "FAILURE: test_encodeStream()"
+                print "\tRound trip failed for shift", k, "and chunkSize", chunkSize
+                failure=True
+    # unicode files
+    directory = tempfile.mkdtemp()
+    try:
+        plain = PLAIN.decode('ascii') + u' caf\xe9 \u2014 na\xefve\n'
+        inName = os.path.join(directory, 'in.txt')
+        outName = os.path.join(directory, 'out.txt')
+        for opener in [io.open, codecs.open]:
+            inFile = opener(inName, 'w', encoding='utf-8')
+            inFile.write(plain * 10)
+            inFile.close()
+            inFile = opener(inName, 'r', encoding='utf-8')
+            outFile = opener(outName, 'w', encoding='utf-8')
+            encodeStream(inFile, outFile, 13, 5)
+            inFile.close()
+            outFile.close()
+            inFile = opener(outName, 'r', encoding='utf-8')
+            encoded = inFile.read()
+            inFile.close()
+            if encoded != applyShift(plain * 10, 13):
+                print "FAILURE: test_encodeStream()"
+                print "\tUnicode file opened with", opener.__module__ + ".open", "was not encoded"
+                failure=True
+    finally:
+        shutil.rmtree(directory)
+    if not failure:
+        print "SUCCESS: test_encodeStream()"
+
+# end of test_encodeStream
+
+
+def test_findBestShift(wordList):
+    """
+    Unit test for findBestShift and findBestShifts
+    """
+    failure=False
+    # every shift of a short text is found
+    for k in range(26):
+        text = applyShift(PLAIN, k)
+        shift = findBestShift(wordList, text)
+        if applyShift(text, shift) != PLAIN:
+            print "FAILURE: test_findBestShift()"
+            print "\tShift", shift, "does not decrypt", repr(text), "(encrypted with", str(k) + ")"
+            failure=True
+    # findBestShifts agrees with findBestShift
+    texts = [applyShift(PLAIN, k) for k in range(26)]
+    if findBestShifts(wordList, texts) != [findBestShift(wordList, t) for t in texts]:
+        print "FAILURE: test_findBestShift()"
+        print "\tfindBestShifts and findBestShift disagree"
+        failure=True
+    # the story
+    shift = findBestShift(wordList, getStoryString())
+    if shift != 16 or not applyShift(getStoryString(), shift).startswith("Jack Florey"):
+        print "FAILURE: test_findBestShift()"
+        print "\tExpected shift 16 for story.txt, but got", shift
+        failure=True
+    # nothing to decrypt: the smallest shift
+    for text in ["", "!!! ... 123 ?", " "]:
+        shift = findBestShift(wordList, text)
+        if shift != 0:
+            print "FAILURE: test_findBestShift()"
+            print "\tExpected shift 0 for", repr(text), "but got", shift
+            failure=True
+    # a text longer than the sample the words are counted in
+    long = (PLAIN + " ") * (2 * WORD_SAMPLE_SIZE // len(PLAIN))
+    if len(sampleOf(long)) > WORD_SAMPLE_SIZE or not long.startswith(sampleOf(long)):
+        print "FAILURE: test_findBestShift()"
+        print "\tsampleOf does not return the start of the text"
+        failure=True
+    for k in [3, 17]:
+        shift = findBestShift(wordList, applyShift(long, k))
+        if shift != (26 - k) % 26:
+            print "FAILURE: test_findBestShift()"
+            print "\tExpected shift", (26 - k) % 26, "for a long text, but got", shift
+            failure=True
+    # letter frequencies only
+    for k in [1, 8, 25]:
+        shift = findBestShift(None, applyShift(getStoryString(), k))
+        if (shift + k) % 26 != 16:
+            print "FAILURE: test_findBestShift()"
+            print "\tLetter frequencies alone did not decrypt the story shifted by", k
+            failure=True
+    counts = letterCounts(PLAIN)
+    if chiSquared(counts, 0) >= min([chiSquared(counts, k) for k in range(1, 26)]):
+        print "FAILURE: test_findBestShift()"
+        print "\tEnglish text is not closest to English letter frequencies unshifted"
+        failure=True
+    if chiSquared([0] * 26, 5) != 0.0:
+        print "FAILURE: test_findBestShift()"
+        print "\tExpected 0.0 for a text without letters"
+        failure=True
+    # unicode text
+    text = applyShift(PLAIN, 11).decode('ascii') + u' \xe9t\xe9'
+    shift = findBestShift(wordList, text)
+    if shift != 15:
+        print "FAILURE: test_findBestShift()"
+        print "\tExpected shift 15 for unicode text, but got", shift
+        failure=True
+    if not failure:
+        print "SUCCESS: test_findBestShift()"
+
+# end of test_findBestShift
+
+
+wordList = loadWords()
+print "----------------------------------------------------------------------"
+print "Testing applyShift..."
+test_applyShift()
+print "----------------------------------------------------------------------"
+print "Testing encodeStream..."
+test_encodeStream()
+print "----------------------------------------------------------------------"
+print "Testing findBestShift..."
+test_findBestShift(wordList)
+print "----------------------------------------------------------------------"
+print "All done!"
@@ -0,0 +1,116 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from word_cache import WordList, loadWordList, openCache, readWords
+
+WORDS = ['the', 'quick', 'brown', 'fox', 'jumps', 'over', 'a', 'lazy', 'dog',
+         'zebra', 'apple', 'quick']
+
+
+class WordCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'words.txt')
+        self.cacheFilename = self.filename + '.cache'
+        self.writeWords(WORDS)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def writeWords(self, words, mtime=None):
+        outFile = open(self.filename, 'w')
+        try:
+            outFile.write('\n'.join(words) + '\n')
+        finally:
+            outFile.close()
+        if mtime is not None:
+            os.utime(self.filename, (mtime, mtime))
+
+    def load(self):
+        return loadWordList(self.filename)
+
+    def assertSameAsList(self, wordList, words):
+        self.assertEquals(len(wordList), len(words))
+        self.assertEquals(list(wordList), words)
+        for i in range(-len(words), len(words)):
+            self.assertEquals(wordList[i], words[i])
+        for index in (len(words), -len(words) - 1):
+            self.assertRaises(IndexError, wordList.__getitem__, index)
+        for piece in (slice(None), slice(2, 5), slice(None, None, 3),
+                      slice(-3, None), slice(None, None, -1), slice(5, 2)):
+            self.assertEquals(wordList[piece], words[piece])
+        for word in set(words) | set(['', 'aa', 'cat', 'zzz', 'quic', 'quickly']):
+            self.assertEquals(word in wordList, word in words, word)
+
+    def testCompiledAndMappedAgreeWithList(self):
+        compiled = self.load()
+        self.assertTrue(os.path.exists(self.cacheFilename))
+        mapped = self.load()
+        self.assertTrue(mapped.start > 0)     # read from the cache file
+        self.assertSameAsList(compiled, WORDS)
+        self.assertSameAsList(mapped, WORDS)
+
+    def testWordsAreLowercased(self):
+        self.writeWords(['Hello', 'WORLD two'])
+        self.assertEquals(list(self.load()), ['hello', 'world', 'two'])
+        self.assertEquals(list(self.load()), readWords(self.filename))
+
+    def testRebuiltWhenSizeChanges(self):
+        self.load()
+        self.writeWords(WORDS + ['extra'], mtime=os.stat(self.filename).st_mtime)
+        self.assertSameAsList(self.load(), WORDS + ['extra'])
+        self.assertSameAsList(self.load(), WORDS + ['extra'])
+
+    def testRebuiltWhenMtimeChanges(self):
+        self.writeWords(WORDS, mtime=1000000)
+        self.load()
+        # same size, other words
+        changed = ['xyz' + word[3:] for word in WORDS]
+        self.writeWords(changed, mtime=2000000)
+        self.assertSameAsList(self.load(), changed)
+        self.assertSameAsList(self.load(), changed)
+
+    def testDamagedCacheIsRebuilt(self):
+        self.load()
+        inFile = open(self.cacheFilename, 'rb')
+        try:
+            data = inFile.read()
+        finally:
+            inFile.close()
+        stat = os.stat(self.filename)
+        for damaged in ('', data[:10], data[:-3], data + 'x',
+                        'garbage' * 100, 'XXXX' + data[4:]):
+            outFile = open(self.cacheFilename, 'wb')
+            try:
+                outFile.write(damaged)
+            finally:
+                outFile.close()
+            self.assertEquals(openCache(self.cacheFilename, stat), None)
+            self.assertSameAsList(self.load(), WORDS)
+            self.assertTrue(openCache(self.cacheFilename, stat) is not None)
+
+    def testEmptyWordList(self):
+        self.writeWords([])
+        for i in range(2):
+            wordList = self.load()
+            self.assertSameAsList(wordList, [])
+            self.assertFalse('a' in wordList)
+
+    def testNoTemporaryFilesLeft(self):
+        self.load()
+        self.assertEquals(sorted(os.listdir(self.directory)),
+                          ['words.txt', 'words.txt.cache'])
+
+    def testUnwritableCacheStillLoads(self):
+        wordList = loadWordList(self.filename,
+                                os.path.join(self.directory, 'missing', 'x.cache'))
+        self.assertSameAsList(wordList, WORDS)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(WordCacheTest))
+    unittest.TextTestRunner(verbosity=2, stream=sys.stdout).run(suite)
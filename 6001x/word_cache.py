@@ -0,0 +1,187 @@
+#
+# Word list loader with a compiled cache, shared by the problem sets
+#
+# The first load of a word list compiles it into a cache file next to it
+# (words.txt -> words.txt.cache). Later loads memory-map the cache instead
+# of reading and normalizing the text again, and the cache is rebuilt
+# whenever the word list's size or modification time changes.
+#
+# Cache layout, in native byte order:
+#
+#   header      magic, item size, source size, source mtime, word count
+#   offsets     count + 1 unsigned ints: word i is blob[offsets[i]:offsets[i+1]]
+#   order       count unsigned ints: word ids sorted by word, for lookups
+#   blob        all the words, one after the other
+#
+
+import array
+import mmap
+import os
+import struct
+
+MAGIC = 'WRD1'
+HEADER = struct.Struct('=4sIQdI')
+
+
+class WordList(object):
+    """
+    A read-only list of words, as loaded by loadWordList.
+
+    It can be indexed, sliced, iterated and measured like the list the
+    text file used to be read into, in the file's order. Membership is a
+    binary search over the words in sorted order, so `word in wordList`
+    costs O(log n) instead of a scan.
+    """
+    def __init__(self, blob, offsets, order, start=0):
+        """
+        blob: string or mmap holding all the words
+        offsets: array of len(order) + 1 positions of the words in blob,
+                 counted from start
+        order: array of the word ids sorted by word
+        start: where the words begin in blob
+        """
+        self.blob = blob
+        self.offsets = offsets
+        self.order = order
+        self.start = start
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in xrange(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('word list index out of range')
+        return self.blob[self.start + self.offsets[i]:
+                         self.start + self.offsets[i + 1]]
+
+    def __iter__(self):
+        blob, offsets, start = self.blob, self.offsets, self.start
+        for i in xrange(len(self)):
+            yield blob[start + offsets[i]:start + offsets[i + 1]]
+
+    def __contains__(self, word):
+        blob, offsets, order, start = self.blob, self.offsets, self.order, self.start
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i = order[mid]
+            if blob[start + offsets[i]:start + offsets[i + 1]] < word:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < len(order) and self[order[lo]] == word
+
+    def __repr__(self):
+        return '<WordList of %d words>' % len(self)
+
+
+def compileWords(words):
+    """
+    Returns (blob, offsets, order) for the list of strings words.
+    """
+    offsets = array.array('I', [0])
+    position = 0
+    for word in words:
+        position += len(word)
+        offsets.append(position)
+    order = array.array('I', sorted(xrange(len(words)), key=words.__getitem__))
+    return ''.join(words), offsets, order
+
+def readWords(filename):
+    """
+    Returns the words of the text file filename, lowercased: the file
+    is split on whitespace, so one word per line or several per line both
+    work.
+    """
+    inFile = open(filename, 'r')
+    try:
+        return inFile.read().lower().split()
+    finally:
+        inFile.close()
+
+def writeCache(cacheFilename, stat, blob, offsets, order):
+    """
+    Writes a compiled word list to cacheFilename. Every process writes
+    to its own temporary file and renames it over the cache, so processes
+    compiling the same word list at once never see each other's half
+    written files.
+    """
+    tmpname = '%s.%d.tmp' % (cacheFilename, os.getpid())
+    try:
+        outFile = open(tmpname, 'wb')
+        try:
+            outFile.write(HEADER.pack(MAGIC, offsets.itemsize, stat.st_size,
+                                      stat.st_mtime, len(order)))
+            offsets.tofile(outFile)
+            order.tofile(outFile)
+            outFile.write(blob)
+        finally:
+            outFile.close()
+        os.rename(tmpname, cacheFilename)
+    except EnvironmentError:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+def openCache(cacheFilename, stat):
+    """
+    Maps the compiled word list in cacheFilename.
+    Returns a WordList, or None if the cache is missing, damaged or was
+    compiled from another version of the word list (stat is its os.stat).
+    """
+    try:
+        inFile = open(cacheFilename, 'rb')
+    except IOError:
+        return None
+    try:
+        try:
+            data = mmap.mmap(inFile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (EnvironmentError, ValueError):
+            return None     # an empty file can't be mapped
+    finally:
+        inFile.close()
+    if len(data) < HEADER.size:
+        return None
+    magic, itemsize, size, mtime, count = HEADER.unpack(data[:HEADER.size])
+    offsets = array.array('I')
+    if (magic != MAGIC or itemsize != offsets.itemsize or
+            size != stat.st_size or mtime != stat.st_mtime):
+        return None
+    start = HEADER.size
+    offsets.fromstring(data[start:start + (count + 1) * itemsize])
+    start += (count + 1) * itemsize
+    order = array.array('I')
+    order.fromstring(data[start:start + count * itemsize])
+    start += count * itemsize
+    if len(offsets) != count + 1 or len(order) != count or \
+            len(data) != start + offsets[-1]:
+        return None
+    # the words are read straight from the mapped file
+    return WordList(data, offsets, order, start)
+
+def loadWordList(filename, cacheFilename=None):
+    """
+    Returns the words of the text file filename as a WordList,
+    lowercased.
+
+    The word list is compiled into cacheFilename (filename + '.cache' by
+    default) on the first load and after every change to filename; other
+    loads only map the cache. If the cache can't be written, the word
+    list is compiled in memory every time.
+    """
+    if cacheFilename is None:
+        cacheFilename = filename + '.cache'
+    stat = os.stat(filename)
+    wordList = openCache(cacheFilename, stat)
+    if wordList is not None:
+        return wordList
+    blob, offsets, order = compileWords(readWords(filename))
+    try:
+        writeCache(cacheFilename, stat, blob, offsets, order)
+    except EnvironmentError:
+        pass
+    return WordList(blob, offsets, order)
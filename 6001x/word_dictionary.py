@@ -0,0 +1,140 @@
+#
+# Word dictionary with fast membership and prefix queries, shared by the
+# problem sets
+#
+
+
+class _Node(object):
+    """A state of the DAWG: outgoing edges and whether a word ends here"""
+    __slots__ = ('edges', 'final')
+
+    def __init__(self):
+        self.edges = {}     # letter -> _Node
+        self.final = False
+
+    def key(self):
+        """Two nodes with the same key accept the same suffixes"""
+        return (self.final, tuple(sorted([(letter, id(child))
+                                          for letter, child in self.edges.iteritems()])))
+
+
+def buildDawg(words):
+    """
+    Builds a DAWG (a trie whose identical subtrees are shared) of words,
+    with the incremental algorithm of Daciuk et al. for sorted input.
+    Returns its root _Node.
+    """
+    root = _Node()
+    unchecked = []      # (parent, letter, child) along the last word added
+    minimized = {}      # key -> _Node already in the DAWG
+
+    def minimize(downTo):
+        while len(unchecked) > downTo:
+            parent, letter, child = unchecked.pop()
+            key = child.key()
+            if key in minimized:
+                parent.edges[letter] = minimized[key]
+            else:
+                minimized[key] = child
+
+    previous = ''
+    for word in sorted(set(words)):
+        common = 0
+        for a, b in zip(word, previous):
+            if a != b:
+                break
+            common += 1
+        minimize(common)
+        if unchecked:
+            node = unchecked[-1][2]
+        else:
+            node = root
+        for letter in word[common:]:
+            child = _Node()
+            node.edges[letter] = child
+            unchecked.append((node, letter, child))
+            node = child
+        node.final = True
+        previous = word
+    minimize(0)
+    return root
+
+
+class WordDictionary(object):
+    """
+    A dictionary of words for isValidWord, isWord and the like.
+
+    It looks like the word list it was made from (same order, indexing,
+    iteration and length), so it can be passed anywhere a word list is
+    expected. Membership uses a hash set, and prefix queries a DAWG; both
+    are built on first use.
+    """
+    def __init__(self, words):
+        """
+        words: list of words, or anything indexable like one (a WordList)
+        """
+        self.words = words
+        self.wordSet = None
+        self.dawg = None
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, i):
+        return self.words[i]
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __contains__(self, word):
+        if self.wordSet is None:
+            self.wordSet = frozenset(self.words)
+        return word in self.wordSet
+
+    def __repr__(self):
+        return '<WordDictionary of %d words>' % len(self)
+
+    def findNode(self, prefix):
+        """Returns the DAWG node prefix leads to, or None"""
+        if self.dawg is None:
+            self.dawg = buildDawg(self.words)
+        node = self.dawg
+        for letter in prefix:
+            node = node.edges.get(letter)
+            if node is None:
+                return None
+        return node
+
+    def hasPrefix(self, prefix):
+        """Returns True if some word starts with prefix"""
+        return self.findNode(prefix) is not None
+
+    def wordsWithPrefix(self, prefix):
+        """Returns the sorted list of the words starting with prefix"""
+        node = self.findNode(prefix)
+        if node is None:
+            return []
+        words = []
+        stack = [(prefix, node)]
+        while stack:
+            word, node = stack.pop()
+            if node.final:
+                words.append(word)
+            # pushed in reverse, so the smallest letter is popped first
+            for letter in sorted(node.edges, reverse=True):
+                stack.append((word + letter, node.edges[letter]))
+        return words
+
+
+def toDictionary(wordList):
+    """
+    Returns wordList as a WordDictionary, for a function about to look up
+    many words in it.
+
+    A WordDictionary is returned as is. A plain list gets a new one every
+    call, which is never kept: the list may be changed between calls. For
+    a single lookup, `word in wordList` is as fast as it gets either way.
+    """
+    if isinstance(wordList, WordDictionary):
+        return wordList
+    return WordDictionary(wordList)